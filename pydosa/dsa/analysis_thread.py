@@ -0,0 +1,154 @@
+"""
+Thread that analyses frames and prepares them for display.
+
+The analysis thread sits between the scope thread and the GUI. It takes
+frames of samples from one queue, computes their spectra and puts
+ready-to-draw pixel coordinates into another. So the acquisition,
+analysis and rendering of consecutive frames all overlap, and the Tk
+main thread is never blocked by an FFT.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import math
+import threading
+from typing import NamedTuple
+
+from pydosa.dsa.analyzer import Analyzer
+from pydosa.dsa.spectrum_widget import (OVERLAY_COLORS, TRACE_COLOR, View,
+                                        trace_coords, units_offset)
+from pydosa.util.drop_queue import DropQueue, QueueClosed
+
+SHUTDOWN_TIMEOUT = 5.0  # Seconds to wait for the analysis of a frame to finish
+
+
+class Settings(NamedTuple):
+    """Analysis and view settings for a frame, set by the GUI"""
+    mode: str
+    window: str
+    method: str
+    overlays: tuple[str, ...]  # Other trace modes to overlay
+    view: View
+
+
+class PlotData(NamedTuple):
+    """A frame that is ready to draw"""
+    traces: list[tuple[list[float], str]]  # (Pixel coordinates, colour)
+    rbw: float  # Resolution bandwidth (Hz)
+    bins_per_pixel: float
+    count: int  # Frames in the linear average
+    navg: int  # Frames needed to complete the linear average
+    complete: bool  # Linear average is complete
+    error_db: float | None  # Standard error of the linear average (dB)
+
+
+class AnalysisThread(threading.Thread):
+    """Analyses frames from one queue and puts plots into another.
+
+    The thread blocks until a frame arrives. After each plot is queued,
+    the notify callback (if any) is called to wake the GUI, and the
+    release callback (if any) is called with the frame, so that its
+    buffer can be reused. Closing the thread closes the frame queue to
+    wake it. The frame buffers must not be freed until the thread has
+    been shut down, as it may still be analysing one.
+    """
+
+    def __init__(self, analyzer: Analyzer, frames: DropQueue, plots: DropQueue,
+                 notify=None, release=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.analyzer = analyzer
+        self.frames = frames
+        self.plots = plots
+        self.notify = notify
+        self.release = release
+        self.settings = None  # Settings for the next frame
+        self.stop = False
+        self._config = None  # Analyzer configuration to apply
+        self._reset = False  # Reset the average before the next frame
+
+    def run(self) -> None:
+        while not self.stop:
+            try:
+                frame = self.frames.get()
+            except QueueClosed:
+                break
+            settings = self.settings
+            plot = None
+            try:
+                if settings is not None and not self.stop:
+                    self._update_analyzer()
+                    plot = self.process(frame, settings)
+            except Exception as exc:
+                print('Analysis failed:', exc)
+            finally:
+                if self.release is not None:
+                    self.release(frame)  # The samples are no longer needed
+            if plot is not None:
+                self.plots.put(plot)
+                if self.notify is not None and not self.stop:
+                    self.notify()
+
+    def process(self, frame: tuple, settings: Settings) -> PlotData:
+        """Analyse a frame and convert its traces to pixel coordinates"""
+        wave, sample_rate, gain, offset = frame
+        view = settings.view
+        overlays = [t for t in settings.overlays if t != settings.mode]
+
+        # Compute the spectrum, plus any overlaid traces. The main trace is
+        # always averaged in the same way, so toggling overlays doesn't reset it.
+        spectra = self.analyzer.analyze_traces(wave, sample_rate,
+                                               [settings.mode] + overlays,
+                                               settings.window, settings.method,
+                                               gain, offset, view.fmin, view.fmax)
+        spectrum = spectra[settings.mode]
+        traces = [(spectrum, TRACE_COLOR)]
+        traces += [(spectra[t], OVERLAY_COLORS[t]) for t in overlays]
+
+        # Convert to pixels
+        offset_db = units_offset(view.units, spectrum)
+        coords = []
+        ka = 0
+        for trace, color in traces:
+            points, ka = trace_coords(trace, view, offset_db)
+            coords.append((points, color))
+        averager = self.analyzer.averager
+        error = averager.relative_error() if settings.mode == 'Linear' else None
+        error_db = 10 * math.log10(1 + error) if error is not None else None
+        return PlotData(coords, spectrum.rbw, ka, averager.count, averager.navg,
+                        averager.complete, error_db)
+
+    def configure(self, config) -> None:
+        """Reconfigure the analyzer before the next frame"""
+        self._config = config
+
+    def reset_average(self) -> None:
+        """Restart averaging from the next frame"""
+        self._reset = True
+
+    def close(self) -> None:
+        """Interrupt the thread."""
+        self.stop = True
+        self.frames.close()
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+        """Interrupt the thread and wait for it to finish with its frame.
+           Returns False if it did not finish within the timeout.
+        """
+        self.close()
+        if self.is_alive():
+            self.join(timeout)
+        if self.is_alive():
+            print('Warning: analysis did not stop within', timeout, 'seconds')
+            return False
+        return True
+
+    def _update_analyzer(self) -> None:
+        """Apply changes requested by the GUI thread"""
+        config, self._config = self._config, None
+        if config is not None:
+            self.analyzer.configure(config)
+        if self._reset:
+            self._reset = False
+            self.analyzer.averager.reset()
+            self.analyzer.traces.reset()
@@ -6,65 +6,585 @@ Copyright (c) 2020 Jon Brumfitt
 """
 
 import math
-from functools import cache
 
 import numpy as np
 import scipy.signal as sig
 from numpy import array as npa
+from numpy.lib.stride_tricks import sliding_window_view
 
-from pydosa.dsa.averager import Averager
+from pydosa.dsa.averager import NAVG, Averager
+from pydosa.dsa.fft_backend import BACKENDS, WISDOM_FILE, NumpyBackend, get_backend
+from pydosa.dsa.spectrum import Spectrum
+from pydosa.dsa.traces import TraceAccumulator
+from pydosa.dsa.window_cache import DISK_MIN_SAMPLES, MAX_BYTES, WindowCache
+from pydosa.util.units import decode_unit_prefix
 
 ALPHA = 0.03  # Averaging: tau / dt = (1 - ALPHA) / ALPHA
 DB3 = 10 * math.log10(2)  # 3 dB
 
+# Welch method defaults
+WELCH_SEGMENT = 65536  # Segment length (samples)
+WELCH_OVERLAP = 0.5  # Fraction of segment overlapping the next one
+WELCH_BATCH = 1 << 22  # Maximum samples transformed per batched FFT
 
-@cache
-def get_window(name: str, nsamples: int) -> npa:
+# Zoom method: the decimated sample rate is at least this multiple of the
+# span, keeping the span within the flat part of the decimation filter.
+ZOOM_MARGIN = 1.5
+ZOOM_BLOCK = 1 << 16  # Samples mixed and decimated at a time
+ZOOM_HALF_TAPS = 10  # Half length of the decimation filter, in output samples
+
+# Spectra longer than this are reduced to this many points across the
+# span before averaging, keeping the maximum of each group of bins
+# (0 to average at full resolution).
+DISPLAY_POINTS = 0
+
+# Chirp-Z method: number of points evaluated across the span. The display
+# is 1024 pixels wide, so this gives a few points per pixel.
+CZT_POINTS = 4096
+
+# Window response below this fraction of the DC term is ignored when
+# adding a DC offset to the spectrum (-180 dB).
+DC_LEAKAGE = 1e-9
+
+# Floating point type used for analysis
+PRECISIONS = {'double': np.float64, 'single': np.float32}
+
+# Window functions and their coherent power loss (dB)
+WINDOWS = {'Hanning': (sig.windows.hann, 6.021),
+           'Flat-Top': (sig.windows.flattop, 13.328),
+           'Blackman': (sig.windows.blackman, 7.535),
+           'Rectangle': (None, 0.0)}
+
+WINDOW_DISK_DIR = '~/.pydosa/windows'  # Default directory for disk cache
+window_cache = WindowCache()
+
+
+def get_window(name: str, nsamples: int, dtype=np.float64) -> npa:
     """Return window function and its coherent power loss (dB)"""
-    match name:
-        case 'Hanning':
-            return sig.windows.hann(nsamples), 6.021
-        case 'Flat-Top':
-            return sig.windows.flattop(nsamples), 13.328
-        case 'Blackman':
-            return sig.windows.blackman(nsamples), 7.535
-        case 'Rectangle':
-            return None, 0.0
-        case _:
-            raise ValueError('Unknown window: ', name)
+    if name not in WINDOWS:
+        raise ValueError('Unknown window: ', name)
+    func, loss = WINDOWS[name]
+    if func is None:
+        return None, loss
+    dtype = np.dtype(dtype)
+    window = window_cache.get((name, nsamples, dtype),
+                              lambda: func(nsamples).astype(dtype))
+    return window, loss
+
+
+def read_config(config) -> dict:
+    """Read and check the settings in the ANALYZER preferences section.
+       Raises ValueError if any of them is invalid.
+    """
+    segment = int(decode_unit_prefix(config.get('welch_segment', str(WELCH_SEGMENT))))
+    if segment < 2:
+        raise ValueError('Welch segment too short: {}'.format(segment))
+    overlap = float(config.get('welch_overlap', str(WELCH_OVERLAP)))
+    if not 0 <= overlap < 1:
+        raise ValueError('Welch overlap out of range: {}'.format(overlap))
+    czt_points = int(decode_unit_prefix(config.get('czt_points', str(CZT_POINTS))))
+    if czt_points < 2:
+        raise ValueError('Too few chirp-Z points: {}'.format(czt_points))
+    display_points = int(decode_unit_prefix(config.get('display_points', str(DISPLAY_POINTS))))
+    if display_points < 0:
+        raise ValueError('Display points out of range: {}'.format(display_points))
+    navg = int(config.get('linear_count', str(NAVG)))
+    if navg < 1:
+        raise ValueError('Linear count out of range: {}'.format(navg))
+    precisions = {}
+    for key in 'average_precision', 'precision':
+        precision = config.get(key, 'double')
+        if precision not in PRECISIONS:
+            raise ValueError('Unknown precision: {}'.format(precision))
+        precisions[key] = PRECISIONS[precision]
+    backend = config.get('fft_backend', 'numpy')
+    if backend not in BACKENDS:
+        raise ValueError('Unknown FFT backend: {}'.format(backend))
+    directory = None
+    if config.getboolean('window_disk_cache', False):
+        directory = config.get('window_disk_dir', WINDOW_DISK_DIR)
+    return {'welch_segment': segment,
+            'welch_overlap': overlap,
+            'czt_points': czt_points,
+            'display_points': display_points,
+            'linear_count': navg,
+            'fft_backend': backend,
+            'fft_workers': int(config.get('fft_workers', '-1')),
+            'fftw_wisdom': config.get('fftw_wisdom', WISDOM_FILE),
+            'window_cache_bytes': int(float(config.get('window_cache_mb', str(MAX_BYTES >> 20)))
+                                      * (1 << 20)),
+            'window_cache_half': config.getboolean('window_cache_half', False),
+            'window_disk_dir': directory,
+            'window_disk_min': int(decode_unit_prefix(config.get('window_disk_min',
+                                                                 str(DISK_MIN_SAMPLES)))),
+            **precisions}
+
+
+class Workspace(object):
+    """Preallocated buffers for analysing frames of one size.
+
+    A frame is analysed as nseg segments of nperseg samples, which are
+    transformed in batches of up to 'batch' segments. The FFT method is
+    simply the case of a single segment covering the whole frame.
+
+    Raw ADC codes are scaled by folding the gain into a copy of the window
+    vector. The DC offset is added to the spectrum instead of the samples.
+    """
+
+    def __init__(self, key, nperseg: int, nseg: int, batch: int, window: str, dtype):
+        """Initialization"""
+        self.key = key
+        nbins = nperseg // 2 + 1
+        self.dtype = dtype
+        self.nperseg = nperseg
+        self.window, self.offset_db = get_window(window, nperseg, dtype)
+        self.gain = 1.0
+        self.scaled_window = self.window  # Window multiplied by gain
+        self.dc_response = None  # Spectrum of a unit DC offset
+        self.samples = np.empty((batch, nperseg), dtype)  # Windowed segments
+        self.spectra = np.empty((batch, nbins), np.result_type(dtype, np.complex64))
+        self.power = np.empty((batch, nbins), dtype)  # Power of each segment
+        if nseg > 1:  # A single segment is its own mean
+            self.mean = np.empty(nbins, dtype)  # Mean power over segments
+            self.total = np.empty(nbins, dtype)  # Power summed over a batch
+
+    def set_gain(self, gain: float) -> None:
+        """Fold the gain into the scaled window vector"""
+        if gain == self.gain:
+            return
+        self.gain = gain
+        if self.window is not None:
+            if self.scaled_window is self.window:  # Don't modify cached window
+                self.scaled_window = np.empty_like(self.window)
+            np.multiply(self.window, gain, out=self.scaled_window)
+
+    def get_dc_response(self, fft) -> npa:
+        """Return the leading bins of the window's response to a unit DC offset.
+           For the rectangular window, this is just the DC bin.
+        """
+        if self.dc_response is None:
+            nperseg = self.nperseg
+            window = self.window if self.window is not None else np.ones(nperseg, self.dtype)
+            response = fft.rfft(window)
+            magnitude = np.absolute(response)
+            nbins = np.nonzero(magnitude > DC_LEAKAGE * magnitude[0])[0][-1] + 1
+            self.dc_response = np.array(response[:nbins])
+        return self.dc_response
+
+
+class ZoomWorkspace(object):
+    """Oscillator, filter and buffers for zoom analysis of one frame size and span.
+
+    The frame is mixed down so that the centre of the span is at 0 Hz,
+    low-pass filtered and decimated, and the complex baseband is then
+    transformed with a shorter FFT. The mixing and decimation are done in
+    blocks, continuing the phase of a short oscillator from one block to
+    the next, so only the baseband is as long as the frame.
+    """
+
+    def __init__(self, key, nsamples: int, srate: float, fcentre: float,
+                 span: float, decim: int, window: str, dtype):
+        """Initialization"""
+        self.key = key
+        self.decim = decim
+        self.cycles = fcentre / srate  # Oscillator cycles per sample
+        ctype = np.result_type(dtype, np.complex64)
+
+        # Same low-pass filter as resample_poly, with a delay of ZOOM_HALF_TAPS outputs
+        self.taps = sig.firwin(2 * ZOOM_HALF_TAPS * decim + 1, 1 / decim,
+                               window=('kaiser', 5.0)).astype(dtype)
+        self.block = decim * max(ZOOM_BLOCK // decim, 16 * ZOOM_HALF_TAPS)
+        phase = np.arange(self.block) * self.cycles % 1.0
+        self.oscillator = np.exp(phase * (-2j * math.pi)).astype(ctype)
+        self.scratch = np.empty(self.block, ctype)
+        self.mixed = np.empty(len(self.taps) - 1 + self.block, ctype)  # History and block
+
+        # Buffers for the FFT of the decimated baseband
+        nbase = -(-nsamples // decim)  # Output length of resample_poly
+        self.baseband = np.empty(nbase, ctype)
+        self.window, self.offset_db = get_window(window, nbase, dtype)
+        self.spectrum = np.empty(nbase, ctype)
+        self.power = np.empty(nbase, dtype)
+
+        # Indices of the bins in the span, in order of increasing frequency
+        self.df = srate / decim / nbase
+        self.half_bins = min(nbase // 2 - 1, math.ceil(span / 2 / self.df))
+        self.bins = np.arange(-self.half_bins, self.half_bins + 1) % nbase
+        self.span = np.empty(len(self.bins), dtype)  # Power of bins in span
+        self.f0 = fcentre - self.half_bins * self.df
+
+    def mix_down(self, data, gain: float, offset: float) -> npa:
+        """Mix the samples (data * gain + offset) down to baseband and decimate.
+           The gain and offset are folded into the oscillator phase of each block.
+        """
+        decim = self.decim
+        nhist = len(self.taps) - 1  # Samples before a block needed to filter it
+        skip = nhist // decim  # Filter outputs that finish before the block
+        nout = self.block // decim  # Filter outputs for each block
+        nbase = len(self.baseband)
+        mixed = self.mixed
+        block = mixed[nhist:]
+        mixed[:nhist] = 0
+        for start in range(0, (nbase + ZOOM_HALF_TAPS) * decim, self.block):
+            x = data[start:start + self.block]
+            m = len(x)
+            phase = np.exp(-2j * math.pi * (start * self.cycles % 1.0))
+            np.multiply(x, self.oscillator[:m], out=block[:m])
+            block[:m] *= gain * phase
+            if offset != 0:
+                np.multiply(self.oscillator[:m], offset * phase, out=self.scratch[:m])
+                block[:m] += self.scratch[:m]
+            block[m:] = 0  # Past the end of the frame
+            out = sig.upfirdn(self.taps, mixed, 1, decim)[skip:skip + nout]
+
+            # Output i of the filter is baseband sample i - ZOOM_HALF_TAPS
+            first = start // decim - ZOOM_HALF_TAPS
+            lo, hi = max(0, -first), min(nout, nbase - first)
+            if lo < hi:
+                self.baseband[first + lo:first + hi] = out[lo:hi]
+            mixed[:nhist] = mixed[-nhist:]
+        return self.baseband
+
+
+class CztWorkspace(object):
+    """Chirp-Z transform and buffers for one frame size and span.
+
+    The spectrum is evaluated at npoints frequencies from fstart to fstop
+    inclusive, so it matches the display grid without rebinning.
+    """
+
+    def __init__(self, key, nsamples: int, srate: float, fstart: float,
+                 fstop: float, npoints: int, window: str, dtype):
+        """Initialization"""
+        self.key = key
+        self.transform = sig.ZoomFFT(nsamples, [fstart, fstop], npoints,
+                                     fs=srate, endpoint=True)
+        self.window, self.offset_db = get_window(window, nsamples, dtype)
+        if self.window is None:
+            self.window = np.ones(nsamples, dtype)
+        self.nsamples = nsamples
+        self.scale = None
+        self.scaled_window = np.empty(nsamples, dtype)  # Window * gain / n
+        self.samples = np.empty(nsamples, dtype)
+        self.dc_response = None  # Spectrum of a unit DC offset
+        self.power = np.empty(npoints, dtype)
+        self.f0 = fstart
+        self.df = (fstop - fstart) / (npoints - 1)
+
+    def set_gain(self, gain: float) -> None:
+        """Fold the gain and the 1/n normalization into the scaled window"""
+        scale = gain / self.nsamples
+        if scale != self.scale:
+            self.scale = scale
+            np.multiply(self.window, scale, out=self.scaled_window)
+
+    def get_dc_response(self) -> npa:
+        """Return the window's response to a unit DC offset at each point"""
+        if self.dc_response is None:
+            self.dc_response = self.transform(self.window / self.nsamples)
+        return self.dc_response
 
 
 class Analyzer(object):
     """Spectrum analysis"""
 
-    def __init__(self):
+    def __init__(self, config=None):
         """Initialization"""
         self.averager = Averager(ALPHA)
+        self.traces = TraceAccumulator(ALPHA)
+        self.fft = NumpyBackend()
+        self.dtype = np.float64
+        self.segment = WELCH_SEGMENT
+        self.overlap = WELCH_OVERLAP
+        self.czt_points = CZT_POINTS
+        self.display_points = DISPLAY_POINTS
+        self._reduced = None  # Spectrum reduced to display resolution
+        self._db = None  # Buffer for the dB values of the last spectrum
         self.last_nsamples = None
         self.last_srate = None
         self.last_window = None
         self.last_mode = None
+        self._workspace = None
+        if config is not None:
+            self.configure(config)
 
-    def compute_spectrum(self, data, srate: float, mode: str, window: str) -> tuple[npa, float]:
-        """Compute power spectrum in dBV"""
-        nsamples = len(data)
+    def configure(self, config) -> None:
+        """Apply settings from the ANALYZER preferences section.
+           Raises ValueError, without changing anything, if any are invalid.
+        """
+        settings = read_config(config)
+        self.segment = settings['welch_segment']
+        self.overlap = settings['welch_overlap']
+        self.czt_points = settings['czt_points']
+        self.display_points = settings['display_points']
+        self.averager.reset()
+        self.averager.dtype = settings['average_precision']
+        self.averager.navg = settings['linear_count']
+        self.traces.reset()
+        self.traces.dtype = settings['average_precision']
+        self.fft = get_backend(settings['fft_backend'], settings['fft_workers'],
+                               settings['fftw_wisdom'])
+        self.dtype = settings['precision']
+        window_cache.configure(settings['window_cache_bytes'], settings['window_cache_half'],
+                               settings['window_disk_dir'], settings['window_disk_min'])
+
+    def compute_spectrum(self, data, srate: float, mode: str, window: str,
+                         method: str = 'FFT', gain: float = 1.0,
+                         offset: float = 0.0) -> tuple[npa, float]:
+        """Compute power spectrum in dBV.
+
+        See analyze() for details. The 'Zoom' method needs a span, so
+        analyze() must be used to get its frequency axis.
+        """
+        spectrum = self.analyze(data, srate, mode, window, method, gain, offset)
+        return spectrum.db, spectrum.srate
+
+    def analyze(self, data, srate: float, mode: str, window: str,
+                method: str = 'FFT', gain: float = 1.0, offset: float = 0.0,
+                fstart: float = 0.0, fstop: float = None) -> Spectrum:
+        """Compute power spectrum, which converts to dBV on demand.
 
-        # Apply window function
-        winfunc, offset_db = get_window(window, nsamples)
-        if winfunc is not None:
-            data *= winfunc
+        The data may be raw ADC codes, in which case the gain and offset
+        convert them to volts: volts = data * gain + offset.
 
-        # Do the FFT
-        data = np.absolute(np.fft.rfft(data, norm='forward'))
-        data = data * data  # Needed for power averaging
-        monitor = (nsamples, srate, window)  # Reset average if this changes
+        The 'FFT' and 'Welch' methods cover the whole band. The 'Zoom'
+        method only covers the span from fstart to fstop. The 'CZT' method
+        evaluates exactly czt_points frequencies from fstart to fstop. For
+        both, the span is limited to 0 to srate / 2.
+
+        If display_points is set, longer spectra are reduced to about that
+        many points across the span from fstart to fstop before averaging.
+        Each point is the maximum of a group of bins, so narrow peaks are
+        preserved, and the averager only stores the reduced spectrum.
+
+        The input data is not modified. The returned spectrum uses a
+        reusable buffer that is overwritten by the next call.
+        """
+        data, f0, df, rbw, offset_db, monitor = self._power(
+            data, srate, window, method, gain, offset, fstart, fstop)
         data = self.averager.average(data, mode, monitor)
 
-        # Convert to dBV
-        data += 1E-30  # Avoid divide-by-zero
-        data = np.log10(data) * 10.0
-        offset_db += DB3  # Double to correct for one-sided spectrum...
-        data[0] -= 3.01  # ... except for DC term
-        data += offset_db  # Apply dB offsets
+        # Conversion to dBV is deferred until the spectrum is displayed
+        return Spectrum(data, srate, f0, df, offset_db, self._db_buffer, rbw)
+
+    def analyze_traces(self, data, srate: float, traces: list[str], window: str,
+                       method: str = 'FFT', gain: float = 1.0, offset: float = 0.0,
+                       fstart: float = 0.0, fstop: float = None) -> dict[str, Spectrum]:
+        """Compute a main trace and overlaid trace modes (e.g. 'Maximum') at once.
+
+        This is like analyze(), but returns a spectrum for each trace mode,
+        all accumulated from the same acquisitions. The first trace is the
+        main one, which is averaged exactly as by analyze(), so it may use
+        any mode and is not restarted when overlays are added or removed.
+        The overlays are accumulated separately.
+        """
+        data, f0, df, rbw, offset_db, monitor = self._power(
+            data, srate, window, method, gain, offset, fstart, fstop)
+        mode, overlays = traces[0], [t for t in traces[1:] if t != traces[0]]
+        results = self.traces.update(data, overlays, monitor)
+        main = self.averager.average(data, mode, monitor)
+        spectra = {mode: Spectrum(main, srate, f0, df, offset_db, self._db_buffer, rbw)}
+        for trace, power in results.items():
+            spectra[trace] = Spectrum(power, srate, f0, df, offset_db, rbw=rbw)
+        return spectra
+
+    def _power(self, data, srate: float, window: str, method: str, gain: float,
+               offset: float, fstart: float, fstop: float) -> tuple:
+        """Compute the power spectrum before averaging.
+           Returns the power, f0, df, resolution bandwidth, dB offset and a
+           value that changes whenever the average must be reset.
+        """
+        nsamples = len(data)
+        if fstop is None:
+            fstop = srate / 2
+        if method in ('Zoom', 'CZT'):  # Frequencies above Nyquist would be aliases
+            fstart, fstop = max(fstart, 0.0), min(fstop, srate / 2)
+        span = fstop - fstart
+        decim = int(srate / (ZOOM_MARGIN * span)) if span > 0 else 0
+        if method == 'Zoom' and decim < 2:
+            method = 'FFT'  # Span too wide to benefit from zooming
+        if method == 'CZT' and span <= 0:
+            method = 'FFT'  # Span entirely above Nyquist
+
+        # Compute the (mean) power in each frequency bin
+        match method:
+            case 'FFT' | 'Welch':
+                data, ws = self._segment_power(data, window, method, gain, offset)
+                f0 = 0.0
+                df = srate / ws.nperseg
+                rbw = df
+                dc_bin = 0
+                limits = None
+            case 'Zoom':
+                fcentre = (fstart + fstop) / 2
+                data, ws = self._zoom_power(data, srate, window, gain, offset,
+                                            fcentre, span, decim)
+                f0 = ws.f0
+                df = ws.df
+                rbw = srate / nsamples
+                dc_bin = round(-f0 / df)
+                if not 0 <= dc_bin < len(data) or abs(f0 + dc_bin * df) > df / 2:
+                    dc_bin = None  # No DC term in the span
+                limits = (fstart, fstop)
+            case 'CZT':
+                data, ws = self._czt_power(data, srate, window, gain, offset,
+                                           fstart, fstop)
+                f0 = ws.f0
+                df = ws.df  # Spacing of the points, which may be much less than the RBW
+                rbw = srate / nsamples
+                dc_bin = 0 if fstart == 0 else None
+                limits = (fstart, fstop, self.czt_points)
+            case _:
+                raise ValueError('Unknown method: ', method)
+
+        # Double to correct for one-sided spectrum, except for DC term
+        if dc_bin is not None:
+            data[dc_bin] *= 0.5
+
+        # Reduce to display resolution, which does not change the RBW
+        if 0 < self.display_points < len(data):
+            data, f0, df = self._reduce(data, f0, df, fstart, fstop)
+            limits = (fstart, fstop, self.display_points)
+
+        # Reset average if this changes
+        monitor = (nsamples, srate, window, method, self.segment, self.overlap,
+                   self.dtype, limits)
+        return data, f0, df, rbw, ws.offset_db + DB3, monitor
+
+    def _db_buffer(self, n: int) -> npa:
+        """Return a reusable buffer for n dB values.
+           This is only allocated if a spectrum is converted to dB.
+        """
+        if self._db is None or self._db.shape != (n,) or self._db.dtype != self.dtype:
+            self._db = None  # Release old buffer first
+            self._db = np.empty(n, self.dtype)
+        return self._db
+
+    def _reduce(self, data: npa, f0: float, df: float, fstart: float,
+                fstop: float) -> tuple[npa, float, float]:
+        """Reduce the bins in the span to the maximum of each group of k bins.
+           Returns the reduced power, its f0 and df.
+        """
+        nbins = len(data)
+        imin = min(nbins - 1, max(0, math.floor((fstart - f0) / df)))
+        imax = min(nbins - 1, math.ceil((fstop - f0) / df))
+        nspan = imax - imin + 1
+        k = -(-nspan // self.display_points)  # Bins per point
+        if k < 2:
+            return data, f0, df
+        n = min(-(-nspan // k), (nbins - imin) // k)
+        if self._reduced is None or self._reduced.shape != (n,) \
+                or self._reduced.dtype != self.dtype:
+            self._reduced = np.empty(n, self.dtype)
+        groups = data[imin:imin + n * k].reshape(n, k)
+        np.max(groups, axis=1, out=self._reduced)
+        return self._reduced, f0 + (imin + (k - 1) / 2) * df, k * df
+
+    def _segment_power(self, data, window: str, method: str, gain: float,
+                       offset: float) -> tuple[npa, Workspace]:
+        """Power spectrum for the FFT and Welch methods"""
+        nsamples = len(data)
+        if method == 'Welch':
+            nperseg = min(self.segment, nsamples)
+        else:
+            nperseg = nsamples
+        step = max(1, round(nperseg * (1.0 - self.overlap)))
+        nseg = (nsamples - nperseg) // step + 1
+        batch = min(nseg, max(1, WELCH_BATCH // nperseg))  # Segments per FFT
+
+        ws = self._get_workspace((nsamples, window, self.dtype, nperseg, step),
+                                 nperseg, nseg, batch, window)
+        ws.set_gain(gain)
+        return self._mean_power(ws, data, nperseg, step, nseg, batch, offset), ws
+
+    def _zoom_power(self, data, srate: float, window: str, gain: float, offset: float,
+                    fcentre: float, span: float, decim: int) -> tuple[npa, ZoomWorkspace]:
+        """Power spectrum of the span around fcentre (zoom FFT).
+
+        The frame is mixed down to baseband, then low-pass filtered and
+        decimated by a polyphase filter, so that the FFT and averaging
+        only have to handle the bins in the span.
+        """
+        key = ('Zoom', len(data), srate, fcentre, span, decim, window, self.dtype)
+        ws = self._workspace
+        if ws is None or ws.key != key:
+            self._workspace = ws = None  # Release old buffers first
+            self._workspace = ws = ZoomWorkspace(key, len(data), srate, fcentre,
+                                                 span, decim, window, self.dtype)
+
+        # Mix down to baseband and decimate, then window and transform
+        baseband = ws.mix_down(data, gain, offset)
+        if ws.window is not None:
+            baseband *= ws.window
+        spectrum = self.fft.fft(baseband, out=ws.spectrum)
+        np.absolute(spectrum, out=ws.power)
+        np.multiply(ws.power, ws.power, out=ws.power)
+        np.take(ws.power, ws.bins, out=ws.span)
+        return ws.span, ws
+
+    def _czt_power(self, data, srate: float, window: str, gain: float, offset: float,
+                   fstart: float, fstop: float) -> tuple[npa, CztWorkspace]:
+        """Power spectrum at the display frequencies (chirp-Z transform).
+
+        Unlike the FFT, the points need not be spaced at srate / n, so the
+        spectrum can be evaluated directly on the display grid. Features
+        narrower than the point spacing may fall between points.
+        """
+        key = ('CZT', len(data), srate, fstart, fstop, self.czt_points, window, self.dtype)
+        ws = self._workspace
+        if ws is None or ws.key != key:
+            self._workspace = ws = None  # Release old buffers first
+            self._workspace = ws = CztWorkspace(key, len(data), srate, fstart, fstop,
+                                                self.czt_points, window, self.dtype)
+        ws.set_gain(gain)
+        np.multiply(data, ws.scaled_window, out=ws.samples)
+        spectrum = ws.transform(ws.samples)
+        if offset != 0:
+            spectrum += ws.get_dc_response() * offset
+        np.absolute(spectrum, out=ws.power)
+        np.multiply(ws.power, ws.power, out=ws.power)
+        return ws.power, ws
+
+    def _get_workspace(self, key, nperseg: int, nseg: int, batch: int,
+                       window: str) -> Workspace:
+        """Return the workspace for the key, replacing any previous one"""
+        if self._workspace is None or self._workspace.key != key:
+            self._workspace = None  # Release old buffers first
+            self._workspace = Workspace(key, nperseg, nseg, batch, window, self.dtype)
+        return self._workspace
+
+    def _mean_power(self, ws: Workspace, data: npa, nperseg: int, step: int,
+                    nseg: int, batch: int, offset: float) -> npa:
+        """Power spectrum averaged over overlapping segments (Welch method).
 
-        return data, srate
+        The segments are a strided view of the capture, so they are not
+        copied. They are transformed in batches of WELCH_BATCH samples,
+        so memory use depends on the segment size and not the capture size.
+        With a single segment, this is the power spectrum of the whole frame.
+        """
+        segments = sliding_window_view(data, nperseg)[::step]
+        dc_offset = ws.get_dc_response(self.fft) * offset if offset != 0 else None
+        for i in range(0, nseg, batch):
+            m = min(batch, nseg - i)
+            samples = ws.samples[:m]
+            if ws.scaled_window is not None:
+                np.multiply(segments[i:i + m], ws.scaled_window, out=samples)
+            elif ws.gain != 1.0:
+                np.multiply(segments[i:i + m], ws.gain, out=samples)
+            else:
+                np.copyto(samples, segments[i:i + m])
+            spectra = self.fft.rfft(samples, out=ws.spectra[:m])
+            if dc_offset is not None:
+                spectra[:, :len(dc_offset)] += dc_offset
+            power = ws.power[:m]
+            np.absolute(spectra, out=power)
+            np.multiply(power, power, out=power)  # Needed for power averaging
+            if nseg == 1:
+                return power[0]
+            if i == 0:
+                np.sum(power, axis=0, out=ws.mean)
+            else:
+                np.sum(power, axis=0, out=ws.total)
+                ws.mean += ws.total
+        ws.mean /= nseg
+        return ws.mean
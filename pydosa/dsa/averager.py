@@ -8,14 +8,31 @@ Copyright (c) 2020 Jon Brumfitt
 import numpy as np
 from numpy import array as npa
 
+NAVG = 100  # Default number of frames for 'Linear' averaging
+
 
 class Averager(object):
-    """Calculates element-wise average/min/max"""
+    """Calculates element-wise average/min/max.
+
+    The running result is updated in place. It is stored with the given
+    dtype, e.g. float32 to halve its memory, or the input dtype if None.
+
+    The 'Linear' mode is the equally weighted mean of navg frames, after
+    which it is complete and further frames are ignored. As the frames
+    are power spectra, this is an RMS average of the amplitude. The
+    per-bin variance is also accumulated, using Welford's method, and
+    summarised by the relative standard error of the average.
+    """
 
-    def __init__(self, alpha):
+    def __init__(self, alpha, dtype=None, navg: int = NAVG):
         """Initialization"""
         self._average = None
         self._alpha = alpha
+        self.dtype = dtype
+        self.navg = navg
+        self._m2 = None  # Sum of squared differences from the mean
+        self._delta = None  # Workspace for Welford's method
+        self._temp = None
         self._count = 0  # Averaging count
         self._last_mode = None
         self._monitor = None
@@ -23,9 +40,45 @@ class Averager(object):
     def reset(self) -> None:
         """Reset the averager and release storage"""
         self._average = None
+        self._m2 = None
+        self._delta = None
+        self._temp = None
         self._count = 0  # Averaging count
         self._last_mode = None
 
+    @property
+    def count(self) -> int:
+        """Number of frames in the 'Linear' average"""
+        return self._count if self._last_mode == 'Linear' else 0
+
+    @property
+    def complete(self) -> bool:
+        """True when the 'Linear' average has all navg frames"""
+        return self._last_mode == 'Linear' and self._count >= self.navg
+
+    def variance(self) -> npa:
+        """Return the per-bin sample variance of the 'Linear' average,
+           or None if there are fewer than 2 frames. This is written to
+           a workspace buffer, so it is only valid until the next frame."""
+        if self.count < 2:
+            return None
+        return np.divide(self._m2, self._count - 1, out=self._temp)
+
+    def relative_error(self) -> float | None:
+        """Return the median over the bins of the standard error of the
+           'Linear' average relative to the average, or None if there are
+           fewer than 2 frames. This overwrites the variance buffer."""
+        error = self.variance()
+        if error is None:
+            return None
+        error *= 1.0 / self._count  # Variance of the mean
+        np.sqrt(error, out=error)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(error, self._average, out=error)
+        middle = len(error) // 2
+        error.partition(middle)  # In place, unlike np.median
+        return float(error[middle])
+
     def average(self, data: npa, mode, monitor=None) -> npa:
         """Calculate element-wise average/min/max.
            Averaging is reset if the value of monitor changes."""
@@ -39,16 +92,22 @@ class Averager(object):
             self._count = 0
 
         if self._average is None:
-            self._average = np.array(data)  # Clone array
+            self._average = np.array(data, dtype=self.dtype)  # Clone array
+            if mode == 'Linear':
+                self._m2 = np.zeros_like(self._average)
+                self._delta = np.empty_like(self._average)
+                self._temp = np.empty_like(self._average)
+                self._count = 1
+                data = self._average
         else:
             match mode:
                 case 'Normal':
                     pass
                 case 'Maximum':
-                    self._average = np.maximum(self._average, data)
+                    np.maximum(self._average, data, out=self._average)
                     data = self._average
                 case 'Minimum':
-                    self._average = np.minimum(self._average, data)
+                    np.minimum(self._average, data, out=self._average)
                     data = self._average
                 case 'Average':
                     # Exponential averager with variable alpha for fast start-up.
@@ -56,9 +115,26 @@ class Averager(object):
                     alpha = 1.0 / (self._count + 1)
                     if alpha < self._alpha:
                         alpha = self._alpha
+                    # In-place form of: (1 - alpha) * average + alpha * data
+                    self._average -= data
                     self._average *= (1.0 - alpha)
-                    self._average += data * alpha
+                    self._average += data
+                    data = self._average
+                case 'Linear':
+                    if self._count < self.navg:
+                        self._count += 1
+                        self._welford(data)
                     data = self._average
                 case _:
                     raise ValueError("Unknown mode")
         return data
+
+    def _welford(self, data: npa) -> None:
+        """Add a frame to the mean and variance using Welford's method"""
+        mean, delta, temp = self._average, self._delta, self._temp
+        np.subtract(data, mean, out=delta)  # Difference from old mean
+        np.multiply(delta, 1.0 / self._count, out=temp)
+        mean += temp
+        np.subtract(data, mean, out=temp)  # Difference from new mean
+        temp *= delta
+        self._m2 += temp
@@ -0,0 +1,60 @@
+"""
+Pool of sample buffers reused across acquisitions.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import threading
+
+import numpy as np
+from numpy import array as npa
+
+# Buffers kept for reuse. This covers one frame being acquired, one
+# waiting in the queue and one being analysed.
+POOL_SIZE = 3
+
+
+class BufferPool(object):
+    """Pool of preallocated sample buffers.
+
+    The acquisition thread takes a buffer from the pool for each frame
+    and the analysis thread returns it when it has finished with it.
+    In the steady state, the same few buffers are reused, so there is
+    no large allocation per frame. A new buffer is allocated if none
+    of the right size and dtype is free, so acquire() never blocks.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        """Initialization
+           :param size: Maximum number of free buffers kept
+        """
+        self.size = size
+        self._free = []
+        self._lock = threading.Lock()
+        self.allocations = 0  # Number of buffers allocated
+
+    def acquire(self, nsamples: int, dtype) -> npa:
+        """Return a buffer of nsamples elements of the given dtype"""
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for i, buf in enumerate(self._free):
+                if buf.shape == (nsamples,) and buf.dtype == dtype:
+                    return self._free.pop(i)
+            self._free.clear()  # The frame size or dtype has changed
+            self.allocations += 1
+        return np.empty(nsamples, dtype)
+
+    def release(self, samples: npa) -> None:
+        """Return a buffer to the pool.
+           The samples may be the buffer or a leading slice of it.
+        """
+        buf = samples if samples.base is None else samples.base
+        with self._lock:
+            if len(self._free) < self.size and not any(b is buf for b in self._free):
+                self._free.append(buf)
+
+    def clear(self) -> None:
+        """Release all the free buffers"""
+        with self._lock:
+            self._free.clear()
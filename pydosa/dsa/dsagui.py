@@ -4,23 +4,27 @@ Main application GUI for the spectrum analyzer.
 Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
+import queue
 import sys
+from functools import partial
 from tkinter import Frame, Button, Label, OptionMenu, StringVar, Menu
+from tkinter import BooleanVar, Menubutton
 from tkinter import Tk
 from tkinter import messagebox
 from tkinter.constants import SUNKEN
 
-from numpy import array as npa
-
 import pydosa
 from pydosa.dsa import instrument
-from pydosa.dsa.analyzer import Analyzer
+from pydosa.dsa.analysis_thread import AnalysisThread, PlotData, Settings
+from pydosa.dsa.analyzer import PRECISIONS, Analyzer, read_config
 from pydosa.dsa.preferences_dialog import PreferencesDialog
+from pydosa.dsa.scope_process import ScopeProcess
 from pydosa.dsa.scope_thread import ScopeThread
 from pydosa.dsa.spectrum_plot import SpectrumPlot
 from pydosa.sim.sim_driver import SimDriver
 from pydosa.sim.wavegen import WaveGen
 from pydosa.sim.wavegen_panel import WavegenPanel
+from pydosa.util.drop_queue import DropQueue
 from pydosa.util.preferences_manager import PreferencesManager
 from pydosa.util.settable_option_menu import SettableOptionMenu
 
@@ -31,12 +35,18 @@ RESOURCES = 'pydosa.data'
 # Initial option settings
 INITIAL_MODE = 'Normal'
 INITIAL_WINDOW = 'Hanning'
+INITIAL_METHOD = 'FFT'
 DESELECTED_ITEM = '-'
 INITIAL_FMAX = 100e6
 
+# Virtual event sent by the analysis thread when a frame is ready to draw
+FRAME_READY = '<<FrameReady>>'
+
 # Option lists displayed in menus
-MODES = ['Normal', 'Average', 'Maximum', 'Minimum']
+MODES = ['Normal', 'Average', 'Maximum', 'Minimum', 'Linear']
 WINDOWS = ['Rectangle', 'Hanning', 'Flat-Top', 'Blackman']
+METHODS = ['FFT', 'Welch', 'Zoom', 'CZT']
+OVERLAYS = ['Normal', 'Average', 'Maximum', 'Minimum']
 
 
 class DsaGui(object):
@@ -50,11 +60,16 @@ class DsaGui(object):
         self.window = INITIAL_WINDOW
         # self.units: str = INITIAL_UNIT
         self.mode: str = INITIAL_MODE
+        self.method: str = INITIAL_METHOD
+        self.overlay_vars = {}  # Overlay trace selections
         self._infovar = None
         self._pause_button = None
         self.wavegen = None
         self.wavepane = None
         self.thread = None
+        self.analysis = None  # Analysis thread
+        self.plots = DropQueue(1)  # Frames ready to draw
+        self.linear_complete = False
         self.fstart: float = 0  # Initial minimum frequency (Hz)
         self.fstop: float = 1e8  # Initial maximum frequency (Hz))
         self.plotter = None
@@ -67,7 +82,11 @@ class DsaGui(object):
         self.rbw_var = None
 
         self._running = False
-        self.analyzer = Analyzer()
+        try:
+            self.analyzer = Analyzer(self.prefs.config['ANALYZER'])
+        except ValueError as exc:
+            print('Invalid analyzer preferences:', exc)
+            self.analyzer = Analyzer()
         self.create_gui(root)
         self.init_menus()
 
@@ -79,6 +98,7 @@ class DsaGui(object):
     def running(self, value: bool):
         self._running = value
         self.set_run_button(value)  # FIXME: Perhaps only if changed?
+        self.update_settings()
 
     # ---------- Application logic ----------
 
@@ -86,6 +106,7 @@ class DsaGui(object):
         """Connect driver"""
         if driver is None:
             self.init_menus()
+            self.show_disconnected()
             return
 
         # Configure instrument-specific menus
@@ -94,14 +115,29 @@ class DsaGui(object):
 
         # Stop any existing driver
         self.running = False
-        if self.thread is not None:
-            self.thread.close()
-            self.thread = None
+        self.close_driver()
 
         # Initialize with new driver
+        driver.dtype = self.analyzer.dtype
         try:
-            self.thread = ScopeThread(driver)
+            frames = DropQueue(1)
+            device = self.prefs.config['DEVICE']
+            if device.getboolean('acquisition_process', False) and driver.address:
+                # The acquisition process makes its own connection
+                driver_cls = type(driver)
+                driver.close()
+                self.thread = ScopeProcess(partial(instrument.open_driver, driver_cls,
+                                                   driver.address, driver.transport),
+                                           driver_cls, frames)
+                self.thread.set_dtype(self.analyzer.dtype)
+            else:
+                self.thread = ScopeThread(driver, frames)
+            self.analysis = AnalysisThread(self.analyzer, frames, self.plots,
+                                           self.notify_frame_ready,
+                                           self.thread.release_frame)
+            self.update_settings()
             self.thread.start()
+            self.analysis.start()
             self.running = True
 
         # This exception should not normally occur
@@ -112,51 +148,70 @@ class DsaGui(object):
 
     def start_app(self) -> None:
         """Start application after event loop is started"""
+        self.root.bind(FRAME_READY, self.frame_ready)
+        if self.thread is None and self.prefs.config['DEVICE'].getboolean('auto_connect', False):
+            driver = instrument.reconnect(self.prefs)  # Last instrument used, if available
+            if driver is not None:
+                self.connect(driver)
         if self.thread is not None:
             self.running = True
-        self.run_loop()
-
-    def process_data(self, measurement: tuple[npa, float]) -> None:
-        """Analyse sample data and plot spectrum."""
-        if measurement is not None:
-            wave, sample_rate = measurement
-            if wave is None or len(wave) == 0:
-                return
-            self.root.update()
-
-            # Compute the spectrum
-            data, srate = self.analyzer.compute_spectrum(wave, sample_rate,
-                                                         self.mode, self.window)
-            self.root.update()
-
-            # Update spectrum plot)
-            # self.plotter.set_range(self.fstart, self.fstop)
-            self.plotter.plot_spectrum(data, sample_rate)
-
-            # Update info panel
-            ns = len(wave)
-            rbw = float(sample_rate) / ns
-            self.rbw_var.set('{:.1f}'.format(rbw))
-            self.root.update()
-
-    def run_loop(self) -> None:
+        else:
+            self.show_disconnected()
+
+    def update_settings(self) -> None:
+        """Pass the current settings to the acquisition and analysis threads"""
+        if self.thread is None or self.analysis is None:
+            return
+        self.thread.paused = not self.running
+        self.thread.set_options(self.nsamples, self.srate)
+        overlays = tuple(t for t in OVERLAYS if self.overlay_vars[t].get())
+        self.analysis.settings = Settings(self.mode, self.window, self.method,
+                                          overlays, self.plotter.view())
+
+    def render(self, plot: PlotData) -> None:
+        """Draw a frame that has been analysed."""
+        self.plotter.draw_traces(plot.traces)
+        self.plotter.show_message('Bins/pixel=%.2f' % plot.bins_per_pixel)
+
+        # Update info panel
+        self.rbw_var.set('{:.1f}'.format(plot.rbw))
+        self.linear_complete = plot.complete
+        if self.mode == 'Linear':
+            error = '' if plot.error_db is None else ' (\u00b1{:.2f} dB)'.format(plot.error_db)
+            self.show_message('Linear average: {} of {} frames{}'.format(
+                plot.count, plot.navg, error))
+            if plot.complete:
+                self.running = False  # Stop when the average is complete
+                self.show_message('Linear average of {} frames complete{}'.format(
+                    plot.navg, error))
+
+    def notify_frame_ready(self) -> None:
+        """Called by the analysis thread to wake the Tk event loop"""
+        self.root.event_generate(FRAME_READY, when='tail')
+
+    def frame_ready(self, _event) -> None:
+        """Draw the latest analysed frame"""
+        try:
+            plot = self.plots.get_nowait()
+        except queue.Empty:
+            return  # Already drawn in response to an earlier event
         if self.running:
-            if self.thread.is_ready():
-                measurement = self.thread.get_data(self.nsamples, self.srate)
-                self.process_data(measurement)
+            self.render(plot)
 
-        elif self.thread is None:
-            # FIXME: No need to redraw unless there has been a change event
-            self.plotter.clear(self.fstart, self.fstop)
-            self.wavepane.pack_forget()
-            self.root.update()
-        self.root.after(10, self.run_loop)
+    def show_disconnected(self) -> None:
+        """Show an empty plot when no instrument is connected"""
+        self.plotter.clear(self.fstart, self.fstop)
+        self.wavepane.pack_forget()
 
     def close_driver(self) -> None:
         """Close the instrument driver."""
+        if self.analysis is not None:
+            self.analysis.shutdown()  # Finish with any frame before its buffer is freed
+            self.analysis = None
         if self.thread is not None:
-            self.thread.close()
+            self.thread.shutdown()  # Let any transfer finish
             self.thread = None
+        self.plots.clear()
 
     def quit(self) -> None:
         """Quit the application"""
@@ -206,6 +261,18 @@ class DsaGui(object):
         label = Label(upper_frame, text='Mode')
         label.grid(row=1, column=col)
 
+        col += 1
+        overlaybox = Menubutton(upper_frame, text='Traces', relief='raised')
+        overlay_menu = Menu(overlaybox, tearoff=0)
+        for trace in OVERLAYS:
+            self.overlay_vars[trace] = BooleanVar(value=False)
+            overlay_menu.add_checkbutton(label=trace, variable=self.overlay_vars[trace],
+                                         command=self.update_settings)
+        overlaybox.config(menu=overlay_menu)
+        overlaybox.grid(row=0, column=col)
+        label = Label(upper_frame, text='Overlay')
+        label.grid(row=1, column=col)
+
         col += 1
         window_var = StringVar()
         window_var.set(INITIAL_WINDOW)
@@ -215,6 +282,15 @@ class DsaGui(object):
         label = Label(upper_frame, text='Window')
         label.grid(row=1, column=col)
 
+        col += 1
+        method_var = StringVar()
+        method_var.set(INITIAL_METHOD)
+        methodbox = OptionMenu(upper_frame, method_var,
+                               *METHODS, command=self.method_callback)
+        methodbox.grid(row=0, column=col)
+        label = Label(upper_frame, text='Method')
+        label.grid(row=1, column=col)
+
         col += 1
         label = Label(upper_frame, text='    ')  # Space
         label.grid(row=0, column=col)
@@ -263,7 +339,7 @@ class DsaGui(object):
         self._pause_button.grid(row=0, column=col)
 
         # Add the spectrum plot
-        self.plotter = SpectrumPlot(main_frame, INITIAL_FMAX)
+        self.plotter = SpectrumPlot(main_frame, INITIAL_FMAX, self.update_settings)
 
         # Status line
         self._infovar = StringVar()
@@ -318,8 +394,22 @@ class DsaGui(object):
         self.running = False
         self.prefs.load()
         ok = PreferencesDialog.ask(self.root, self.prefs.config)
+        if ok:
+            try:
+                read_config(self.prefs.config['ANALYZER'])
+            except ValueError as exc:
+                self.prefs.load()  # Discard the invalid settings
+                messagebox.showerror('Error', str(exc), parent=self.root)
+                ok = False
         if ok:
             self.prefs.save()
+            if self.analysis is not None:
+                self.analysis.configure(self.prefs.config['ANALYZER'])
+            else:
+                self.analyzer.configure(self.prefs.config['ANALYZER'])
+            if self.thread is not None:
+                self.thread.set_dtype(PRECISIONS[
+                    self.prefs.config['ANALYZER'].get('precision', 'double')])
         self.running = True
 
     def choose_instrument(self) -> None:
@@ -344,11 +434,15 @@ class DsaGui(object):
         self.close_driver()
         self.setup_srate_menu([DESELECTED_ITEM], DESELECTED_ITEM)
         self.setup_samples_menu([DESELECTED_ITEM], DESELECTED_ITEM)
+        self.show_disconnected()
 
     def toggle_pause_callback(self):
         """Callback to toggle the pause state."""
         if self.thread is None:
             return
+        if not self.running and self.linear_complete:
+            self.linear_complete = False
+            self.analysis.reset_average()  # Start a new linear average
         self.running = not self.running
 
     def set_run_button(self, running: bool) -> None:
@@ -361,10 +455,17 @@ class DsaGui(object):
     def mode_callback(self, option: StringVar) -> None:
         """Callback to change the averaging mode"""
         self.mode = option
+        self.update_settings()
 
     def window_callback(self, option: StringVar) -> None:
         """Callback to change the FFT window function"""
         self.window = option
+        self.update_settings()
+
+    def method_callback(self, option: StringVar) -> None:
+        """Callback to change the spectrum estimation method"""
+        self.method = option
+        self.update_settings()
 
     def samples_callback(self, option: str) -> None:
         """Callback to change the number of samples"""
@@ -372,6 +473,7 @@ class DsaGui(object):
             self.nsamples = '0'
         else:
             self.nsamples = option
+        self.update_settings()
 
     def srate_callback(self, option: str) -> None:
         """Callback to change the minimum sample rate"""
@@ -379,6 +481,7 @@ class DsaGui(object):
             self.srate = '0'
         else:
             self.srate = option
+        self.update_settings()
 
 
 def main():
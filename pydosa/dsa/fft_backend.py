@@ -0,0 +1,182 @@
+"""
+Pluggable FFT backends for the spectrum analyzer.
+
+The numpy FFT is always available. The scipy FFT can use several
+worker threads. The pyFFTW backend is optional and is only available
+if the pyfftw package is installed. It caches the FFTW plan for each
+array shape and dtype, and saves the FFTW wisdom to a file, so the
+planning cost is only paid once and not again in each session.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import json
+import os
+
+import numpy as np
+import scipy.fft
+from numpy import array as npa
+
+from pydosa.util.util import write_atomic
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+BACKENDS = ['numpy', 'scipy', 'pyfftw']
+
+WISDOM_FILE = '~/.pydosa/fftw_wisdom.json'  # Default file for FFTW wisdom
+
+# The 'out' argument of numpy.fft was added in numpy 2.0
+NUMPY_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= '2.0.0'
+
+
+class FftBackend(object):
+    """Base class for an FFT backend."""
+
+    name = ''
+
+    def rfft(self, data: npa, out: npa = None) -> npa:
+        """Real FFT along the last axis, normalized by 1/n.
+           The result is written to 'out' if it is given.
+        """
+        raise NotImplementedError
+
+    def fft(self, data: npa, out: npa = None) -> npa:
+        """Complex FFT along the last axis, normalized by 1/n.
+           The result is written to 'out' if it is given.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _store(result: npa, out: npa) -> npa:
+        """Copy result to the output array, if there is one"""
+        if out is None:
+            return result
+        np.copyto(out, result)
+        return out
+
+
+class NumpyBackend(FftBackend):
+    """Single-threaded numpy FFT."""
+
+    name = 'numpy'
+
+    def rfft(self, data: npa, out: npa = None) -> npa:
+        if NUMPY_FFT_OUT:
+            return np.fft.rfft(data, norm='forward', axis=-1, out=out)
+        return self._store(np.fft.rfft(data, norm='forward', axis=-1), out)
+
+    def fft(self, data: npa, out: npa = None) -> npa:
+        if NUMPY_FFT_OUT:
+            return np.fft.fft(data, norm='forward', axis=-1, out=out)
+        return self._store(np.fft.fft(data, norm='forward', axis=-1), out)
+
+
+class ScipyBackend(FftBackend):
+    """Multi-threaded scipy FFT."""
+
+    name = 'scipy'
+
+    def __init__(self, workers: int = -1):
+        """Initialization
+           :param workers: Number of threads (-1 for all CPUs)
+        """
+        self.workers = workers
+
+    def rfft(self, data: npa, out: npa = None) -> npa:
+        return self._store(scipy.fft.rfft(data, norm='forward', axis=-1,
+                                          workers=self.workers), out)
+
+    def fft(self, data: npa, out: npa = None) -> npa:
+        return self._store(scipy.fft.fft(data, norm='forward', axis=-1,
+                                         workers=self.workers), out)
+
+
+class FftwBackend(FftBackend):
+    """Multi-threaded FFTW with plans cached by (shape, dtype).
+
+    If no output array is given, the returned array belongs to the cached
+    plan, so it is overwritten by the next transform of the same shape.
+
+    Measuring a plan for a long transform can take many seconds, so plans
+    are only measured if there is a wisdom file, where the result is
+    saved for later sessions. Otherwise, FFTW estimates the plan.
+    """
+
+    name = 'pyfftw'
+
+    def __init__(self, workers: int = -1, wisdom_file: str = WISDOM_FILE):
+        """Initialization
+           :param workers: Number of threads (-1 for all CPUs)
+           :param wisdom_file: File for FFTW wisdom, or None (or '') for none
+        """
+        if pyfftw is None:
+            raise ImportError('pyFFTW is not installed')
+        self.threads = workers if workers > 0 else os.cpu_count()
+        self.wisdom_file = os.path.expanduser(wisdom_file) if wisdom_file else None
+        self.planner_effort = 'FFTW_MEASURE' if self.wisdom_file else 'FFTW_ESTIMATE'
+        self._plans = {}
+        if self.wisdom_file:
+            load_wisdom(self.wisdom_file)
+
+    def rfft(self, data: npa, out: npa = None) -> npa:
+        return self._execute(pyfftw.builders.rfft, data, out)
+
+    def fft(self, data: npa, out: npa = None) -> npa:
+        return self._execute(pyfftw.builders.fft, data, out)
+
+    def _execute(self, builder, data: npa, out: npa) -> npa:
+        """Execute the cached plan for the builder, shape and dtype"""
+        key = (builder, data.shape, data.dtype)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = builder(pyfftw.empty_aligned(data.shape, data.dtype),
+                           axis=-1, threads=self.threads,
+                           planner_effort=self.planner_effort)
+            self._plans[key] = plan
+            if self.wisdom_file:
+                save_wisdom(self.wisdom_file)
+        result = plan(data)
+        result *= 1.0 / data.shape[-1]
+        return self._store(result, out)
+
+
+def load_wisdom(path: str) -> bool:
+    """Import FFTW wisdom saved by save_wisdom, if the file exists"""
+    try:
+        with open(path) as file:
+            wisdom = tuple(w.encode('ascii') for w in json.load(file))
+        pyfftw.import_wisdom(wisdom)
+        return True
+    except (OSError, ValueError, TypeError, AttributeError):
+        return False
+
+
+def save_wisdom(path: str) -> None:
+    """Export the FFTW wisdom accumulated so far to a file"""
+    wisdom = [w.decode('ascii') for w in pyfftw.export_wisdom()]
+    try:
+        write_atomic(path, lambda file: json.dump(wisdom, file))
+    except OSError as exc:
+        print('Cannot save FFTW wisdom:', exc)
+
+
+def get_backend(name: str, workers: int = -1, wisdom_file: str = WISDOM_FILE) -> FftBackend:
+    """Create the named FFT backend.
+       Falls back to numpy if pyFFTW is requested but not installed.
+    """
+    match name:
+        case 'numpy':
+            return NumpyBackend()
+        case 'scipy':
+            return ScipyBackend(workers)
+        case 'pyfftw':
+            if pyfftw is None:
+                print('pyFFTW not installed: using numpy FFT')
+                return NumpyBackend()
+            return FftwBackend(workers, wisdom_file)
+        case _:
+            raise ValueError('Unknown FFT backend: ', name)
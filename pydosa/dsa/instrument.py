@@ -5,72 +5,213 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 import importlib
+from concurrent.futures import ThreadPoolExecutor, wait
 from tkinter import messagebox
 
 import vxi11
 
+from pydosa.dsa.instrument_cache import CACHE_FILE, InstrumentCache
 from pydosa.dsa.scope_driver import ScopeDriver
+from pydosa.util import scpi_socket
 from pydosa.util.chooser_dialog import ChooserDialog
 from pydosa.util.preferences_manager import PreferencesManager
 from pydosa.util.util import compatible_version
 
+# Connections used to talk to the instrument once it has been chosen
+TRANSPORTS = ['vxi11', 'socket']
+
+VXI11_TIMEOUT = 10.0  # Default timeout of a vxi11.Instrument (seconds)
+PROBE_TIMEOUT = 2.0  # Seconds for each instrument to answer *IDN?
+PROBE_THREADS = 16  # Instruments probed concurrently
+
 
 def choose_instrument(prefs: PreferencesManager, root) -> ScopeDriver | None:
     """Choose a VXI-11 instrument and locate a compatible driver."""
-    plugins = prefs.config['DEVICE']['plugins'].split(',')
-
-    # Prompt use to select a VXI-11 instrument
-    devices = vxi11.list_devices()
-    items = []
-    devs = []
-    for host in devices:
-        instr = vxi11.Instrument(host)
-        idn = instr.ask('*IDN?')
-        fields = [host] + idn.strip().split(',')
-        devs.append(fields)
-        items.append('{} {} {}'.format(*fields))
-        instr.close()
-
-    if not devs:
+    device = prefs.config['DEVICE']
+    plugins = device['plugins'].split(',')
+    transport = device.get('transport', TRANSPORTS[0])
+    cache = InstrumentCache(device.get('instrument_cache', CACHE_FILE))
+
+    # Find instruments by broadcast, plus any known ones that did not answer it
+    hosts = list(dict.fromkeys(vxi11.list_devices() + cache.addresses()))
+    found = probe_instruments(hosts, transport)
+    if not found:
         messagebox.showerror('Error', 'No VXI-11 devices found', parent=root)
         return None
 
+    # Prompt use to select an instrument
+    items = ['{} {} {}'.format(host, *fields) for host, (_, fields) in found.items()]
     selected = ChooserDialog.ask(root, items, title='VXI-11 Instruments',
                                  message='Select instrument\n')
-    if not selected:
+    ip = selected.split()[0] if selected else None
+    for host, (instr, _) in found.items():
+        if host != ip:
+            discard(instr)
+    if ip is None:
+        return None
+
+    # Find a compatible driver and reuse the connection made by the probe
+    instr, fields = found[ip]
+    try:
+        driver_cls, plugin = find_driver(plugins, *fields)
+    except Exception as exc:
+        discard(instr)
+        messagebox.showerror("Error", str(exc), parent=root)
         return None
 
-    # Get details of selected instrument
-    ip = selected.split()[0]
-    fields = [d for d in devs if d[0] == ip]
-    ip, make, model, serial, firmware = fields[0]
+    cache.add(ip, fields, plugin)
+    return open_driver(driver_cls, ip, transport, instr)
 
-    # Find a compatible driver
-    found = None
+
+def reconnect(prefs: PreferencesManager) -> ScopeDriver | None:
+    """Connect to the most recently used instrument, without a broadcast.
+       Returns None if it does not answer or has been replaced by another.
+    """
+    device = prefs.config['DEVICE']
+    plugins = device['plugins'].split(',')
+    transport = device.get('transport', TRANSPORTS[0])
+    cache = InstrumentCache(device.get('instrument_cache', CACHE_FILE))
+    entry = cache.latest()
+    if entry is None:
+        return None
+
+    ip = entry['address']
+    found = probe_instruments([ip], transport)
+    if ip not in found:
+        return None
+    instr, fields = found[ip]
+    if fields[:3] != entry['idn'][:3]:  # Not the same make, model and serial number
+        discard(instr)
+        return None
     try:
-        for plugin in plugins:
-            mod = importlib.import_module(plugin)
-            driver_cls = getattr(mod, 'Driver')
-            if make.startswith(driver_cls.make) and model in driver_cls.models:
-                if compatible_version(driver_cls.min_firmware, firmware):
-                    found = driver_cls
-                    print('Loading plugin:', plugin)
-                    break
-                else:
-                    msg = ('Upgrade {} to firmware {} or later'
-                           .format(model, driver_cls.min_firmware))
-                    raise Exception(msg)
-
-        if found is None:
-            raise Exception('No driver found for {}'.format(model))
+        driver_cls, plugin = find_driver(plugins, *fields)
+    except Exception as exc:
+        discard(instr)
+        print('Warning:', exc)
+        return None
+
+    cache.add(ip, fields, plugin)
+    return open_driver(driver_cls, ip, transport, instr)
+
+
+def find_driver(plugins: list[str], make: str, model: str, serial: str,
+                firmware: str) -> tuple[type, str]:
+    """Return a driver class for the instrument and the name of its plugin.
+       Raises an exception if there is no compatible driver.
+    """
+    for plugin in plugins:
+        mod = importlib.import_module(plugin)
+        driver_cls = getattr(mod, 'Driver')
+        if make.startswith(driver_cls.make) and model in driver_cls.models:
+            if compatible_version(driver_cls.min_firmware, firmware):
+                print('Loading plugin:', plugin)
+                return driver_cls, plugin
+            else:
+                msg = ('Upgrade {} to firmware {} or later'
+                       .format(model, driver_cls.min_firmware))
+                raise Exception(msg)
+    raise Exception('No driver found for {}'.format(model))
+
 
+def probe_instruments(hosts: list[str], transport: str = TRANSPORTS[0],
+                      timeout: float = PROBE_TIMEOUT) -> dict[str, tuple]:
+    """Ask each host for its identity, concurrently.
+       Hosts that do not answer within the timeout are left out.
+       :return: (connection, [make, model, serial, firmware]) for each host
+    """
+    executor = ThreadPoolExecutor(max_workers=PROBE_THREADS, thread_name_prefix='probe')
+    futures = {executor.submit(probe, host, transport, timeout): host for host in hosts}
+    batches = -(-len(hosts) // PROBE_THREADS)
+    done, pending = wait(futures, timeout=timeout * batches + 1)
+    for future in pending:
+        future.add_done_callback(discard_late)
+    executor.shutdown(wait=False, cancel_futures=True)
+    results = {futures[f]: f.result() for f in done}
+    return {host: results[host] for host in hosts if results.get(host)}
+
+
+def probe(host: str, transport: str, timeout: float) -> tuple | None:
+    """Connect to a host and ask for its identity.
+       :return: (connection, [make, model, serial, firmware]) or None
+    """
+    try:
+        instr = open_instrument(host, transport, timeout)
     except Exception as exc:
-        messagebox.showerror("Error", str(exc), parent=root)
+        print('No response from {}: {}'.format(host, exc))
         return None
+    try:
+        fields = [f.strip() for f in instr.ask('*IDN?').strip().split(',')]
+        if len(fields) != 4:
+            raise ValueError('Invalid *IDN? response')
+    except Exception as exc:
+        print('No response from {}: {}'.format(host, exc))
+        discard(instr)
+        return None
+    instr.timeout = default_timeout(transport)
+    return instr, fields
 
-    # Instantiate driver and connect it to instrument
-    driver = found()  # Create instance
-    instr = vxi11.Instrument(ip)
-    driver.open(instr)
 
+def default_timeout(transport: str) -> float:
+    """Timeout that a new connection of the transport has (seconds)"""
+    match transport:
+        case 'vxi11':
+            return VXI11_TIMEOUT
+        case 'socket':
+            return scpi_socket.TIMEOUT
+        case _:
+            raise ValueError('Unknown transport: {}'.format(transport))
+
+
+def discard_late(future) -> None:
+    """Close the connection made by a probe that answered too late.
+       Probes cancelled before they started have no connection.
+    """
+    if future.cancelled():
+        return
+    result = future.result()
+    if result is not None:
+        discard(result[0])
+
+
+def discard(instr) -> None:
+    """Close a connection without returning it to a pool"""
+    try:
+        getattr(instr, 'disconnect', instr.close)()
+    except Exception:
+        pass
+
+
+def open_driver(driver_cls, address: str, transport: str = TRANSPORTS[0],
+                instr=None) -> ScopeDriver:
+    """Instantiate a driver and connect it to the instrument.
+       This is also used to reconnect from an acquisition process.
+       :param instr: Existing connection to the instrument, if any
+    """
+    driver = driver_cls()  # Create instance
+    if instr is None:
+        instr = open_instrument(address, transport)
+    driver.open(instr)
+    driver.address = address
+    driver.transport = transport
     return driver
+
+
+def open_instrument(address: str, transport: str = TRANSPORTS[0], timeout: float = None):
+    """Open a connection to an instrument.
+       :param address: Host name or IP address, optionally with ':port' for a socket
+       :param transport: 'vxi11', or 'socket' for SCPI over a raw TCP socket
+       :param timeout: Timeout for each operation (seconds), or None for the default
+       :return: Connection with ask, write, read_raw and close methods
+    """
+    match transport:
+        case 'vxi11':
+            instr = vxi11.Instrument(address)
+        case 'socket':
+            host, _, port = address.partition(':')
+            kwargs = {} if timeout is None else {'timeout': timeout}
+            instr = scpi_socket.pool.connect(host, int(port or scpi_socket.SCPI_PORT), **kwargs)
+        case _:
+            raise ValueError('Unknown transport: {}'.format(transport))
+    if timeout is not None:
+        instr.timeout = timeout
+    return instr
@@ -0,0 +1,59 @@
+"""
+On-disk cache of known instruments.
+
+Each instrument that has been connected is recorded with its address,
+its *IDN? fields and the plugin that drives it, most recent first. This
+lets the application reconnect at startup without a VXI-11 broadcast,
+and probe instruments that do not answer the broadcast.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import json
+import os
+
+CACHE_FILE = '~/.pydosa/instruments.json'
+MAX_ENTRIES = 10
+
+
+class InstrumentCache(object):
+    """On-disk cache of known instruments"""
+
+    def __init__(self, filename: str = CACHE_FILE):
+        """Initialization"""
+        self.filename = os.path.expanduser(filename)
+        self.entries = self._load()
+
+    def _load(self) -> list[dict]:
+        """Read the cache file, ignoring it if missing or invalid"""
+        try:
+            with open(self.filename) as file:
+                entries = json.load(file)
+            return [e for e in entries if {'address', 'idn', 'plugin'} <= set(e)]
+        except (OSError, ValueError, TypeError):
+            return []
+
+    def save(self) -> None:
+        """Write the cache file"""
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(self.filename, 'w') as file:
+                json.dump(self.entries, file, indent=2)
+        except OSError as exc:
+            print('Warning: cannot save instrument cache:', exc)
+
+    def addresses(self) -> list[str]:
+        """Addresses of the known instruments, most recent first"""
+        return [e['address'] for e in self.entries]
+
+    def latest(self) -> dict | None:
+        """The most recently used instrument"""
+        return self.entries[0] if self.entries else None
+
+    def add(self, address: str, idn: list[str], plugin: str) -> None:
+        """Record an instrument as the most recently used and save the cache"""
+        entry = {'address': address, 'idn': list(idn), 'plugin': plugin}
+        others = [e for e in self.entries if e['address'] != address]
+        self.entries = [entry] + others[:MAX_ENTRIES - 1]
+        self.save()
@@ -5,8 +5,11 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 from configparser import ConfigParser
-from tkinter import Entry, StringVar, Label, Frame
+from tkinter import Entry, StringVar, Label, Frame, OptionMenu
+from tkinter import BooleanVar, Checkbutton
 
+from pydosa.dsa.fft_backend import BACKENDS
+from pydosa.dsa.instrument import TRANSPORTS
 from pydosa.util.modal_dialog import ModalDialog
 
 TEXT_COLOR = "#000000"
@@ -27,7 +30,10 @@ class PreferencesDialog(ModalDialog):
         self.config = config
         if not config.has_section('DEVICE'):
             config.add_section('DEVICE')
+        if not config.has_section('ANALYZER'):
+            config.add_section('ANALYZER')
         device = config['DEVICE']
+        analyzer = config['ANALYZER']
 
         self.server = device.get('server')
         self.v1 = None
@@ -35,6 +41,15 @@ class PreferencesDialog(ModalDialog):
         # self.plugins = device.get('plugins')
         # self.v2 = None
         # self.e2 = None
+        self.backend = analyzer.get('fft_backend', BACKENDS[0])
+        self.v3 = None
+        self.workers = analyzer.get('fft_workers', '-1')
+        self.v4 = None
+        self.e4 = None
+        self.process = device.getboolean('acquisition_process', False)
+        self.v5 = None
+        self.transport = device.get('transport', TRANSPORTS[0])
+        self.v6 = None
 
         self.result = False
         ModalDialog.__init__(self, parent, 'Preferences')
@@ -55,12 +70,62 @@ class PreferencesDialog(ModalDialog):
         # self.e2 = Entry(master, textvariable=self.v2)
         # self.e2.grid(row=1, column=1)
 
+        self.v3 = StringVar()
+        self.v3.set(self.backend)
+        label = Label(master, text='FFT backend')
+        label.grid(row=2, column=0)
+        backendbox = OptionMenu(master, self.v3, *BACKENDS)
+        backendbox.grid(row=2, column=1, sticky='ew')
+
+        self.v4 = StringVar()
+        self.v4.set(self.workers)
+        self.v4.trace("w", self.validate_workers)
+        label = Label(master, text='FFT threads')
+        label.grid(row=3, column=0)
+        self.e4 = Entry(master, textvariable=self.v4)
+        self.e4.grid(row=3, column=1)
+
+        self.v5 = BooleanVar()
+        self.v5.set(self.process)
+        label = Label(master, text='Acquisition process')
+        label.grid(row=4, column=0)
+        processbox = Checkbutton(master, variable=self.v5)
+        processbox.grid(row=4, column=1, sticky='w')
+
+        self.v6 = StringVar()
+        self.v6.set(self.transport)
+        label = Label(master, text='Transport')
+        label.grid(row=5, column=0)
+        transportbox = OptionMenu(master, self.v6, *TRANSPORTS)
+        transportbox.grid(row=5, column=1, sticky='ew')
+
+    def validate_workers(self, *arg) -> bool:
+        """Highlight the number of FFT threads if invalid (-1 = all CPUs)."""
+        try:
+            value = int(self.v4.get())
+            if value == 0 or value < -1:
+                raise ValueError()
+            self.e4.config(fg=TEXT_COLOR)
+            return True
+        except ValueError:
+            self.e4.config(fg=INVALID_COLOR)
+            return False
+
+    def validate(self) -> bool:
+        """Validate content before accepting it"""
+        return self.validate_workers()
+
     def ok_action(self) -> None:
         """Callback for press of OK button"""
         try:
             device = self.config['DEVICE']
             device['server'] = self.v1.get()
             # device['plugins'] = self.v2.get()
+            device['acquisition_process'] = 'yes' if self.v5.get() else 'no'
+            device['transport'] = self.v6.get()
+            analyzer = self.config['ANALYZER']
+            analyzer['fft_backend'] = self.v3.get()
+            analyzer['fft_workers'] = self.v4.get()
             self.result = True
         except Exception as e:
             print(e)
@@ -5,14 +5,47 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from numpy import array as npa
 
 
+class AcquisitionCancelled(Exception):
+    """Raised by a driver when an acquisition is cancelled"""
+    pass
+
+
+class AcquisitionTimeout(Exception):
+    """Raised by a driver when an acquisition does not complete in time"""
+    pass
+
+
 class ScopeDriver(ABC):
     """Abstract base class for an oscilloscope driver."""
 
+    # Event that is set to cancel the current acquisition
+    cancel_event = None
+
+    # Network address of the instrument and the type of connection to it,
+    # if it is connected by open_driver
+    address = None
+    transport = None
+
+    # Floating point type of the samples returned by fetch_data.
+    # This is set to match the precision used by the analyzer.
+    dtype = np.float64
+
+    # Type of the samples returned by fetch_raw, if they are raw ADC codes
+    # (e.g. np.int8). None if they are already in volts, of type dtype.
+    raw_dtype = None
+
+    # Maximum number of samples per transfer, for drivers that implement
+    # transfer_chunk. None to transfer all the samples at once.
+    chunk_size = None
+
     @property
     @abstractmethod
     def make(self) -> str:
@@ -78,12 +111,136 @@ class ScopeDriver(ABC):
     @abstractmethod
     def fetch_data(self, nsamples: int, srate_option: str) -> tuple[npa, float]:
         """Acquire sample data, scaled to volts
+        The samples should be of type self.dtype.
         :param nsamples: Number of samples
         :param srate_option: Sample rate
         :return: (samples, srate)
         """
         pass
 
+    def fetch_raw(self, nsamples: int, srate_option: str) -> tuple[npa, float, float, float]:
+        """Acquire sample data without scaling it to volts.
+
+        Drivers may override this to return the raw ADC codes (e.g. int8
+        or int16) with the gain and offset that convert them to volts:
+        volts = codes * gain + offset. The analyzer then applies the
+        scaling as part of its windowing pass, saving a full-size copy.
+        The default returns the samples from fetch_data, already in volts.
+        :param nsamples: Number of samples
+        :param srate_option: Sample rate
+        :return: (samples, srate, gain, offset)
+        """
+        data, srate = self.fetch_data(nsamples, srate_option)
+        return data, srate, 1.0, 0.0
+
+    @property
+    def sample_dtype(self):
+        """Type of the buffers to pass to fetch_data_into"""
+        return self.raw_dtype if self.raw_dtype is not None else self.dtype
+
+    def fetch_data_into(self, buf: npa, srate_option: str) -> tuple[npa, float, float, float]:
+        """Acquire len(buf) samples into a preallocated buffer.
+
+        This is like fetch_raw, but writes the samples into buf, which
+        has type sample_dtype, so buffers can be reused. The returned
+        samples are buf, or a leading slice of it if the instrument
+        returned fewer samples. Drivers should override this to fill the
+        buffer directly. The default copies the result of fetch_raw.
+        :param buf: Buffer for the samples
+        :param srate_option: Sample rate
+        :return: (samples, srate, gain, offset)
+        """
+        data, srate, gain, offset = self.fetch_raw(len(buf), srate_option)
+        n = min(len(data), len(buf))
+        np.copyto(buf[:n], data[:n], casting='same_kind')
+        return buf[:n], srate, gain, offset
+
+    def transfer_chunk(self, start: int, count: int) -> npa:
+        """Transfer part of an acquisition from the instrument.
+           Drivers that read the waveform in chunks override this and
+           call fetch_chunked from fetch_data_into.
+           :param start: Index of the first sample
+           :param count: Maximum number of samples
+           :return: Samples, which may be a view of the instrument's response
+        """
+        raise NotImplementedError
+
+    def decode_chunk(self, chunk: npa, out: npa) -> None:
+        """Convert a chunk from transfer_chunk into the buffer.
+           The default copies it, e.g. for raw ADC codes.
+        """
+        np.copyto(out, chunk, casting='same_kind')
+
+    def fetch_chunked(self, buf: npa) -> int:
+        """Transfer len(buf) samples into buf in chunks of chunk_size.
+
+        The next chunk is transferred by a worker thread while the current
+        one is decoded, so decoding overlaps with the I/O. Only one chunk
+        is transferred at a time, and cancellation is only checked between
+        chunks, so the instrument is never left part way through a response.
+        The transfer rate of each chunk (bytes/s) is recorded in the
+        'chunk_rates' metric.
+        :param buf: Buffer for the samples
+        :return: Number of samples transferred, which is less than len(buf)
+                 if the instrument returned fewer samples
+        """
+        nsamples = len(buf)
+        size = self.chunk_size or nsamples
+        windows = [(start, min(size, nsamples - start)) for start in range(0, nsamples, size)]
+        rates = []
+        self.metrics['chunk_rates'] = rates
+
+        def transfer(start: int, count: int) -> npa:
+            t0 = time.perf_counter()
+            chunk = self.transfer_chunk(start, count)
+            rates.append(chunk.nbytes / max(time.perf_counter() - t0, 1E-9))
+            return chunk
+
+        if len(windows) == 1:
+            chunk = transfer(*windows[0])
+            n = min(len(chunk), nsamples)
+            self.decode_chunk(chunk[:n], buf[:n])
+            return n
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='transfer') as executor:
+            future = executor.submit(transfer, *windows[0])
+            for k, (start, count) in enumerate(windows):
+                chunk = future.result()
+                if len(chunk) < count:  # Instrument has no more samples
+                    self.decode_chunk(chunk, buf[start:start + len(chunk)])
+                    return start + len(chunk)
+                if k + 1 < len(windows):
+                    self.check_cancelled()
+                    future = executor.submit(transfer, *windows[k + 1])
+                self.decode_chunk(chunk[:count], buf[start:start + count])
+        return nsamples
+
+    @property
+    def metrics(self) -> dict:
+        """Performance measurements made by the driver, e.g. 'arm_latency'"""
+        try:
+            return self._metrics
+        except AttributeError:
+            self._metrics = {}
+            return self._metrics
+
+    def check_cancelled(self) -> None:
+        """Raise AcquisitionCancelled if the acquisition has been cancelled.
+           Drivers should call this at points where it is safe to abandon
+           an acquisition, e.g. while waiting for a trigger, but not in the
+           middle of reading a response from the instrument.
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise AcquisitionCancelled
+
+    def wait(self, seconds: float) -> None:
+        """Sleep, but raise AcquisitionCancelled as soon as the
+           acquisition is cancelled."""
+        if self.cancel_event is None:
+            time.sleep(seconds)
+        elif self.cancel_event.wait(seconds):
+            raise AcquisitionCancelled
+
     @abstractmethod
     def close(self):
         """Close the driver"""
@@ -0,0 +1,215 @@
+"""
+Scope driver running in a separate process.
+
+Running the driver in its own process means that its I/O does not share
+the GIL with the analysis and the GUI, so the acquisition rate does not
+depend on the analysis and rendering load. The samples are passed back
+through a ring of slots in shared memory. Only a small descriptor of
+each frame is sent through a pipe, so the samples are never pickled or
+copied between the processes.
+
+Inside the child process, the driver is run by an ordinary ScopeThread,
+using a pool of shared memory slots instead of a BufferPool.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import multiprocessing as mp
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+from numpy import array as npa
+
+from pydosa.dsa.scope_driver import AcquisitionCancelled
+from pydosa.dsa.scope_thread import SHUTDOWN_TIMEOUT, ScopeThread
+from pydosa.util.drop_queue import DropQueue
+from pydosa.util.units import decode_unit_prefix
+
+NSLOTS = 3  # One frame being acquired, one queued and one being analysed
+
+
+def slot_bytes(driver_cls) -> int:
+    """Size of each shared memory slot for the driver's largest frame"""
+    nsamples = max(int(decode_unit_prefix(s)) for s in driver_cls.sample_sizes)
+    if driver_cls.raw_dtype is not None:
+        return nsamples * np.dtype(driver_cls.raw_dtype).itemsize
+    return nsamples * np.dtype(np.float64).itemsize  # Allow for any float dtype
+
+
+class SlotPool(object):
+    """Pool of sample buffers in shared memory slots (child process side)"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, size: int, free):
+        self.shm = shm
+        self.size = size
+        self.free = free  # Queue of free slot numbers, then None when closed
+        self._base = np.frombuffer(shm.buf, np.uint8).ctypes.data
+
+    def acquire(self, nsamples: int, dtype) -> npa:
+        """Wait for a free slot and return a buffer in it"""
+        if nsamples * np.dtype(dtype).itemsize > self.size:
+            raise ValueError('Frame too large for shared memory slot: ', nsamples)
+        slot = self.free.get()
+        if slot is None:
+            self.free.put(None)  # Leave it to wake any later caller
+            raise AcquisitionCancelled
+        return np.ndarray(nsamples, dtype, self.shm.buf, slot * self.size)
+
+    def close(self) -> None:
+        """Wake any caller waiting for a slot, and cancel later calls"""
+        self.free.put(None)
+
+    def release(self, samples: npa) -> None:
+        """Return the slot holding the samples"""
+        self.free.put(self.slot(samples))
+
+    def slot(self, samples: npa) -> int:
+        """Return the number of the slot holding the samples"""
+        return (samples.ctypes.data - self._base) // self.size
+
+
+class SlotSender(object):
+    """Frame queue that sends descriptors to the parent (child process side)"""
+
+    def __init__(self, pool: SlotPool, conn):
+        self.pool = pool
+        self.conn = conn
+        self.on_drop = None
+
+    def put(self, frame: tuple) -> None:
+        samples, srate, gain, offset = frame
+        self.conn.send((self.pool.slot(samples), len(samples), samples.dtype.str,
+                        srate, gain, offset))
+
+
+def run_child(factory, shm_name: str, size: int, free, conn, commands) -> None:
+    """Main program of the acquisition process.
+       :param factory: Picklable callable that returns an open driver
+    """
+    shm = shared_memory.SharedMemory(shm_name)
+    pool = SlotPool(shm, size, free)
+    thread = ScopeThread(factory(), SlotSender(pool, conn), pool)
+    thread.set_options('0', '')  # Wait for the options from the parent
+    thread.start()
+    timeout = SHUTDOWN_TIMEOUT
+    try:
+        while True:
+            command, *args = commands.get()
+            match command:
+                case 'options':
+                    thread.set_options(*args)
+                case 'paused':
+                    thread.paused = args[0]
+                case 'dtype':
+                    thread.set_dtype(args[0])
+                case 'stop':
+                    timeout = args[0]
+                    break
+    finally:
+        pool.close()
+        thread.shutdown(timeout)
+        conn.send(None)  # End of frames
+        conn.close()
+        pool.free.cancel_join_thread()
+
+
+class ScopeProcess(object):
+    """Runs a scope driver in a separate process.
+
+    This has the same interface as ScopeThread, so the GUI and analysis
+    thread can use either. The frames in the queue are views of shared
+    memory and must be passed to release_frame() when finished with.
+    """
+
+    def __init__(self, factory, driver_cls, frames: DropQueue = None):
+        """Initialization
+           :param factory: Picklable callable that returns an open driver
+           :param driver_cls: Class of the driver
+           :param frames: Queue for the acquired frames
+        """
+        self.frames = frames if frames is not None else DropQueue(1)
+        self.frames.on_drop = self.release_frame
+        self._size = slot_bytes(driver_cls)
+        self._shm = shared_memory.SharedMemory(create=True, size=NSLOTS * self._size)
+        self._base = np.frombuffer(self._shm.buf, np.uint8)
+        ctx = mp.get_context('spawn')  # Don't fork the GUI's threads
+        self._free = ctx.Queue()
+        for slot in range(NSLOTS):
+            self._free.put(slot)
+        self._commands = ctx.Queue()
+        self._conn, child_conn = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(target=run_child, daemon=True,
+                                    args=(factory, self._shm.name, self._size,
+                                          self._free, child_conn, self._commands))
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._paused = False
+
+    def start(self) -> None:
+        """Start the acquisition process"""
+        self._process.start()
+        self._receiver.start()
+
+    def _receive(self) -> None:
+        """Turn descriptors from the child process into frames"""
+        while True:
+            try:
+                descriptor = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if descriptor is None:
+                break
+            slot, nsamples, dtype, srate, gain, offset = descriptor
+            samples = np.ndarray(nsamples, dtype, self._shm.buf, slot * self._size)
+            self.frames.put((samples, srate, gain, offset))
+
+    def release_frame(self, frame: tuple) -> None:
+        """Return the shared memory slot of a frame to the child process.
+           This does nothing after shutdown, as the slots no longer exist.
+        """
+        if self._base is None:
+            return
+        self._free.put((frame[0].ctypes.data - self._base.ctypes.data) // self._size)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        if value != self._paused:
+            self._paused = value
+            self._commands.put(('paused', value))
+
+    def set_options(self, nsamples_option: str, srate_option: str) -> None:
+        """Set the parameters for the next acquisition"""
+        self._commands.put(('options', nsamples_option, srate_option))
+
+    def set_dtype(self, dtype) -> None:
+        """Set the floating point type of the samples"""
+        self._commands.put(('dtype', dtype))
+
+    def close(self) -> None:
+        """Ask the acquisition process to stop."""
+        self._commands.put(('stop', SHUTDOWN_TIMEOUT))
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+        """Stop the process and release the shared memory.
+           Returns False if the process did not stop within the timeout.
+        """
+        if self._process.is_alive():
+            self._commands.put(('stop', timeout))
+            self._process.join(timeout + 1)
+        stopped = not self._process.is_alive()
+        if not stopped:
+            print('Warning: instrument did not stop within', timeout, 'seconds')
+        self._receiver.join(1)
+        self.frames.clear()
+        self._base = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # A frame is still in use, so leave it to the garbage collector
+        self._shm.unlink()
+        return stopped
@@ -2,67 +2,144 @@
 Thread wrapper for a scope driver.
 
 Running the scope driver in a thread allows it to acquire and retrieve
-the next set of samples whilst the main thread is analysing and
-displaying the previous set of samples. The driver can enter a
-wait-loop whilst waiting for a data acquisition complete.
+the next set of samples whilst the analysis thread is analysing the
+previous set and the main thread is displaying the one before that.
+The driver can enter a wait-loop whilst waiting for a data acquisition
+complete.
 
 Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 
 import threading
-import time
 
-from numpy import array as npa
-
-from pydosa.dsa.scope_driver import ScopeDriver
+from pydosa.dsa.buffer_pool import BufferPool
+from pydosa.dsa.scope_driver import AcquisitionCancelled, AcquisitionTimeout, ScopeDriver
+from pydosa.util.ieee_block import BlockError
+from pydosa.util.drop_queue import DropQueue
 from pydosa.util.units import decode_unit_prefix
 
-lock = threading.Lock()
+SHUTDOWN_TIMEOUT = 10.0  # Seconds to wait for a transfer to finish on shutdown
 
 
 class ScopeThread(threading.Thread):
+    """Acquires frames continuously into a queue.
+
+    Each frame is (samples, srate, gain, offset). If the frames are not
+    taken as fast as they are acquired, the oldest is dropped, so the
+    consumer always gets the most recent frame.
+
+    The samples are acquired into buffers from a pool. The consumer must
+    pass each frame to release_frame() when it has finished with it.
+    Frames dropped from the queue are released automatically.
+
+    While paused, or with no sample size selected, the thread waits on a
+    condition variable rather than polling, so it uses no CPU.
 
-    def __init__(self, driver: ScopeDriver):
-        threading.Thread.__init__(self)
+    Changing the options, or closing the thread, cancels the acquisition
+    in progress at the driver's next safe point, e.g. while it waits for
+    a trigger. A transfer that has started is allowed to finish, as
+    interrupting it can lock up the instrument.
+    """
+
+    def __init__(self, driver: ScopeDriver, frames: DropQueue = None,
+                 pool: BufferPool = None):
+        threading.Thread.__init__(self, daemon=True)
         self.driver: ScopeDriver = driver
         self.driver.prepare()
-        self.data = None  # (samples, sara)
-        self.ready = False
+        self.frames = frames if frames is not None else DropQueue(1)
+        self.frames.on_drop = self.release_frame
+        self.pool = pool if pool is not None else BufferPool()
         self.stop = False
         self.srate_option = '1G'
         self.nsamples_option = '1Mi'
+        self._paused = False
+        self._changed = threading.Condition()  # Notified when settings change
+        self._cancel = threading.Event()  # Set to cancel the acquisition
+        self._options = None  # Options of the acquisition in progress
+        self.driver.cancel_event = self._cancel
 
     def run(self) -> None:
-        while not self.stop:
-            while self.is_ready():
-                if self.stop:
-                    self.driver.close()
-                    return
-                time.sleep(0.01)
-            nsamples = int(decode_unit_prefix(self.nsamples_option))
-            data = self.driver.fetch_data(nsamples, self.srate_option)
-            with lock:
-                self.data = data  # Make the data available
-        self.driver.close()
-
-    def get_data(self, nsamples_option: str, srate_option: str) -> npa:
-        """Called from main thread to get next set of data.
-           nsamples & srate apply to the next acquisition.
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(self._can_acquire)
+                    if self.stop:
+                        break
+                    nsamples = int(decode_unit_prefix(self.nsamples_option))
+                    srate_option = self.srate_option
+                    self._options = (self.nsamples_option, srate_option)
+                    self._cancel.clear()
+                try:
+                    buf = self.pool.acquire(nsamples, self.driver.sample_dtype)
+                except AcquisitionCancelled:
+                    continue
+                try:
+                    data = self.driver.fetch_data_into(buf, srate_option)
+                except AcquisitionCancelled:
+                    self.pool.release(buf)
+                    continue
+                except (AcquisitionTimeout, BlockError) as exc:
+                    print('Acquisition failed:', exc)
+                    self.pool.release(buf)
+                    continue
+                finally:
+                    self._options = None
+                if not self.stop:
+                    self.frames.put(data)  # Make the data available
+        finally:
+            self.driver.close()
+
+    def set_dtype(self, dtype) -> None:
+        """Set the floating point type of the samples"""
+        self.driver.dtype = dtype
+
+    def release_frame(self, frame: tuple) -> None:
+        """Return the buffer of a frame to the pool for reuse"""
+        self.pool.release(frame[0])
+
+    def _can_acquire(self) -> bool:
+        """Return True if the thread should stop waiting"""
+        return self.stop or (not self._paused
+                             and decode_unit_prefix(self.nsamples_option) > 0)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        with self._changed:
+            self._paused = value
+            self._changed.notify()
+
+    def set_options(self, nsamples_option: str, srate_option: str) -> None:
+        """Set the parameters for the next acquisition.
+           An acquisition in progress with other options is cancelled.
         """
-        with lock:
-            # Set parameters for next acquisition
+        with self._changed:
             self.nsamples_option = nsamples_option
             self.srate_option = srate_option
-            data = self.data
-            self.data = None
-            return data
-
-    def is_ready(self) -> bool:
-        """Return True if data is ready."""
-        with lock:
-            return self.data is not None
+            options = self._options
+            if options is not None and options != (nsamples_option, srate_option):
+                self._cancel.set()
+            self._changed.notify()
 
     def close(self) -> None:
         """Interrupt the thread."""
-        self.stop = True
+        with self._changed:
+            self.stop = True
+            self._cancel.set()
+            self._changed.notify()
+
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+        """Stop the thread and wait for the driver to be closed.
+           Returns False if the thread did not stop within the timeout.
+        """
+        self.close()
+        if self.is_alive():
+            self.join(timeout)
+        if self.is_alive():
+            print('Warning: instrument did not stop within', timeout, 'seconds')
+            return False
+        return True
@@ -0,0 +1,70 @@
+"""
+Power spectrum with its frequency axis.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+from numpy import array as npa
+
+MIN_POWER = 1E-30  # Added to power to avoid log of zero
+
+
+class Spectrum(object):
+    """Power spectrum with its frequency axis.
+
+    Bin i is at frequency f0 + i * df. For a full-band spectrum, f0 is
+    zero, but a zoomed spectrum covers only part of the band. The
+    resolution bandwidth (rbw) is the width of an FFT bin, which differs
+    from df if the spectrum is evaluated at other points (chirp-Z) or
+    reduced to display resolution.
+
+    The spectrum is held as linear power. It is only converted to dBV
+    when the db attribute is first used, so a display can reduce the
+    bins to one value per pixel and just convert those with to_db().
+    """
+
+    def __init__(self, power: npa, srate: float, f0: float = 0.0, df: float = None,
+                 offset_db: float = 0.0, db_buffer=None, rbw: float = None):
+        """Initialization
+           :param power: Power in each bin, before the dB offset
+           :param srate: Sample rate of the acquisition (Sa/s)
+           :param f0: Frequency of the first bin (Hz)
+           :param df: Frequency step between bins (Hz)
+           :param offset_db: Offset added when converting to dBV
+           :param db_buffer: Optional function that returns a buffer for n dB values
+           :param rbw: Resolution bandwidth (Hz), if not df
+        """
+        self.power = power
+        self.srate = srate
+        self.f0 = f0
+        self.df = df if df is not None else srate / 2 / (len(power) - 1)
+        self.rbw = rbw if rbw is not None else self.df
+        self.offset_db = offset_db
+        self._db_buffer = db_buffer
+        self._db = None
+
+    def __len__(self) -> int:
+        return len(self.power)
+
+    @property
+    def fmax(self) -> float:
+        """Frequency of the last bin"""
+        return self.f0 + (len(self.power) - 1) * self.df
+
+    @property
+    def db(self) -> npa:
+        """Spectrum in dBV, computed when first used"""
+        if self._db is None:
+            out = self._db_buffer(len(self.power)) if self._db_buffer else None
+            self._db = self.to_db(self.power, out)
+        return self._db
+
+    def to_db(self, power, out: npa = None) -> npa:
+        """Convert power values from this spectrum (or maxima etc. of them) to dBV"""
+        db = np.add(power, MIN_POWER, out=out)  # Avoid divide-by-zero
+        db = np.log10(db, out=out)
+        db *= 10.0
+        db += self.offset_db
+        return db
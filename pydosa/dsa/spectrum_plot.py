@@ -7,10 +7,8 @@ Copyright (c) 2020 Jon Brumfitt
 
 from tkinter import Frame, OptionMenu, StringVar, Label
 
-from numpy import array as npa
-
 from pydosa.dsa.frequency_widget import FrequencyWidget
-from pydosa.dsa.spectrum_widget import SpectrumWidget
+from pydosa.dsa.spectrum_widget import SpectrumWidget, View
 
 # Initial option settings
 INITIAL_DBSCALE = '10'  # dB/div
@@ -26,17 +24,21 @@ LEVELS = ['30', '20', '10', '5', '0', '-5', '-10', '-20',
 
 
 class SpectrumPlot(Frame):
-    def __init__(self, parent, fmax: float = INITIAL_FMAX):
+    def __init__(self, parent, fmax: float = INITIAL_FMAX, on_change=None):
+        """Initialization
+           :param on_change: Called when the view settings change
+        """
         Frame.__init__(self, parent)
         self.pack()
         self.parent = parent
+        self.on_change = on_change
         self.widget = None
         self.create_gui(fmax)
 
     def create_gui(self, fmax: float) -> None:
         main_frame = self
 
-        self.widget = SpectrumWidget(main_frame, self.show_message)
+        self.widget = SpectrumWidget(main_frame)
         self.widget.set_range(0, fmax)
         self.widget.pack()
 
@@ -90,25 +92,38 @@ class SpectrumPlot(Frame):
         """Set the frequency range."""
         self.widget.set_range(fstart, fstop)
 
-    def plot_spectrum(self, spectrum: npa, srate: float) -> None:
-        """Plot a spectrum"""
-        self.widget.plot_spectrum(spectrum, srate)
+    def view(self) -> View:
+        """Return the current view settings"""
+        return self.widget.view()
+
+    def draw_traces(self, traces: list[tuple[list[float], str]]) -> None:
+        """Draw traces that are already in pixel coordinates"""
+        self.widget.draw_traces(traces)
 
     def freq_callback(self, fstart: float, fstop: float) -> None:
         """Callback to change the frequency range."""
         self.widget.set_range(fstart, fstop)
+        self.changed()
 
     def unit_callback(self, option: StringVar) -> None:
         """Callback to change the units"""
         self.widget.units = option
+        self.changed()
 
     def dbscale_callback(self, option) -> None:
         """Callback to change the decibel scale"""
         self.widget.dbscale = int(option)
+        self.changed()
 
     def level_callback(self, option) -> None:
         """Callback to change the reference level"""
         self.widget.level = int(option)
+        self.changed()
+
+    def changed(self) -> None:
+        """Report a change of the view settings"""
+        if self.on_change is not None:
+            self.on_change()
 
     def show_message(self, message: str) -> None:
         # print(message)
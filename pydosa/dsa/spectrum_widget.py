@@ -6,10 +6,11 @@ Copyright (c) 2020 Jon Brumfitt
 """
 import math
 from tkinter import Canvas, N, W
+from typing import NamedTuple
 
 import numpy as np
-from numpy import array as npa
 
+from pydosa.dsa.spectrum import Spectrum
 from pydosa.util import units, util
 
 # Window geometry
@@ -27,6 +28,8 @@ FTICKS = 10  # Preferred number of frequency tick marks
 
 # Colours
 TRACE_COLOR = "#FFFF30"
+OVERLAY_COLORS = {'Normal': "#C0C0C0", 'Maximum': "#FF5050",
+                  'Minimum': "#50A0FF", 'Average': "#50FF50"}
 GRID_COLOR = "#606060"
 AXIS_COLOR = "#B0B0B0"
 TEXT_COLOR = "#FFFFFF"
@@ -35,11 +38,85 @@ TEXT_COLOR = "#FFFFFF"
 DB3 = 10 * math.log10(2)  # 3 dB
 
 
+class View(NamedTuple):
+    """Settings that determine how a spectrum is drawn"""
+    fmin: float
+    fmax: float
+    units: str
+    level: float
+    dbscale: float
+
+
+def units_offset(units: str, reference: Spectrum) -> float:
+    """Return the dB offset to convert dBV to the given units.
+       For dBc, the peak of the reference spectrum is 0 dB.
+    """
+    match units:
+        case 'dBV':  # RMS
+            return 0
+        case 'dBm':
+            return 10 + DB3  # 1V RMS in 50R = 13.01 dBm
+        case 'dBc':
+            return -reference.to_db(reference.power.max())
+        case _:
+            raise ValueError("Unknown unit: ", units)
+
+
+def trace_coords(spectrum: Spectrum, view: View, offset_db: float) -> tuple[list[float], float]:
+    """Convert a spectrum to a list of x, y pixel coordinates for drawing.
+
+    The bins are reduced to one value per pixel in the power domain,
+    so only the plotted points are converted to dB. This does not use
+    Tk, so it can be run by the analysis thread.
+    :return: (coordinates, bins per pixel)
+    """
+    width = PLOT_WIDTH  # X pixels
+    power = spectrum.power
+    nsamp = len(power)  # No. of FFT bins
+    fmin = view.fmin
+    fmax = view.fmax
+
+    # Rescale frequency data to required span
+    dfpix = (fmax - fmin) / width  # df per pixel
+    dfsamp = spectrum.df  # df per FFT bin
+    imin = max(0, math.floor((fmin - spectrum.f0) / dfsamp))
+    imax = math.ceil((fmax - spectrum.f0) / dfsamp)
+    if imax >= nsamp:
+        imax = nsamp - 1
+
+    a = np.arange(imin, imax + 1)
+    plotx = (spectrum.f0 + a * dfsamp - fmin) / dfpix + HOFF
+    ploty = power[imin:imax + 1]
+
+    size = len(plotx)  # Number of frequency bins in span
+    ka = (fmax - fmin) / dfsamp / width
+    k = int(ka)
+
+    # Rebin if #bins > #pixels
+    if k > 0:
+        n = size // k
+        m = n * k
+        plotx = plotx[0:m]
+        ploty = ploty[0:m]
+        xx = plotx.reshape(n, k)
+        yy = ploty.reshape(n, k)
+        plotx = xx.mean(1)  # Plotting will round this
+        ploty = yy.max(1)  # Max power in each pixel
+        size = n
+
+    # Convert the plotted points to dB and then to pixels
+    ploty = spectrum.to_db(ploty) + (offset_db - view.level)
+    ploty = ploty * (-VSCALE / view.dbscale) + VOFF
+
+    array = np.array([plotx, ploty]).reshape(size * 2, order='F')
+    return array.tolist(), ka
+
+
 class SpectrumWidget(Canvas):
     """GUI widget to display the spectrum."""
 
-    # def __init__(self, parent, width, height, info_handler=None):
-    def __init__(self, parent, info_handler=None):
+    # def __init__(self, parent, width, height):
+    def __init__(self, parent):
         """Initialization"""
         width = PLOT_WIDTH + 2 * PLOT_MARGIN
 
@@ -49,7 +126,6 @@ class SpectrumWidget(Canvas):
                         relief='raised')
         self.pack(padx=10, pady=10)
         self.parent = parent
-        self.info_handler = info_handler
 
         self.fmin = 0
         self.fmax = 0
@@ -70,65 +146,17 @@ class SpectrumWidget(Canvas):
         self.delete("all")
         self.draw_grid()
 
-    def plot_spectrum(self, data: npa, srate: float) -> None:
-        """Plot the spectrum (data in dBV)"""
-        width = PLOT_WIDTH  # X pixels
-        nsamp = len(data)  # No. of FFT bins
-        fmin = self.fmin
-        fmax = self.fmax
+    def view(self) -> View:
+        """Return the current view settings"""
+        return View(self.fmin, self.fmax, self.units, self.level, self.dbscale)
 
-        # Scale to required units
-        offset_db = 0
-        match self.units:
-            case 'dBV':  # RMS
-                pass
-            case 'dBm':
-                offset_db += 10 + DB3  # 1V RMS in 50R = 13.01 dBm
-            case 'dBc':
-                offset_db = -max(data)
-            case _:
-                raise ValueError("Unknown unit: ", self.units)
-        if offset_db != 0:
-            data += offset_db
-
-        # Rescale frequency data to required span
-        dfpix = (fmax - fmin) / width  # df per pixel
-        dfsamp = srate / 2 / (nsamp - 1)  # df per FFT bin
-        imin = math.floor(fmin / dfsamp)
-        imax = math.ceil(fmax / dfsamp)
-        if imax >= nsamp:
-            imax = nsamp - 1
-
-        a = np.arange(imin, imax + 1)
-        plotx = (a * dfsamp - fmin) / dfpix + HOFF
-        ploty = data[imin:imax + 1] - self.level
+    def draw_traces(self, traces: list[tuple[list[float], str]]) -> None:
+        """Draw traces that are already in pixel coordinates"""
         self.delete("all")
         self.draw_grid()
-
-        size = len(plotx)  # Number of frequency bins in span
-        ploty = ploty * (-VSCALE / self.dbscale) + VOFF  # Convert dB to pixels
-
-        ka = (fmax - fmin) / srate * (2 * nsamp) / width
-        if self.info_handler:
-            self.info_handler('Bins/pixel=%.2f' % ka)
-        k = int(ka)
-
-        # Rebin if #bins > #pixels
-        if k > 0:
-            n = size // k
-            m = n * k
-            plotx = plotx[0:m]
-            ploty = ploty[0:m]
-            xx = plotx.reshape(n, k)
-            yy = ploty.reshape(n, k)
-            plotx = xx.mean(1)  # Plotting will round this
-            ploty = yy.min(1)  # Min pixel coordinate = Max power
-            size = n
-
-        # At least 2 points are needed for a plot
-        if size >= 2:
-            array = np.array([plotx, ploty]).reshape(size * 2, order='F')
-            self.create_line(array.tolist(), fill=TRACE_COLOR)
+        for points, color in traces:
+            if len(points) >= 4:  # At least 2 points are needed for a plot
+                self.create_line(points, fill=color)
 
     def draw_grid(self) -> None:
         """Draw the grid lines and label them"""
@@ -0,0 +1,80 @@
+"""
+Accumulates several trace modes from one stream of spectra.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+from numpy import array as npa
+
+TRACES = ['Normal', 'Maximum', 'Minimum', 'Average']
+BLOCK = 1 << 14  # Bins updated per block (fits in the L1/L2 cache)
+
+
+class TraceAccumulator(object):
+    """Live, max-hold, min-hold and average traces of the same spectra.
+
+    Like the traces of a bench spectrum analyzer, any subset of the trace
+    modes can be accumulated at once. The held traces are updated
+    together, a block of bins at a time, so each block of the input is
+    read from memory once rather than once per trace.
+    """
+
+    def __init__(self, alpha, dtype=None):
+        """Initialization"""
+        self._alpha = alpha
+        self.dtype = dtype
+        self._traces = {}
+        self._count = 0  # Averaging count
+        self._monitor = None
+
+    def reset(self) -> None:
+        """Reset all the traces and release storage"""
+        self._traces = {}
+        self._count = 0
+
+    def update(self, data: npa, traces: list[str], monitor=None) -> dict[str, npa]:
+        """Add a spectrum to the traces and return them, keyed by mode.
+           The traces are reset if the value of monitor changes. Traces
+           that were not previously selected start from this spectrum.
+        """
+        for trace in traces:
+            if trace not in TRACES:
+                raise ValueError('Unknown trace: ', trace)
+        if monitor != self._monitor:
+            self.reset()
+            self._monitor = monitor
+        for trace in list(self._traces):
+            if trace not in traces:
+                del self._traces[trace]
+
+        # Update the existing traces together
+        held = self._traces
+        if 'Average' in held:
+            self._count += 1
+            alpha = max(self._alpha, 1.0 / (self._count + 1))
+        for i in range(0, len(data), BLOCK):
+            d = data[i:i + BLOCK]
+            for trace, acc in held.items():
+                a = acc[i:i + BLOCK]
+                match trace:
+                    case 'Maximum':
+                        np.maximum(a, d, out=a)
+                    case 'Minimum':
+                        np.minimum(a, d, out=a)
+                    case 'Average':
+                        # In-place form of: (1 - alpha) * average + alpha * data
+                        a -= d
+                        a *= (1.0 - alpha)
+                        a += d
+
+        # Start any newly selected traces
+        for trace in traces:
+            if trace != 'Normal' and trace not in held:
+                held[trace] = np.array(data, dtype=self.dtype)
+                if trace == 'Average':
+                    self._count = 0
+
+        result = {trace: held.get(trace, data) for trace in traces}
+        return result
@@ -0,0 +1,152 @@
+"""
+Memory-bounded cache of FFT window functions.
+
+Window functions for large sample sizes are expensive to compute and
+occupy a lot of memory (112 MB for 14M float64 samples), so they are
+kept in a least-recently-used cache with a limit on the total bytes.
+
+Large windows can also be saved in a directory as .npy files, which are
+memory-mapped when they are needed again, even in a later session.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+from numpy import array as npa
+
+from pydosa.util.util import write_atomic
+
+MAX_BYTES = 256 * 1024 * 1024  # Default memory budget
+DISK_MIN_SAMPLES = 1 << 20  # Smaller windows are not saved to disk
+
+
+class WindowCache(object):
+    """LRU cache of window functions with a memory budget in bytes.
+
+    Windows are keyed by (name, nsamples, dtype). If 'half' is set, only
+    the first half of each symmetric window is stored, halving the memory
+    used, and the full window is reconstructed when it is requested.
+
+    If a directory is given, windows of at least 'disk_min' samples are
+    also saved there and are memory-mapped (read-only) on later misses.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES, half: bool = False,
+                 directory: str = None, disk_min: int = DISK_MIN_SAMPLES):
+        """Initialization"""
+        self.max_bytes = max_bytes
+        self.half = half
+        self.directory = directory
+        self.disk_min = disk_min
+        self.nbytes = 0  # Bytes currently stored
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0  # Misses satisfied from the disk cache
+        self._entries = OrderedDict()
+
+    def configure(self, max_bytes: int, half: bool, directory: str = None,
+                  disk_min: int = DISK_MIN_SAMPLES) -> None:
+        """Change the memory budget, storage mode and disk cache directory"""
+        if half != self.half:
+            self.clear()
+        self.max_bytes = max_bytes
+        self.half = half
+        self.directory = directory
+        self.disk_min = disk_min
+        self._evict(0)
+
+    def get(self, key: tuple, factory) -> npa:
+        """Return the window for the key, computing it with factory() if
+           it is not in the cache. The returned array must not be modified.
+        """
+        stored = self._entries.get(key)
+        if stored is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._expand(stored, key[1])
+
+        self.misses += 1
+        path = self._disk_path(key)
+        stored = self._load(path) if path else None
+        if stored is not None:
+            self.disk_hits += 1
+        else:
+            window = factory()
+            if not path:
+                self._put(key, self._shrink(window))
+                return window
+            stored = self._save(path, self._shrink(window))
+        self._put(key, stored)
+        return self._expand(stored, key[1])
+
+    def clear(self) -> None:
+        """Remove all windows from the cache"""
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        return {'entries': len(self._entries), 'bytes': self.nbytes,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'disk_hits': self.disk_hits}
+
+    def _shrink(self, window: npa) -> npa:
+        """Return the part of the window that is stored"""
+        return window[:(len(window) + 1) // 2].copy() if self.half else window
+
+    def _put(self, key: tuple, stored: npa) -> None:
+        """Store the window, evicting older entries to make room"""
+        if stored.nbytes > self.max_bytes:
+            return  # Too big to cache
+        self._evict(stored.nbytes)
+        self._entries[key] = stored
+        self.nbytes += stored.nbytes
+
+    def _evict(self, needed: int) -> None:
+        """Evict least recently used entries until 'needed' bytes are free"""
+        while self._entries and self.nbytes + needed > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+    def _expand(self, stored: npa, nsamples: int) -> npa:
+        """Reconstruct the full window from the stored array"""
+        if len(stored) == nsamples:
+            return stored
+        return np.concatenate((stored, stored[:nsamples // 2][::-1]))
+
+    def _disk_path(self, key: tuple) -> str | None:
+        """Return the file name for the key, or None if not cached on disk"""
+        name, nsamples, dtype = key
+        if self.directory is None or nsamples < self.disk_min:
+            return None
+        name = re.sub('[^a-z0-9]+', '_', name.lower())
+        half = '-half' if self.half else ''
+        filename = '{}-{}-{}{}.npy'.format(name, nsamples, np.dtype(dtype).name, half)
+        return os.path.join(os.path.expanduser(self.directory), filename)
+
+    @staticmethod
+    def _load(path: str) -> np.ndarray | None:
+        """Memory-map a window saved on disk"""
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save(path: str, stored: npa) -> npa:
+        """Save the window to disk and return it memory-mapped.
+           The window is returned unchanged if it cannot be saved.
+        """
+        try:
+            write_atomic(path, lambda file: np.save(file, stored), 'wb')
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as exc:
+            print('Cannot save window to disk:', exc)
+            return stored
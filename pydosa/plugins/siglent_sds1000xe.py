@@ -9,7 +9,8 @@ import time
 
 import numpy as np
 
-from pydosa.dsa.scope_driver import ScopeDriver
+from pydosa.dsa.scope_driver import AcquisitionTimeout, ScopeDriver
+from pydosa.util.ieee_block import parse_block
 from pydosa.util.units import decode_unit_prefix
 
 
@@ -29,10 +30,36 @@ class Driver(ScopeDriver):
     sample_rates = list(SRATE_TO_TDIV)
     sample_sizes = ['1Mi', '2Mi', '4Mi', '8Mi', '12Mi', '14M']
     initial_sample_size = '1Mi'
+    raw_dtype = np.int8
+
+    # Long waveforms are read in chunks (WFSU NP/FP), so that copying each
+    # chunk into the buffer overlaps with the transfer of the next.
+    chunk_size = 1 << 20
+
+    # Settings that change the scaling to volts
+    SCALING_SETTINGS = {'TDIV'}
+
+    # The cached state is refreshed from the scope at this interval (seconds),
+    # in case it has been changed on the front panel.
+    REFRESH_INTERVAL = 2.0
+
+    # Waiting for an acquisition to complete. The scope captures 14 time
+    # divisions, so the expected time is known. The driver sleeps for most
+    # of it and then polls INR? at increasing intervals.
+    HDIVS = 14  # Horizontal divisions
+    PREDICT_FRACTION = 0.9  # Fraction of the expected time to sleep
+    POLL_MIN = 0.001  # First poll interval (seconds)
+    POLL_MAX = 0.05  # Longest poll interval (seconds)
+    ACQUIRE_TIMEOUT = 2.0  # Minimum time to wait for a trigger (seconds)
+    TIMEOUT_FACTOR = 10  # Timeout as a multiple of the expected time
+    USE_OPC = False  # Wait with *OPC? (if supported by the firmware) instead of polling
 
     def __init__(self):
         """Initialization"""
         self._scope = None
+        self._settings = {}  # Last value written for each setting
+        self._scaling = None  # (vdiv, ofst, sara) for the current settings
+        self._refresh_time = 0.0  # When the cached state expires
 
     def open(self, instrument) -> None:
         """Open the driver."""
@@ -53,32 +80,106 @@ class Driver(ScopeDriver):
         self._scope.write('C1:UNIT V')
         self._scope.write('TDIV 1E-3')
         _ = self._scope.ask('INR?')  # Clear status
+        self._invalidate()
+        self._settings['TDIV'] = '1E-3'
 
     def fetch_data(self, nsamples: int, srate_option: str) -> tuple[np.array, float]:
         """Acquire sample data, scaled to volts"""
-        tdiv = self.SRATE_TO_TDIV[srate_option]
-        self._scope.write('TDIV ' + tdiv)
-        self._scope.write('TRMD SINGLE')
-        _ = self._scope.ask('INR?')  # Clear status
-        self._scope.write('ARM')
+        codes, sara, gain, offset = self.fetch_raw(nsamples, srate_option)
+        data = codes.astype(self.dtype)
+        data *= gain
+        data += offset
+        return data, sara
+
+    def fetch_raw(self, nsamples: int, srate_option: str) -> tuple[np.array, float, float, float]:
+        """Acquire sample data as raw int8 ADC codes."""
+        return self.fetch_data_into(np.empty(nsamples, np.int8), srate_option)
 
-        # Wait for acquisition to complete
-        for i in range(100):
-            inr = int(self._scope.ask('INR?'))
-            if inr & 1 == 1:
+    def fetch_data_into(self, buf: np.array, srate_option: str) -> tuple[np.array, float, float, float]:
+        """Acquire raw int8 ADC codes into a preallocated buffer.
+
+        Settings that have not changed are not sent again, and the scaling
+        is only queried after a change. The commands are batched into as
+        few messages as possible, as each costs a network round trip.
+        """
+        if time.monotonic() > self._refresh_time:
+            self._invalidate()  # Pick up any changes made on the front panel
+
+        # Arm for a single acquisition, clearing the status first
+        tdiv = self.SRATE_TO_TDIV[srate_option]
+        commands = self._changed_settings(TDIV=tdiv)
+        _ = self._scope.ask(';'.join(commands + ['TRMD SINGLE', 'INR?', 'ARM']))
+        self._wait_acquired(self.HDIVS * float(tdiv))
+
+        # Last chance to cancel before the transfer. After this, it can only
+        # be cancelled between chunks.
+        self.check_cancelled()
+        n = self.fetch_chunked(buf)
+
+        # Get the scaling to volts
+        if self._scaling is None:
+            self._scaling = self._query_scaling()
+        vdiv, ofst, sara = self._scaling
+        return buf[:n], sara, vdiv / 25.0, ofst
+
+    def transfer_chunk(self, start: int, count: int) -> np.array:
+        """Transfer samples start to start + count - 1 from the scope"""
+        commands = self._changed_settings(WFSU='SP,1,NP,{},FP,{}'.format(count, start))
+        self._scope.write(';'.join(commands + ['C1:WF? DAT2']))
+        return parse_block(self._scope.read_raw(), np.int8)  # View of the 'DAT2,#9nnnnnnnnn' block
+
+    def _wait_acquired(self, expected: float) -> None:
+        """Wait for the acquisition to complete.
+
+        Sleeps until the acquisition should almost be complete and then
+        polls with exponential backoff. The time from arming to completion
+        is recorded in the 'arm_latency' metric.
+        :param expected: Expected acquisition time (seconds)
+        """
+        start = time.monotonic()
+        deadline = start + max(self.ACQUIRE_TIMEOUT, self.TIMEOUT_FACTOR * expected)
+        self.wait(expected * self.PREDICT_FRACTION)
+        if self.USE_OPC:
+            _ = self._scope.ask('*OPC?')  # Returns when the acquisition is complete
+        delay = self.POLL_MIN
+        polls = 0
+        while True:
+            polls += 1
+            if int(self._scope.ask('INR?')) & 1 == 1:
                 break
-            time.sleep(0.02)
-
-        # Get the samples from the scope and scale to volts
-        self._scope.write('WFSU SP,1,NP,{},FP,0'.format(nsamples))
-        self._scope.write('C1:WF? DAT2')
-        data = self._scope.read_raw()
-        vdiv = float(self._scope.ask('C1:VDIV?'))
-        ofst = float(self._scope.ask('C1:OFST?'))
-        sara = decode_unit_prefix(self._scope.ask('SARA?'))
-        data = np.array(bytearray(data), dtype=np.int8)[16:-2]
-        data = data * (vdiv / 25.0) + ofst
-        return data, sara
+            if time.monotonic() > deadline:
+                raise AcquisitionTimeout('No trigger within {:.1f} s'.format(deadline - start))
+            self.wait(delay)
+            delay = min(2 * delay, self.POLL_MAX)
+        self.metrics['arm_latency'] = time.monotonic() - start
+        self.metrics['inr_polls'] = polls
+
+    def _changed_settings(self, **settings) -> list[str]:
+        """Return the commands for the settings that differ from those sent.
+           Changing a setting that affects the scaling invalidates it.
+        """
+        commands = []
+        for name, value in settings.items():
+            if self._settings.get(name) != value:
+                self._settings[name] = value
+                commands.append(name + ' ' + value)
+                if name in self.SCALING_SETTINGS:
+                    self._scaling = None
+        return commands
+
+    def _query_scaling(self) -> tuple[float, float, float]:
+        """Query the volts/div, offset and sample rate in one round trip"""
+        values = self._scope.ask('C1:VDIV?;C1:OFST?;SARA?').strip().split(';')
+        if len(values) != 3:  # Responses not combined, so ask separately
+            values = [self._scope.ask(q) for q in ['C1:VDIV?', 'C1:OFST?', 'SARA?']]
+        vdiv, ofst, sara = values
+        return float(vdiv), float(ofst), decode_unit_prefix(sara)
+
+    def _invalidate(self) -> None:
+        """Forget the cached instrument state"""
+        self._settings = {}
+        self._scaling = None
+        self._refresh_time = time.monotonic() + self.REFRESH_INTERVAL
 
     def close(self) -> None:
         """Close the driver."""
@@ -86,3 +187,4 @@ class Driver(ScopeDriver):
             self._scope.write('TRMD AUTO')  # Restore auto triggering
             self._scope.close()
             self._scope = None
+            self._invalidate()
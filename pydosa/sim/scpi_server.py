@@ -0,0 +1,231 @@
+"""
+Local SCPI servers for testing and benchmarking the transports.
+
+These serve a simulated device over a raw TCP socket or over VXI-11,
+on the local host. The device is any object with a method
+
+    execute(message: str) -> bytes | None
+
+that is called with each message received and returns the response,
+if any. The VXI-11 server implements the core channel only and does not
+register with a portmapper, so clients must be given its port, e.g. by
+connect_vxi11().
+
+A LinkModel can be given to emulate the bandwidth and latency of the
+network. The latency is added to each round trip: each query on the
+raw socket, but every RPC call (including writes) for VXI-11. The
+servers count the round trips and the bytes sent.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import socket
+import threading
+import time
+from collections import Counter
+
+import vxi11
+from vxi11 import rpc
+from vxi11.vxi11 import (CoreClient, Packer, Unpacker, DEVICE_CORE_PROG, DEVICE_CORE_VERS,
+                         ERR_IO_TIMEOUT, RX_END)
+
+ENCODING = 'utf-8'
+LOCALHOST = '127.0.0.1'
+
+
+class LinkModel(object):
+    """Bandwidth and latency of an emulated network link"""
+
+    CHUNK = 1 << 16  # Bytes sent between pauses to limit the bandwidth
+
+    def __init__(self, bandwidth: float = None, latency: float = 0.0):
+        """Initialization
+           :param bandwidth: Bytes per second, or None for unlimited
+           :param latency: Delay added to each round trip (seconds)
+        """
+        self.bandwidth = bandwidth
+        self.latency = latency
+
+    def round_trip(self) -> None:
+        """Delay the response to a request"""
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def transfer_time(self, nbytes: int) -> float:
+        """Time to transfer a number of bytes (seconds)"""
+        return nbytes / self.bandwidth if self.bandwidth else 0.0
+
+    def send(self, conn: socket.socket, data: bytes) -> None:
+        """Send data no faster than the bandwidth"""
+        if not self.bandwidth:
+            conn.sendall(data)
+            return
+        view = memoryview(data)
+        t0 = time.perf_counter()
+        for start in range(0, len(view), self.CHUNK):
+            conn.sendall(view[start:start + self.CHUNK])
+            delay = t0 + self.transfer_time(start + self.CHUNK) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class SocketServer(object):
+    """Serves a device as SCPI over a raw TCP socket"""
+
+    def __init__(self, device, host: str = LOCALHOST, port: int = 0, link: LinkModel = None):
+        """Initialization
+           :param device: Device that executes the messages
+           :param host: Interface to listen on
+           :param port: TCP port, or 0 for any free port
+           :param link: Emulated network link, or None for the local host
+        """
+        self.device = device
+        self.link = link if link is not None else LinkModel()
+        self.counters = Counter()  # 'round_trips' and 'bytes' sent
+        self.sock = socket.create_server((host, port))
+        self.host, self.port = self.sock.getsockname()[:2]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self) -> 'SocketServer':
+        """Start serving in a background thread"""
+        self._thread.start()
+        return self
+
+    def _serve(self) -> None:
+        """Accept connections, each served by its own thread"""
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break  # Server closed
+            threading.Thread(target=self.session, args=(conn,), daemon=True).start()
+
+    def session(self, conn: socket.socket) -> None:
+        """Execute the messages received on a connection"""
+        with conn:
+            try:
+                for line in conn.makefile('rb'):
+                    response = self.device.execute(line.decode(ENCODING).strip())
+                    if response is not None:
+                        self.send(conn, response)
+            except OSError:
+                pass  # Client disconnected
+
+    def send(self, conn: socket.socket, response: bytes) -> None:
+        """Send a response"""
+        self.counters['round_trips'] += 1
+        self.counters['bytes'] += len(response)
+        self.link.round_trip()
+        self.link.send(conn, response)
+
+    def close(self) -> None:
+        """Stop accepting connections"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # Wake the accept
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Vxi11Server(rpc.TCPServer):
+    """Serves a device over the VXI-11 core channel"""
+
+    MAX_RECV_SIZE = 1 << 20  # Largest read or write offered to clients
+
+    def __init__(self, device, host: str = LOCALHOST, port: int = 0, link: LinkModel = None):
+        """Initialization
+           :param device: Device that executes the messages
+           :param host: Interface to listen on
+           :param port: TCP port, or 0 for any free port
+           :param link: Emulated network link, or None for the local host
+        """
+        self.device = device
+        self.link = link if link is not None else LinkModel()
+        self.counters = Counter()  # 'round_trips' and 'bytes' sent
+        self._responses = {}  # Unread response for each link
+        self._next_link = 0
+        self._lock = threading.Lock()  # The packer and unpacker are shared
+        rpc.TCPServer.__init__(self, host, DEVICE_CORE_PROG, DEVICE_CORE_VERS, port)
+        self.sock.listen()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def addpackers(self) -> None:
+        self.packer = Packer()
+        self.unpacker = Unpacker('')
+
+    def start(self) -> 'Vxi11Server':
+        """Start serving in a background thread"""
+        self._thread.start()
+        return self
+
+    def _serve(self) -> None:
+        """Accept connections, each served by its own thread"""
+        while True:
+            try:
+                connection = self.sock.accept()
+            except OSError:
+                break  # Server closed
+            threading.Thread(target=self.session, args=(connection,), daemon=True).start()
+
+    def handle(self, call: bytes) -> bytes:
+        self.link.round_trip()
+        with self._lock:
+            self.counters['round_trips'] += 1
+            return rpc.TCPServer.handle(self, call)
+
+    def handle_10(self) -> None:
+        """create_link"""
+        self.unpacker.unpack_create_link_parms()
+        self.turn_around()
+        self._next_link += 1
+        self._responses[self._next_link] = b''
+        self.packer.pack_create_link_resp((0, self._next_link, 0, self.MAX_RECV_SIZE))
+
+    def handle_11(self) -> None:
+        """device_write"""
+        link, _, _, _, data = self.unpacker.unpack_device_write_parms()
+        self.turn_around()
+        response = self.device.execute(data.decode(ENCODING).strip())
+        if response is not None:
+            self._responses[link] = memoryview(response)
+        self.packer.pack_device_write_resp((0, len(data)))
+
+    def handle_12(self) -> None:
+        """device_read"""
+        link, request_size, _, _, _, _ = self.unpacker.unpack_device_read_parms()
+        self.turn_around()
+        pending = self._responses.get(link, b'')
+        if not pending:
+            self.packer.pack_device_read_resp((ERR_IO_TIMEOUT, 0, b''))
+            return
+        data = bytes(pending[:request_size])
+        self._responses[link] = pending[request_size:]
+        reason = RX_END if len(data) == len(pending) else 0
+        self.counters['bytes'] += len(data)
+        time.sleep(self.link.transfer_time(len(data)))
+        self.packer.pack_device_read_resp((0, reason, data))
+
+    def handle_23(self) -> None:
+        """destroy_link"""
+        link = self.unpacker.unpack_device_link()
+        self.turn_around()
+        self._responses.pop(link, None)
+        self.packer.pack_device_error(0)
+
+    def close(self) -> None:
+        """Stop accepting connections"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # Wake the accept
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def connect_vxi11(host: str, port: int) -> vxi11.Instrument:
+    """Return a VXI-11 Instrument for a server on a known port.
+       This bypasses the portmapper, which Vxi11Server does not use.
+    """
+    instr = vxi11.Instrument(host)
+    instr.client = CoreClient(host, port)
+    return instr
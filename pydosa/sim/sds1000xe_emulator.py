@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Emulator of a Siglent SDS1000X-E oscilloscope for end-to-end tests.
+
+This implements the SCPI commands used by the siglent_sds1000xe driver,
+so the whole acquisition path (commands, waiting for the trigger, block
+decoding and network transfer) can be tested and benchmarked without
+an oscilloscope. It is served on the local host by the raw socket and
+VXI-11 servers in scpi_server, optionally with the bandwidth and
+latency of a real network.
+
+The waveform is channel 1 of a WaveGen, quantized to 8-bit codes using
+the volts/div and offset. It is only regenerated when the settings
+change, so the emulator is not the bottleneck in a benchmark. Each
+acquisition takes 14 divisions of real time after it is armed.
+
+Options when run from the command line:
+  -p <port>       Raw socket port (default 5025)
+  -v <port>       VXI-11 port (default none)
+  -b <MB/s>       Link bandwidth (default unlimited)
+  -l <ms>         Latency of each round trip
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+import getopt
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from numpy import array as npa
+
+from pydosa.sim.scpi_server import LinkModel, SocketServer, Vxi11Server
+from pydosa.sim.wavegen import WaveGen
+from pydosa.util.scpi_socket import SCPI_PORT
+
+# Signal on channel 1, in the format of the [SIMULATOR] preferences
+SIGNAL = {'wave': 'sine', 'freq': '3e7', 'dc': '0', 'amplitude': '0', 'units': 'dBm',
+          'mod_freq': '5e4', 'mod_depth': '0', 'noise': '-60', 'noise_units': 'dBm',
+          'quantization': '0'}
+
+
+class Sds1000xeEmulator(object):
+    """Emulates the SCPI commands of a Siglent SDS1000X-E used by the driver"""
+
+    IDN = 'Siglent Technologies,SDS1104X-E,SDS1EEMU000001,8.2.6.1.37R10'
+    MAX_SRATE = 1E9  # Sa/s
+    HDIVS = 14  # Horizontal divisions
+    CODES_PER_DIV = 25  # ADC codes per vertical division
+
+    def __init__(self, depth: int = 14000000, wavegen: WaveGen = None):
+        """Initialization
+           :param depth: Memory depth (samples)
+           :param wavegen: Source of the channel 1 signal
+        """
+        self.depth = depth
+        self.wavegen = wavegen if wavegen is not None else WaveGen(SIGNAL)
+        self.tdiv = 1E-3
+        self.vdiv = 0.5
+        self.ofst = 0.0
+        self.trmd = 'AUTO'
+        self.inr = 0  # Internal state change register
+        self.triggered = True  # False to emulate a missing trigger
+        self.wfsu = {'SP': 1, 'NP': 0, 'FP': 0}
+        self.counters = Counter()  # Number of each command received
+        self._armed_at = None
+        self._codes = None
+        self._codes_key = None
+        self._lock = threading.Lock()  # Commands may arrive on several connections
+
+    @property
+    def srate(self) -> float:
+        """Sample rate for the current time/div"""
+        return min(self.MAX_SRATE, self.depth / (self.HDIVS * self.tdiv))
+
+    def execute(self, message: str) -> bytes | None:
+        """Execute a message of commands separated by ';'.
+           Responses to several queries are combined with ';'.
+        """
+        responses = []
+        with self._lock:
+            for command in message.split(';'):
+                command = command.strip()
+                if command:
+                    self.counters[command.split()[0].upper()] += 1
+                    response = self.command(command)
+                    if response is not None:
+                        responses.append(response)
+        if not responses:
+            return None
+        if isinstance(responses[-1], bytes):
+            return responses[-1]  # Waveform block
+        return (';'.join(responses) + '\n').encode()
+
+    def command(self, command: str) -> str | bytes | None:
+        """Execute a single command and return its response, if any"""
+        name, _, args = command.partition(' ')
+        match name.upper():
+            case '*IDN?':
+                return self.IDN
+            case '*OPC?':
+                return '1'
+            case 'TDIV':
+                self.tdiv = float(args)
+            case 'TDIV?':
+                return '{:.2E}'.format(self.tdiv)
+            case 'C1:VDIV':
+                self.vdiv = float(args)
+            case 'C1:VDIV?':
+                return '{:.2E}'.format(self.vdiv)
+            case 'C1:OFST':
+                self.ofst = float(args)
+            case 'C1:OFST?':
+                return '{:.2E}'.format(self.ofst)
+            case 'SARA?':
+                return format_srate(self.srate)
+            case 'TRMD':
+                self.trmd = args.upper()
+            case 'ARM':
+                self._armed_at = time.monotonic()
+            case 'STOP':
+                self._armed_at = None
+            case 'INR?':
+                self._update()
+                inr, self.inr = self.inr, 0  # Reading clears the register
+                return str(inr)
+            case 'WFSU':
+                fields = args.split(',')
+                for key, value in zip(fields[0::2], fields[1::2]):
+                    self.wfsu[key.strip().upper()] = int(value)
+            case 'C1:WF?':
+                return self._waveform()
+            case 'ACQW' | 'MSIZ' | 'CHDR' | 'C1:UNIT' | 'C1:TRA' | 'C2:TRA' | 'C3:TRA' | 'C4:TRA':
+                pass  # Accepted, but not emulated
+            case _:
+                self.counters['unknown'] += 1
+                print('Emulator: unknown command:', command)
+        return None
+
+    def _update(self) -> None:
+        """Complete the acquisition when 14 divisions have elapsed"""
+        if self._armed_at is None or not self.triggered:
+            return
+        if time.monotonic() - self._armed_at >= self.HDIVS * self.tdiv:
+            self.inr |= 1  # New signal acquired
+            self._armed_at = None
+
+    def _waveform(self) -> bytes:
+        """Return the block of samples selected by WFSU"""
+        codes = self.codes()
+        first = min(self.wfsu['FP'], len(codes))
+        count = self.wfsu['NP'] or len(codes)
+        step = max(self.wfsu['SP'], 1)
+        data = np.ascontiguousarray(codes[first:first + count * step:step])
+        return b''.join([b'DAT2,#9%09d' % len(data), memoryview(data), b'\n\n'])
+
+    def codes(self) -> npa:
+        """ADC codes of the acquired waveform, generated for the current settings"""
+        npoints = int(round(self.HDIVS * self.tdiv * self.srate))
+        key = (npoints, self.srate, self.vdiv, self.ofst)
+        if key != self._codes_key:
+            volts, _ = self.wavegen.generate(npoints, self.srate)
+            codes = np.rint((volts - self.ofst) * (self.CODES_PER_DIV / self.vdiv))
+            self._codes = np.clip(codes, -128, 127).astype(np.int8)
+            self._codes_key = key
+        return self._codes
+
+
+def format_srate(srate: float) -> str:
+    """Format a sample rate as the scope does, e.g. '1.00GSa/s'"""
+    for scale, prefix in [(1E9, 'G'), (1E6, 'M'), (1E3, 'k')]:
+        if srate >= scale:
+            return '{:.2f}{}Sa/s'.format(srate / scale, prefix)
+    return '{:.2f}Sa/s'.format(srate)
+
+
+def usage():
+    """Print a command-line usage message"""
+    print(sys.argv[0] + " [-p port] [-v vxi11_port] [-b MB/s] [-l ms]")
+
+
+def main():
+    """Main program to run from command line"""
+    port = SCPI_PORT
+    vxi11_port = None
+    link = LinkModel()
+    try:
+        opts, arg = getopt.getopt(sys.argv[1:], "hp:v:b:l:",
+                                  ["help", "port=", "vxi11=", "bandwidth=", "latency="])
+        for opt, arg in opts:
+            if opt in ("-p", "--port"):
+                port = int(arg)
+            elif opt in ("-v", "--vxi11"):
+                vxi11_port = int(arg)
+            elif opt in ("-b", "--bandwidth"):
+                link.bandwidth = float(arg) * 1E6
+            elif opt in ("-l", "--latency"):
+                link.latency = float(arg) / 1E3
+            else:
+                usage()
+                sys.exit()
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+
+    emulator = Sds1000xeEmulator()
+    servers = [SocketServer(emulator, port=port, link=link).start()]
+    if vxi11_port is not None:
+        servers.append(Vxi11Server(emulator, port=vxi11_port, link=link).start())
+    for server in servers:
+        print('Serving {} on {}:{}'.format(type(server).__name__, server.host, server.port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 
+import numpy as np
 from numpy import array as npa
 
 from pydosa.dsa.scope_driver import ScopeDriver
@@ -37,7 +38,14 @@ class SimDriver(ScopeDriver):
 
     def fetch_data(self, nsamples: int, srate_option: str) -> tuple[npa, float]:
         srate = decode_unit_prefix(srate_option)
-        return self.wavegen.generate(nsamples, srate)
+        data, srate = self.wavegen.generate(nsamples, srate)
+        return data.astype(self.dtype, copy=False), srate
+
+    def fetch_data_into(self, buf: npa, srate_option: str) -> tuple[npa, float, float, float]:
+        srate = decode_unit_prefix(srate_option)
+        data, srate = self.wavegen.generate(len(buf), srate)
+        np.copyto(buf, data, casting='same_kind')
+        return buf, srate, 1.0, 0.0
 
     def close(self) -> None:
         """Close the WaveGen."""
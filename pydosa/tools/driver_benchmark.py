@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Siglent driver against the SDS1000X-E emulator.
+
+Runs the complete acquisition path of the siglent_sds1000xe driver
+(arming, waiting for the acquisition, chunked transfer and block
+decoding) over the raw socket and VXI-11 transports, for each sample
+size the driver offers. Reports the frame rate, the data rate and the
+number of network round trips per frame. The emulated link bandwidth
+and latency make the results reproducible without hardware.
+
+Options:
+  -f <frames>   Number of timed frames for each size
+  -s <srate>    Sample rate option (e.g. 1G)
+  -b <MB/s>     Link bandwidth (default unlimited)
+  -l <ms>       Latency of each round trip
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from pydosa.dsa.instrument import open_driver
+from pydosa.plugins.siglent_sds1000xe import Driver
+from pydosa.sim.scpi_server import LinkModel, SocketServer, Vxi11Server, connect_vxi11
+from pydosa.sim.sds1000xe_emulator import Sds1000xeEmulator
+from pydosa.util.units import decode_unit_prefix
+
+FRAMES = 5  # Timed frames for each size
+SRATE = '1G'
+TRANSPORTS = ['socket', 'vxi11']
+
+
+def time_frames(driver: Driver, server, nsamples: int, srate_option: str,
+                frames: int) -> tuple[float, float]:
+    """Return the mean time and number of round trips per frame"""
+    buf = np.empty(nsamples, np.int8)
+    driver.fetch_data_into(buf, srate_option)  # Warm up
+    round_trips = server.counters['round_trips']
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        driver.fetch_data_into(buf, srate_option)
+    elapsed = time.perf_counter() - t0
+    return elapsed / frames, (server.counters['round_trips'] - round_trips) / frames
+
+
+def benchmark(frames: int = FRAMES, srate_option: str = SRATE, link: LinkModel = None) -> None:
+    """Print a table of frame rates for each transport"""
+    emulator = Sds1000xeEmulator()
+    servers = [SocketServer(emulator, link=link).start(), Vxi11Server(emulator, link=link).start()]
+    socket_driver = open_driver(Driver, '{}:{}'.format(servers[0].host, servers[0].port), 'socket')
+    vxi11_driver = Driver()
+    vxi11_driver.open(connect_vxi11(servers[1].host, servers[1].port))
+    drivers = [socket_driver, vxi11_driver]
+    try:
+        for driver in drivers:
+            driver.prepare()
+        print('{:>10}'.format('Samples') + ''.join('{:>30}'.format(t) for t in TRANSPORTS))
+        for nsamples in sorted({int(decode_unit_prefix(s)) for s in Driver.sample_sizes}):
+            cols = []
+            for driver, server in zip(drivers, servers):
+                t, round_trips = time_frames(driver, server, nsamples, srate_option, frames)
+                cols.append('{:6.1f} fps {:6.1f} MB/s {:4.1f} rt'.format(1 / t, nsamples / t / 1e6,
+                                                                      round_trips))
+            print('{:>10}'.format(nsamples) + ''.join('{:>30}'.format(c) for c in cols))
+    finally:
+        for driver in drivers:
+            driver.close()
+        for server in servers:
+            server.close()
+
+
+def usage():
+    """Print a command-line usage message"""
+    print(sys.argv[0] + " [-f frames] [-s srate] [-b MB/s] [-l ms]")
+
+
+def main():
+    """Main program to run from command line"""
+    frames = FRAMES
+    srate_option = SRATE
+    link = LinkModel()
+    try:
+        opts, arg = getopt.getopt(sys.argv[1:], "hf:s:b:l:",
+                                  ["help", "frames=", "srate=", "bandwidth=", "latency="])
+        for opt, arg in opts:
+            if opt in ("-f", "--frames"):
+                frames = int(arg)
+            elif opt in ("-s", "--srate"):
+                srate_option = arg
+            elif opt in ("-b", "--bandwidth"):
+                link.bandwidth = float(arg) * 1E6
+            elif opt in ("-l", "--latency"):
+                link.latency = float(arg) / 1E3
+            else:
+                usage()
+                sys.exit()
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+
+    benchmark(frames, srate_option, link)
+
+
+if __name__ == "__main__":
+    main()
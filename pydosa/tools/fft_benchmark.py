@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the FFT backends.
+
+Times a real FFT of each sample size offered by the Siglent and
+simulator drivers and reports the speed-up relative to numpy.
+
+Options:
+  -r <repeats>  Number of timed repeats (best is reported)
+  -w <workers>  Number of FFT threads (-1 for all CPUs)
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from pydosa.dsa.fft_backend import BACKENDS, get_backend, pyfftw
+from pydosa.plugins.siglent_sds1000xe import Driver
+from pydosa.sim.sim_driver import SimDriver
+from pydosa.util.units import decode_unit_prefix
+
+REPEATS = 3  # Timed repeats for each size
+
+
+def sample_sizes() -> list[int]:
+    """Sample sizes offered by the Siglent and simulator drivers"""
+    options = set(Driver.sample_sizes) | set(SimDriver.sample_sizes)
+    return sorted({int(decode_unit_prefix(s)) for s in options})
+
+
+def time_rfft(backend, data: np.ndarray, repeats: int) -> float:
+    """Return the best time for an FFT of the data"""
+    backend.rfft(data)  # Warm up (and plan)
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        backend.rfft(data)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark(repeats: int = REPEATS, workers: int = -1) -> None:
+    """Print a table of FFT times and speed-ups"""
+    names = [b for b in BACKENDS if b != 'pyfftw' or pyfftw is not None]
+    backends = [get_backend(name, workers) for name in names]
+    rng = np.random.default_rng()
+
+    print('{:>10}'.format('Samples') + ''.join('{:>18}'.format(n) for n in names))
+    for nsamples in sample_sizes():
+        data = rng.normal(size=nsamples)
+        times = [time_rfft(b, data, repeats) for b in backends]
+        cols = ['{:9.2f} ms {:5.1f}x'.format(t * 1e3, times[0] / t) for t in times]
+        print('{:>10}'.format(nsamples) + ''.join('{:>18}'.format(c) for c in cols))
+
+
+def usage():
+    """Print a command-line usage message"""
+    print(sys.argv[0] + " [-r repeats] [-w workers]")
+
+
+def main():
+    """Main program to run from command line"""
+    repeats = REPEATS
+    workers = -1
+    try:
+        opts, arg = getopt.getopt(sys.argv[1:], "hr:w:", ["help", "repeats=", "workers="])
+        for opt, arg in opts:
+            if opt in ("-r", "--repeats"):
+                repeats = int(arg)
+            elif opt in ("-w", "--workers"):
+                workers = int(arg)
+            else:
+                usage()
+                sys.exit()
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+
+    benchmark(repeats, workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the spectrum analysis methods.
+
+Times the full-band FFT against the Zoom and chirp-Z (CZT) methods
+for each sample size offered by the Siglent and simulator drivers.
+The zoomed methods only evaluate the span being displayed.
+
+Options:
+  -r <repeats>  Number of timed repeats (best is reported)
+  -s <span>     Span as a fraction of the Nyquist frequency
+  -w <window>   Window function
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from pydosa.dsa.analyzer import Analyzer
+from pydosa.tools.fft_benchmark import sample_sizes
+
+REPEATS = 3  # Timed repeats for each size
+SPAN = 0.1  # Fraction of the Nyquist frequency
+METHODS = ['FFT', 'Zoom', 'CZT']
+SRATE = 1e9  # Nominal sample rate (Sa/s)
+
+
+def time_method(analyzer: Analyzer, data: np.ndarray, window: str, method: str,
+                fstart: float, fstop: float, repeats: int) -> float:
+    """Return the best time to analyze the data"""
+    analyzer.analyze(data, SRATE, 'Normal', window, method, 1.0, 0.0, fstart, fstop)  # Warm up
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        analyzer.analyze(data, SRATE, 'Normal', window, method, 1.0, 0.0, fstart, fstop)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark(repeats: int = REPEATS, span: float = SPAN, window: str = 'Hanning') -> None:
+    """Print a table of analysis times and speed-ups relative to the FFT"""
+    fstart = SRATE / 4 * (1 - span)
+    fstop = fstart + SRATE / 2 * span
+    rng = np.random.default_rng()
+
+    print('{:>10}'.format('Samples') + ''.join('{:>18}'.format(m) for m in METHODS))
+    for nsamples in sample_sizes():
+        data = rng.normal(size=nsamples)
+        times = [time_method(Analyzer(), data, window, m, fstart, fstop, repeats)
+                 for m in METHODS]
+        cols = ['{:9.2f} ms {:5.1f}x'.format(t * 1e3, times[0] / t) for t in times]
+        print('{:>10}'.format(nsamples) + ''.join('{:>18}'.format(c) for c in cols))
+
+
+def usage():
+    """Print a command-line usage message"""
+    print(sys.argv[0] + " [-r repeats] [-s span] [-w window]")
+
+
+def main():
+    """Main program to run from command line"""
+    repeats = REPEATS
+    span = SPAN
+    window = 'Hanning'
+    try:
+        opts, arg = getopt.getopt(sys.argv[1:], "hr:s:w:",
+                                  ["help", "repeats=", "span=", "window="])
+        for opt, arg in opts:
+            if opt in ("-r", "--repeats"):
+                repeats = int(arg)
+            elif opt in ("-s", "--span"):
+                span = float(arg)
+            elif opt in ("-w", "--window"):
+                window = arg
+            else:
+                usage()
+                sys.exit()
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+
+    benchmark(repeats, span, window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark the instrument transports.
+
+Times the transfer of a waveform block over a raw SCPI socket and over
+VXI-11, each served on the local host by a stand-in that answers every
+'C1:WF? DAT2' query with a block of the requested size. This measures
+the overhead of the protocols and clients, not the instrument or LAN.
+
+Options:
+  -r <repeats>  Number of timed repeats (best is reported)
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from pydosa.plugins.siglent_sds1000xe import Driver
+from pydosa.sim.scpi_server import SocketServer, Vxi11Server, connect_vxi11
+from pydosa.util.scpi_socket import ScpiSocket
+from pydosa.util.units import decode_unit_prefix
+
+REPEATS = 3  # Timed repeats for each size
+TRANSPORTS = ['socket', 'vxi11']
+
+
+class BlockDevice(object):
+    """Stand-in instrument that returns a waveform block of a given size"""
+
+    def __init__(self):
+        self.block = b''
+
+    def set_size(self, nbytes: int) -> None:
+        codes = (np.arange(nbytes) % 256).astype(np.uint8)
+        self.block = b'DAT2,#9%09d' % nbytes + codes.tobytes() + b'\n\n'
+
+    def execute(self, message: str) -> bytes | None:
+        if message.endswith('WF? DAT2'):
+            return self.block
+        return None
+
+
+def time_transfer(instr, repeats: int) -> float:
+    """Return the best time to transfer the waveform"""
+    best = float('inf')
+    for _ in range(repeats + 1):  # Including a warm-up
+        t0 = time.perf_counter()
+        instr.write('C1:WF? DAT2')
+        instr.read_raw()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark(repeats: int = REPEATS) -> None:
+    """Print a table of transfer rates for each transport"""
+    device = BlockDevice()
+    socket_server = SocketServer(device).start()
+    vxi11_server = Vxi11Server(device).start()
+    connections = [ScpiSocket(socket_server.host, socket_server.port),
+                   connect_vxi11(vxi11_server.host, vxi11_server.port)]
+    try:
+        print('{:>10}'.format('Samples') + ''.join('{:>18}'.format(t) for t in TRANSPORTS))
+        for nsamples in sorted({int(decode_unit_prefix(s)) for s in Driver.sample_sizes}):
+            device.set_size(nsamples)
+            times = [time_transfer(c, repeats) for c in connections]
+            cols = ['{:7.1f} MB/s {:5.2f}x'.format(nsamples / t / 1e6, times[1] / t) for t in times]
+            print('{:>10}'.format(nsamples) + ''.join('{:>18}'.format(c) for c in cols))
+    finally:
+        for conn in connections:
+            conn.close()
+        socket_server.close()
+        vxi11_server.close()
+
+
+def usage():
+    """Print a command-line usage message"""
+    print(sys.argv[0] + " [-r repeats]")
+
+
+def main():
+    """Main program to run from command line"""
+    repeats = REPEATS
+    try:
+        opts, arg = getopt.getopt(sys.argv[1:], "hr:", ["help", "repeats="])
+        for opt, arg in opts:
+            if opt in ("-r", "--repeats"):
+                repeats = int(arg)
+            else:
+                usage()
+                sys.exit()
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+
+    benchmark(repeats)
+
+
+if __name__ == "__main__":
+    main()
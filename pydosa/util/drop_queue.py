@@ -0,0 +1,88 @@
+"""
+Bounded queue that drops the oldest item when full.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import queue
+
+
+class QueueClosed(Exception):
+    """Raised by DropQueue.get() when the queue has been closed"""
+    pass
+
+
+class DropQueue(queue.Queue):
+    """Bounded queue that never blocks the producer.
+
+    Putting an item into a full queue discards the oldest item, so the
+    consumer always gets the most recent data. This suits a pipeline
+    in which a slow stage should skip frames rather than fall behind.
+    The optional on_drop callback is called with each discarded item,
+    e.g. to recycle its buffer.
+
+    Closing the queue wakes any consumer waiting in get(), which then
+    raises QueueClosed, so a worker thread can block without a timeout.
+    """
+
+    def __init__(self, maxsize: int = 1, on_drop=None):
+        """Initialization"""
+        if maxsize < 1:
+            raise ValueError('Queue size must be at least 1: ', maxsize)
+        queue.Queue.__init__(self, maxsize)
+        self.on_drop = on_drop
+        self.dropped = 0  # Number of items discarded
+        self.closed = False
+
+    def put(self, item, block=True, timeout=None) -> None:
+        """Add an item, discarding the oldest one if the queue is full"""
+        dropped = []
+        with self.not_full:
+            while self._qsize() >= self.maxsize:
+                dropped.append(self._get())
+                self.unfinished_tasks -= 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.dropped += len(dropped)
+            self.not_empty.notify()
+        if self.on_drop is not None:
+            for old in dropped:
+                self.on_drop(old)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest item.
+           Raises QueueClosed if the queue is closed while waiting.
+        """
+        with self.not_empty:
+            if not block:
+                if not self._qsize():
+                    if self.closed:
+                        raise QueueClosed
+                    raise queue.Empty
+            elif not self.not_empty.wait_for(lambda: self._qsize() or self.closed,
+                                             timeout):
+                raise queue.Empty
+            if not self._qsize():
+                raise QueueClosed
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def close(self) -> None:
+        """Close the queue, waking any waiting consumers"""
+        with self.not_empty:
+            self.closed = True
+            self.not_empty.notify_all()
+
+    def clear(self) -> None:
+        """Discard all the queued items"""
+        dropped = []
+        with self.not_full:
+            while self._qsize() > 0:
+                dropped.append(self._get())
+                self.unfinished_tasks -= 1
+            self.not_full.notify_all()
+        if self.on_drop is not None:
+            for old in dropped:
+                self.on_drop(old)
@@ -0,0 +1,69 @@
+"""
+Decoding of IEEE 488.2 binary blocks.
+
+Scopes return waveform data as an arbitrary block, e.g. '#9000001000'
+followed by 1000 bytes, where the digit after '#' is the number of
+digits in the byte count. The response may have a prefix (e.g. 'DAT2,'
+from Siglent scopes) and is followed by a terminator.
+
+The samples are returned as a read-only view of the response, without
+copying. Byte-swapped (big-endian) payloads keep their byte order in the
+view's dtype, so they are only converted when the samples are scaled.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+from numpy import array as npa
+
+HEADER_SEARCH = 64  # Maximum length of any prefix before the '#'
+
+
+class BlockError(ValueError):
+    """Raised when a response is not a valid IEEE 488.2 block"""
+    pass
+
+
+def block_header(data: bytes, start: int = 0) -> tuple[int, int]:
+    """Find and check the header of a definite-length block.
+       :param data: Response from the instrument
+       :param start: Position from which to search for the '#'
+       :return: Offset and length in bytes of the payload
+    """
+    head = bytes(data[start:start + HEADER_SEARCH + 11])  # Small copy of the header only
+    p = head.find(b'#', 0, HEADER_SEARCH)
+    if p < 0:
+        raise BlockError('No block header')
+    ndigits = head[p + 1] - ord('0') if p + 1 < len(head) else -1
+    if ndigits == 0:
+        raise BlockError('Indefinite-length blocks are not supported')
+    if not 1 <= ndigits <= 9:
+        raise BlockError('Bad block header: ', head[p:p + 2])
+    p += start
+    digits = bytes(data[p + 2:p + 2 + ndigits])
+    if len(digits) != ndigits or not digits.isdigit():
+        raise BlockError('Bad block length: ', digits)
+    offset = p + 2 + ndigits
+    length = int(digits)
+    if offset + length > len(data):
+        raise BlockError('Short block: expected {} bytes, got {}'.format(length, len(data) - offset))
+    return offset, length
+
+
+def parse_block(data: bytes, dtype=np.int8, byteorder: str = '<', start: int = 0) -> npa:
+    """Return the payload of a definite-length block as a numpy array view.
+       :param data: Response from the instrument (bytes, bytearray or memoryview)
+       :param dtype: Sample type, e.g. np.int8 or np.int16
+       :param byteorder: Byte order of multi-byte samples: '<' little or '>' big endian
+       :param start: Position from which to search for the '#'
+    """
+    dtype = np.dtype(dtype)
+    if dtype.itemsize > 1:
+        dtype = dtype.newbyteorder(byteorder)
+    offset, length = block_header(data, start)
+    if length % dtype.itemsize != 0:
+        raise BlockError('Block length {} is not a multiple of {}'.format(length, dtype.itemsize))
+    view = np.frombuffer(data, dtype, count=length // dtype.itemsize, offset=offset)
+    view.flags.writeable = False  # Even if the response is a bytearray
+    return view
@@ -0,0 +1,231 @@
+"""
+SCPI connection over a raw TCP socket.
+
+Most LAN instruments accept SCPI on a plain TCP socket (usually port
+5025) as well as VXI-11. VXI-11 wraps every transfer in an RPC call and
+python-vxi11 reads at most 1 MiB per call, so a long waveform costs many
+round trips. A raw socket streams the whole response, using a large
+receive buffer.
+
+Text responses end with a newline. Binary responses are IEEE 488.2
+definite-length blocks, whose length is read from the header, so they
+may contain newlines. Connections are persistent and can be returned
+to a pool when closed, so that they can be reused without reconnecting.
+An idle connection that has been dropped by the instrument (or a NAT
+router) is replaced by a new one when it is taken from the pool.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import atexit
+import socket
+import threading
+
+SCPI_PORT = 5025
+TIMEOUT = 10.0  # Seconds
+RCVBUF = 4 << 20  # Socket receive buffer size (bytes)
+RECV_SIZE = 1 << 16  # Bytes per recv for text responses
+ENCODING = 'utf-8'
+
+
+class ScpiSocket(object):
+    """SCPI connection to an instrument over a raw TCP socket.
+
+    This has the same ask/write/read_raw/close interface as a VXI-11
+    Instrument, so drivers and VxiLogger can use either.
+    """
+
+    def __init__(self, host: str, port: int = SCPI_PORT, timeout: float = TIMEOUT,
+                 rcvbuf: int = RCVBUF):
+        """Initialization
+           :param host: Host name or IP address
+           :param port: TCP port
+           :param timeout: Timeout for each socket operation (seconds)
+           :param rcvbuf: Socket receive buffer size (bytes)
+        """
+        self.host = host
+        self.port = port
+        self._timeout = timeout
+        self.rcvbuf = rcvbuf
+        self.pool = None  # Pool to which close() returns the connection
+        self._sock = None
+        self._buf = bytearray()  # Received bytes not yet returned
+
+    @property
+    def timeout(self) -> float:
+        """Timeout for each socket operation (seconds)"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self._timeout = value
+        if self._sock is not None:
+            self._sock.settimeout(value)
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def is_alive(self) -> bool:
+        """Check that an idle connection is still open at the other end.
+           Unread data also makes it unusable, as it would be taken as a response.
+        """
+        if self._sock is None:
+            return False
+        try:
+            self._sock.setblocking(False)
+            self._sock.recv(1, socket.MSG_PEEK)  # EOF or stale data
+            return False
+        except BlockingIOError:
+            return True  # Nothing to read, as expected
+        except OSError:
+            return False  # E.g. reset by the other end
+        finally:
+            self._sock.settimeout(self._timeout)
+
+    def open(self) -> None:
+        """Connect to the instrument, if not already connected"""
+        if self._sock is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            # Set before connecting, so that the TCP window can be scaled to match
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(self._timeout)
+            sock.connect((self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._buf.clear()
+
+    def write(self, message: str) -> None:
+        """Send a SCPI command"""
+        self.write_raw(message.encode(ENCODING) + b'\n')
+
+    def write_raw(self, data: bytes) -> None:
+        """Send raw bytes"""
+        self.open()
+        self._sock.sendall(data)
+
+    def ask(self, message: str) -> str:
+        """Send a SCPI query and return the response"""
+        self.write(message)
+        return self.read_raw().decode(ENCODING).rstrip('\r\n')
+
+    def read_raw(self) -> bytes:
+        """Read a response: a line of text, or a line containing a block.
+           Blank lines, such as a second terminator after a block, are skipped.
+        """
+        self.open()
+        buf = self._buf
+        pos = 0
+        while True:
+            nl = buf.find(b'\n', pos)
+            p = buf.find(b'#', pos, nl if nl >= 0 else len(buf))
+            if p >= 0:
+                if p + 1 >= len(buf):
+                    pos = p
+                    self._recv()
+                    continue
+                ndigits = buf[p + 1] - ord('0')
+                if 1 <= ndigits <= 9:
+                    while len(buf) < p + 2 + ndigits:
+                        self._recv()
+                    length = int(buf[p + 2:p + 2 + ndigits])
+                    return self._read_block(p + 2 + ndigits + length)
+                pos = p + 1  # Not a block, e.g. a '#H' hexadecimal number
+                continue
+            if nl >= 0:
+                line = bytes(buf[:nl + 1])
+                del buf[:nl + 1]
+                if line.strip():
+                    return line
+                pos = 0
+                continue
+            pos = len(buf)
+            self._recv()
+
+    def _read_block(self, size: int) -> bytearray:
+        """Read a response with a block that ends at the given size.
+           The payload is received directly into the result.
+        """
+        result = bytearray(size)
+        n = min(len(self._buf), size)
+        result[:n] = self._buf[:n]
+        del self._buf[:n]
+        view = memoryview(result)
+        while n < size:
+            count = self._sock.recv_into(view[n:])
+            if count == 0:
+                raise ConnectionError('Connection closed by instrument')
+            n += count
+        while b'\n' not in self._buf:  # Discard the terminator
+            self._recv()
+        del self._buf[:self._buf.index(b'\n') + 1]
+        return result
+
+    def _recv(self) -> None:
+        """Receive more bytes into the buffer"""
+        data = self._sock.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError('Connection closed by instrument')
+        self._buf += data
+
+    def close(self) -> None:
+        """Return the connection to its pool, or disconnect if it has none"""
+        if self.pool is not None and self.connected:
+            self.pool.release(self)
+        else:
+            self.disconnect()
+
+    def disconnect(self) -> None:
+        """Close the socket"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class ConnectionPool(object):
+    """Idle connections, kept open for reuse"""
+
+    def __init__(self):
+        """Initialization"""
+        self._idle = {}  # Idle connections for each (host, port)
+        self._lock = threading.Lock()
+
+    def connect(self, host: str, port: int = SCPI_PORT, **kwargs) -> ScpiSocket:
+        """Return an idle connection to the instrument, or a new one"""
+        while True:
+            with self._lock:
+                idle = self._idle.get((host, port))
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if conn.is_alive():
+                return conn
+            conn.disconnect()  # Dropped while idle
+        conn = ScpiSocket(host, port, **kwargs)
+        conn.open()
+        conn.pool = self
+        return conn
+
+    def release(self, conn: ScpiSocket) -> None:
+        """Keep a connection for reuse"""
+        conn._buf.clear()  # Discard any unread response
+        with self._lock:
+            self._idle.setdefault((conn.host, conn.port), []).append(conn)
+
+    def clear(self) -> None:
+        """Disconnect all the idle connections"""
+        with self._lock:
+            idle = [c for conns in self._idle.values() for c in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.disconnect()
+
+
+pool = ConnectionPool()  # Shared pool used by open_instrument
+atexit.register(pool.clear)
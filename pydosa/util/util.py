@@ -5,6 +5,7 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 import math
+import os
 import re
 from itertools import zip_longest
 
@@ -109,3 +110,25 @@ def elide_bytes(data: bytes, start: int = 20, stop: int = 3) -> str:
         first = str(data[0:start])[0:-1]
         last = '' if stop == 0 else str(data[-stop:])[2:]
         return '{} ... {}'.format(first, last)
+
+
+def write_atomic(path: str, write, mode: str = 'w') -> None:
+    """Write a file so that readers never see part of it.
+       The file is written to a temporary file, which is then renamed.
+       Any directories needed are created.
+       :param path: Name of the file
+       :param write: Function called with the open temporary file
+       :param mode: 'w' for text or 'wb' for binary
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, mode) as file:
+            write(file)
+        os.replace(tmp, path)  # Atomic
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,123 @@
+"""
+Pytest unit tests for analysis_thread module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import math
+import threading
+from configparser import ConfigParser
+
+import numpy as np
+
+from pydosa.dsa.analysis_thread import AnalysisThread, Settings
+from pydosa.dsa.analyzer import Analyzer
+from pydosa.dsa.spectrum_widget import PLOT_WIDTH, View
+from pydosa.util.drop_queue import DropQueue
+
+VIEW = View(0, 0.5, 'dBV', 0, 10)
+
+
+def tone(n: int = 1 << 14) -> tuple:
+    """Frame with a 1V RMS tone"""
+    wave = np.cos(2 * math.pi * 0.125 * np.arange(n)) * math.sqrt(2)
+    return wave, 1.0, 1.0, 0.0
+
+
+class TestAnalysisThread:
+
+    def test_pipeline(self):
+        """Test that frames are analysed into pixel coordinates"""
+        frames = DropQueue(1)
+        plots = DropQueue(1)
+        notified = threading.Event()
+        thread = AnalysisThread(Analyzer(), frames, plots, notified.set)
+        thread.settings = Settings('Normal', 'Flat-Top', 'FFT', ('Maximum',), VIEW)
+        thread.start()
+        try:
+            frames.put(tone())
+            assert notified.wait(10)
+            plot = plots.get_nowait()
+        finally:
+            thread.close()
+            thread.join(5)
+        assert not thread.is_alive()
+        assert len(plot.traces) == 2
+        points, _ = plot.traces[0]
+        assert len(points) <= 2 * PLOT_WIDTH
+        x, y = np.array(points[0::2]), np.array(points[1::2])
+        assert x.min() >= 0
+        assert abs(y.min() - 20) < 1  # Peak at 0 dBV is at the top of the grid
+        assert plot.rbw == 1 / (1 << 14)
+
+    def test_shutdown(self):
+        """Test that shutdown waits for the frame being analysed to be released"""
+        frames = DropQueue(1)
+        started = threading.Event()
+        released = []
+
+        def release(frame):
+            started.wait(10)
+            released.append(frame)
+
+        thread = AnalysisThread(Analyzer(), frames, DropQueue(1), release=release)
+        thread.start()
+        frame = tone()
+        frames.put(frame)
+        while frames.qsize():
+            threading.Event().wait(0.01)
+        threading.Timer(0.1, started.set).start()
+        assert thread.shutdown(10)
+        assert released == [frame]
+
+    def test_linear_complete(self):
+        """Test that completion of a linear average is reported"""
+        analyzer = Analyzer()
+        analyzer.averager.navg = 2
+        thread = AnalysisThread(analyzer, DropQueue(1), DropQueue(1))
+        settings = Settings('Linear', 'Hanning', 'FFT', (), VIEW)
+        plot = thread.process(tone(), settings)
+        assert not plot.complete and plot.error_db is None
+        plot = thread.process(tone(), settings)
+        assert plot.complete and plot.count == 2
+        assert abs(plot.error_db) < 1e-6  # Identical frames
+
+    def test_overlays_keep_average(self):
+        """Test that toggling overlays does not restart the main trace"""
+        analyzer = Analyzer()
+        thread = AnalysisThread(analyzer, DropQueue(1), DropQueue(1))
+        counts = []
+        for overlays in [(), ('Maximum',), (), ('Maximum', 'Minimum')]:
+            settings = Settings('Linear', 'Hanning', 'FFT', overlays, VIEW)
+            plot = thread.process(tone(), settings)
+            assert len(plot.traces) == 1 + len(overlays)
+            counts.append(plot.count)
+        assert counts == [1, 2, 3, 4]
+
+    def test_bad_frame(self):
+        """Test that a bad frame or configuration does not stop the thread"""
+        frames = DropQueue(1)
+        plots = DropQueue(1)
+        released = []
+        notified = threading.Event()
+        thread = AnalysisThread(Analyzer(), frames, plots, notified.set, released.append)
+        thread.settings = Settings('Normal', 'Hanning', 'FFT', (), VIEW)
+        thread.start()
+        try:
+            bad = (None, 1.0, 1.0, 0.0)
+            frames.put(bad)
+            while len(released) < 1:
+                threading.Event().wait(0.01)
+            config = ConfigParser()
+            config['ANALYZER'] = {'welch_overlap': '1'}
+            thread.configure(config['ANALYZER'])
+            frames.put(tone())
+            while len(released) < 2:
+                threading.Event().wait(0.01)
+            frames.put(tone())
+            assert notified.wait(10)
+        finally:
+            thread.shutdown(5)
+        assert not thread.is_alive()
+        assert released[0] is bad and len(released) == 3
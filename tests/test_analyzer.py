@@ -6,11 +6,14 @@ Copyright (c) 2020 Jon Brumfitt
 """
 
 import math
+import tracemalloc
+from configparser import ConfigParser
 
 import numpy as np
 import numpy.testing as nt
+import pytest
 
-from pydosa.dsa.analyzer import Analyzer, get_window
+from pydosa.dsa.analyzer import Analyzer, get_window, read_config
 
 
 def db2pwr(dbs):
@@ -51,6 +54,71 @@ class TestAnalyzer:
         nt.assert_allclose(np.sum(power), 1)
         nt.assert_allclose(power, np.array([0, 1.0, 0, 0, 0]), atol=1E-4)
 
+    def test_single_precision(self):
+        """Test float32 analysis against float64 for a quantized tone in noise.
+           Bins within 100 dB of the peak must agree to within 0.05 dB."""
+        rng = np.random.default_rng(2)
+        n = 1 << 18
+        d = np.sin(np.arange(n) * (2 * math.pi * 0.1234)) + rng.normal(scale=1e-3, size=n)
+        d = np.rint(d * 100) / 100  # Quantize like an 8-bit ADC
+        for window in ['Rectangle', 'Hanning', 'Flat-Top', 'Blackman']:
+            spectrum64, _ = Analyzer().compute_spectrum(np.array(d), 1, 'Normal', window)
+            anlzr = Analyzer()
+            anlzr.dtype = np.float32
+            spectrum32, _ = anlzr.compute_spectrum(np.array(d), 1, 'Normal', window)
+            assert spectrum32.dtype == np.float32
+            visible = spectrum64 > spectrum64.max() - 100
+            assert np.max(np.abs(spectrum32 - spectrum64)[visible]) < 0.05
+
+    def test_steady_state_allocation(self):
+        """Test that repeated frames do not allocate memory per sample"""
+        n = 1 << 18
+        d = np.random.default_rng(3).normal(size=n)
+        for method in ['FFT', 'Welch']:
+            for mode in ['Normal', 'Average', 'Maximum']:
+                anlzr = Analyzer()
+                anlzr.segment = 4096
+                anlzr.compute_spectrum(d, 1, mode, 'Hanning', method)  # Warm up
+                anlzr.compute_spectrum(d, 1, mode, 'Hanning', method)
+                tracemalloc.start()
+                anlzr.compute_spectrum(d, 1, mode, 'Hanning', method)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                assert peak < n // 8  # Far less than one buffer of 8n bytes
+
+    def test_fft_workspace_size(self):
+        """Test that the FFT method only allocates the buffers it uses"""
+        n = 1 << 16
+        anlzr = Analyzer()
+        spectrum = anlzr.analyze(np.ones(n), 1, 'Normal', 'Hanning')
+        ws = anlzr._workspace
+        assert not hasattr(ws, 'mean')  # Single segment is its own mean
+        assert anlzr._db is None  # dB buffer only allocated when used
+        assert len(spectrum.db) == n // 2 + 1
+        assert anlzr._db is spectrum.db
+
+    def test_input_unchanged(self):
+        """Test that the input samples are not modified"""
+        d = np.random.default_rng(4).normal(size=1000)
+        expected = np.array(d)
+        Analyzer().compute_spectrum(d, 1, 'Normal', 'Blackman')
+        nt.assert_array_equal(d, expected)
+
+    def test_raw_codes(self):
+        """Test that raw ADC codes with gain and offset match scaled volts"""
+        rng = np.random.default_rng(5)
+        codes = rng.integers(-128, 128, size=4096).astype(np.int8)
+        gain, offset = 0.04, 0.3
+        volts = codes * gain + offset
+        for method in ['FFT', 'Welch']:
+            for window in ['Rectangle', 'Hanning', 'Flat-Top']:
+                anlzr = Analyzer()
+                anlzr.segment = 512
+                expected = np.array(anlzr.compute_spectrum(volts, 1, 'Normal', window, method)[0])
+                spectrum, _ = anlzr.compute_spectrum(codes, 1, 'Normal', window, method,
+                                                     gain, offset)
+                nt.assert_allclose(spectrum, expected, atol=1e-6)
+
     def test_get_window(self):
         n = 1000
         # Integrate window and check gain
@@ -58,3 +126,188 @@ class TestAnalyzer:
             win, loss = get_window(name, n)
             gain = 20 * math.log10(sum(win) / n)
             nt.assert_almost_equal(loss, -gain, decimal=2)
+
+    def test_welch_tone(self):
+        """Test Welch method on a cosine wave centred on a bin"""
+        anlzr = Analyzer()
+        anlzr.segment = 64
+        anlzr.overlap = 0.5
+        n = 1024
+        d = np.cos(np.arange(n) * (2 * math.pi * 8 / 64)) * math.sqrt(2)  # RMS = 1
+        spectrum, srate = anlzr.compute_spectrum(d, 1, 'Normal', 'Rectangle', 'Welch')
+        power = db2pwr(spectrum)
+        assert len(power) == 33
+        nt.assert_allclose(power[8], 1.0)
+        nt.assert_allclose(np.sum(power), 1)
+
+    def test_welch_variance(self):
+        """Test that Welch method reduces the variance of a noise spectrum"""
+        rng = np.random.default_rng(1)
+        d = rng.normal(size=1 << 16)
+        anlzr = Analyzer()
+        anlzr.segment = 256
+        fft_power = db2pwr(anlzr.compute_spectrum(np.array(d), 1, 'Normal', 'Hanning')[0])
+        welch_power = db2pwr(anlzr.compute_spectrum(np.array(d), 1, 'Normal', 'Hanning', 'Welch')[0])
+        # Same mean noise density, but much smaller spread between bins
+        nt.assert_allclose(np.mean(welch_power[1:-1]) * 256, np.mean(fft_power[1:-1]) * (1 << 16),
+                           rtol=0.05)
+        assert np.std(welch_power[1:-1]) / np.mean(welch_power[1:-1]) < 0.2
+        assert np.std(fft_power[1:-1]) / np.mean(fft_power[1:-1]) > 0.5
+
+    def test_zoom(self):
+        """Test zoom FFT on a tone in a narrow span"""
+        rng = np.random.default_rng(1)
+        n = 1 << 18
+        srate = 100e6
+        f = 10.7e6
+        d = np.cos(2 * math.pi * f / srate * np.arange(n)) * math.sqrt(2)
+        d += rng.normal(0, 1e-4, n)
+        anlzr = Analyzer()
+        full = anlzr.analyze(d, srate, 'Normal', 'Hanning', 'FFT')
+        full_floor = np.median(db2pwr(full.db))
+        zoom = Analyzer().analyze(d, srate, 'Normal', 'Hanning', 'Zoom',
+                                  fstart=10.5e6, fstop=10.9e6)
+        assert zoom.f0 <= 10.5e6
+        assert zoom.fmax >= 10.9e6
+        peak = np.argmax(zoom.db)
+        assert abs(zoom.f0 + peak * zoom.df - f) <= zoom.df
+        assert abs(zoom.db[peak]) < 0.1
+        zoom_floor = np.median(db2pwr(zoom.db))
+        assert abs(10 * math.log10(zoom_floor / full_floor)) < 1
+
+    def test_zoom_above_nyquist(self):
+        """Test that zoom does not show aliases in a span above Nyquist"""
+        n = 1 << 16
+        srate = 20e6
+        d = np.cos(2 * math.pi * 4.5e6 / srate * np.arange(n)) * math.sqrt(2)
+        for fstart, fstop in [(15e6, 16e6), (9e6, 12e6)]:
+            zoom = Analyzer().analyze(d, srate, 'Normal', 'Hanning', 'Zoom',
+                                      fstart=fstart, fstop=fstop)
+            assert zoom.fmax <= srate / 2 + zoom.df
+            freqs = zoom.f0 + np.arange(len(zoom)) * zoom.df
+            assert np.all(zoom.db[freqs >= fstart] < -60)
+
+    def test_zoom_raw_codes(self):
+        """Test that zoom of raw codes matches scaled volts, with small buffers"""
+        n = (1 << 20) + 3
+        codes = np.random.default_rng(6).integers(-128, 128, size=n).astype(np.int8)
+        gain, offset = 0.04, 0.3
+        args = ('Normal', 'Hanning', 'Zoom')
+        volts = Analyzer().analyze(codes * gain + offset, 1, *args, fstart=0.0, fstop=0.01)
+        anlzr = Analyzer()
+        zoom = anlzr.analyze(codes, 1, *args, gain, offset, 0.0, 0.01)
+        nt.assert_allclose(zoom.power, volts.power, rtol=1e-6, atol=1e-12)
+        ws = anlzr._workspace
+        assert ws.oscillator.nbytes + ws.mixed.nbytes < 4 * n  # Not 16n for a whole frame
+
+    def test_czt(self):
+        """Test chirp-Z transform on the display grid"""
+        n = 4096
+        d = np.cos(2 * math.pi * 0.125 * np.arange(n)) * math.sqrt(2)
+        anlzr = Analyzer()
+        anlzr.czt_points = 201
+        czt = anlzr.analyze(d, 1, 'Normal', 'Flat-Top', 'CZT', 1.0, 0.5, 0.1, 0.15)
+        assert len(czt) == 201
+        nt.assert_allclose(czt.f0, 0.1)
+        nt.assert_allclose(czt.fmax, 0.15)
+        peak = np.argmax(czt.db)
+        nt.assert_allclose(czt.f0 + peak * czt.df, 0.125)
+        nt.assert_allclose(czt.db[peak], 0, atol=0.01)
+
+    def test_czt_above_nyquist(self):
+        """Test that chirp-Z stops at Nyquist instead of showing images"""
+        n = 1 << 14
+        srate = 20e6
+        d = np.cos(2 * math.pi * 3e6 / srate * np.arange(n)) * math.sqrt(2)
+        anlzr = Analyzer()
+        anlzr.czt_points = 401
+        czt = anlzr.analyze(d, srate, 'Normal', 'Hanning', 'CZT', fstart=0.0, fstop=40e6)
+        assert len(czt) == 401
+        nt.assert_allclose(czt.fmax, srate / 2)
+        freqs = czt.f0 + np.arange(len(czt)) * czt.df
+        nt.assert_allclose(czt.db.max(), 0, atol=0.1)
+        assert abs(freqs[np.argmax(czt.db)] - 3e6) <= czt.df
+        assert np.all(czt.db[freqs > 4e6] < -60)
+        above = Analyzer().analyze(d, srate, 'Normal', 'Hanning', 'CZT',
+                                   fstart=15e6, fstop=16e6)
+        assert above.fmax <= srate / 2
+
+    def test_czt_rbw(self):
+        """Test that the chirp-Z RBW is the bin width, not the point spacing"""
+        n = 1 << 14
+        anlzr = Analyzer()
+        anlzr.czt_points = 101
+        czt = anlzr.analyze(np.zeros(n), 1e9, 'Normal', 'Hanning', 'CZT', fstart=0.0, fstop=5e8)
+        nt.assert_allclose(czt.df, 5e6)
+        nt.assert_allclose(czt.rbw, 1e9 / n)
+        zoom = anlzr.analyze(np.zeros(n), 1e9, 'Normal', 'Hanning', 'Zoom',
+                             fstart=1e8, fstop=1.1e8)
+        nt.assert_allclose(zoom.rbw, 1e9 / n, rtol=1e-3)
+        anlzr.segment = 1024
+        welch = anlzr.analyze(np.zeros(n), 1e9, 'Normal', 'Hanning', 'Welch')
+        nt.assert_allclose(welch.rbw, 1e9 / 1024)
+
+    def test_czt_dc(self):
+        """Test chirp-Z transform of a DC offset given as raw codes"""
+        anlzr = Analyzer()
+        anlzr.czt_points = 64
+        czt = anlzr.analyze(np.full(1000, 2, np.int8), 1, 'Normal', 'Hanning',
+                            'CZT', 0.25, 0.5, 0.0, 0.5)
+        nt.assert_allclose(czt.db[0], 0, atol=0.01)  # 2 * 0.25 + 0.5 = 1V
+
+    def test_display_points(self):
+        """Test averaging at display resolution preserves peaks"""
+        n = 1 << 16
+        d = np.cos(2 * math.pi * 0.2 * np.arange(n)) * math.sqrt(2)  # On a bin
+        full = Analyzer().analyze(d, 1, 'Maximum', 'Rectangle')
+        anlzr = Analyzer()
+        anlzr.display_points = 1000
+        anlzr.averager.dtype = np.float32
+        for _ in range(3):
+            reduced = anlzr.analyze(d, 1, 'Maximum', 'Rectangle')
+        assert len(reduced) <= 1000
+        assert reduced.power.dtype == np.float32
+        nt.assert_allclose(reduced.db.max(), full.db.max(), atol=1e-4)
+        peak = np.argmax(reduced.power)
+        assert abs(reduced.f0 + peak * reduced.df - 0.2) < reduced.df / 2
+        zoomed = anlzr.analyze(d, 1, 'Maximum', 'Rectangle', fstart=0.19, fstop=0.21)
+        assert zoomed.f0 >= 0.19 - zoomed.df and zoomed.fmax <= 0.21 + zoomed.df
+
+    def test_display_points_rbw(self):
+        """Test that reducing to display resolution does not change the RBW"""
+        d = np.zeros(1 << 16)
+        full = Analyzer().analyze(d, 1e9, 'Normal', 'Hanning')
+        anlzr = Analyzer()
+        anlzr.display_points = 1000
+        for method in ['FFT', 'CZT']:
+            anlzr.czt_points = 4096
+            reduced = anlzr.analyze(d, 1e9, 'Normal', 'Hanning', method)
+            assert reduced.df > 10 * full.df
+            assert reduced.rbw == full.rbw
+        traces = anlzr.analyze_traces(d, 1e9, ['Normal', 'Maximum'], 'Hanning')
+        assert all(t.rbw == full.rbw for t in traces.values())
+
+    def test_read_config(self):
+        """Test that invalid preferences are rejected without changing the analyzer"""
+        config = ConfigParser()
+        config['ANALYZER'] = {'welch_overlap': '0.75'}
+        anlzr = Analyzer(config['ANALYZER'])
+        assert read_config(config['ANALYZER'])['welch_overlap'] == 0.75
+        for name, value in [('welch_overlap', '1'), ('welch_segment', '1'),
+                            ('precision', 'half'), ('fft_backend', 'none')]:
+            config['ANALYZER'] = {name: value}
+            with pytest.raises(ValueError):
+                anlzr.configure(config['ANALYZER'])
+        assert anlzr.overlap == 0.75
+
+    def test_analyze_traces(self):
+        """Test that several traces match separate single-mode runs"""
+        rng = np.random.default_rng(7)
+        frames = rng.normal(size=(4, 256))
+        anlzr = Analyzer()
+        single = {mode: Analyzer() for mode in ['Normal', 'Maximum', 'Average']}
+        for frame in frames:
+            spectra = anlzr.analyze_traces(frame, 1, list(single), 'Hanning')
+            for mode, other in single.items():
+                expected = other.analyze(frame, 1, mode, 'Hanning')
+                nt.assert_allclose(spectra[mode].db, expected.db)
@@ -81,3 +81,52 @@ class TestAverager:
         x = avr.average(d[3], 'Minimum')
         nt.assert_allclose(np.array([0, 1, 3]), x)
         nt.assert_allclose(d, self.data)  # Input unchanged
+
+    def test_float32_storage(self):
+        """Test storing the average in single precision"""
+        d = np.array(self.data)  # Clone test data
+        avr = Averager(0.1, np.float32)
+        avr.average(d[0], 'Maximum')
+        x = avr.average(d[1], 'Maximum')
+        assert x.dtype == np.float32
+        nt.assert_allclose(np.array([5, 3, 3]), x)
+        nt.assert_allclose(d, self.data)  # Input unchanged
+
+    def test_linear(self):
+        """Test 'Linear' mode stops after navg frames"""
+        d = np.array(self.data)  # Clone test data
+        avr = Averager(0.1, navg=3)
+        avr.average(d[0], 'Linear')
+        assert avr.variance() is None
+        avr.average(d[1], 'Linear')
+        assert not avr.complete
+        x = avr.average(d[2], 'Linear')
+        assert avr.complete and avr.count == 3
+        nt.assert_allclose(x, d[:3].mean(0))
+        variance = avr.variance()
+        nt.assert_allclose(variance, d[:3].var(0, ddof=1))
+        assert avr.variance() is variance  # Preallocated buffer
+        x = avr.average(d[3], 'Linear')  # Ignored when complete
+        nt.assert_allclose(x, d[:3].mean(0))
+        nt.assert_allclose(d, self.data)  # Input unchanged
+
+    def test_relative_error(self):
+        """Test the standard error of a linear average of noise power"""
+        rng = np.random.default_rng(0)
+        avr = Averager(0.1, navg=100)
+        assert avr.relative_error() is None
+        for _ in range(100):
+            avr.average(rng.exponential(size=10000), 'Linear')
+        nt.assert_allclose(avr.relative_error(), 0.1, rtol=0.05)  # std = mean
+
+    def test_linear_reset(self):
+        """Test that changing mode restarts the linear average"""
+        d = np.array(self.data)
+        avr = Averager(0.1, navg=2)
+        avr.average(d[0], 'Linear')
+        avr.average(d[1], 'Linear')
+        assert avr.complete
+        avr.average(d[2], 'Normal')
+        assert not avr.complete and avr.count == 0
+        x = avr.average(d[3], 'Linear')
+        nt.assert_allclose(x, d[3])
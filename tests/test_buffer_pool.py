@@ -0,0 +1,48 @@
+"""
+Pytest unit tests for buffer_pool module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+
+from pydosa.dsa.buffer_pool import BufferPool
+
+
+class TestBufferPool:
+
+    def test_reuse(self):
+        """Test that released buffers are reused"""
+        pool = BufferPool(2)
+        a = pool.acquire(100, np.int8)
+        b = pool.acquire(100, np.int8)
+        assert a is not b
+        pool.release(a)
+        pool.release(b[:50])  # A leading slice releases the whole buffer
+        c = pool.acquire(100, np.int8)
+        d = pool.acquire(100, np.int8)
+        assert {id(c), id(d)} == {id(a), id(b)}
+        assert pool.allocations == 2
+
+    def test_size_change(self):
+        """Test that buffers of another size or dtype are not reused"""
+        pool = BufferPool()
+        a = pool.acquire(100, np.int8)
+        pool.release(a)
+        b = pool.acquire(100, np.float32)
+        assert b.dtype == np.float32
+        c = pool.acquire(200, np.float32)
+        assert len(c) == 200
+        assert pool.allocations == 3
+
+    def test_limit(self):
+        """Test that at most size free buffers are kept"""
+        pool = BufferPool(1)
+        a = pool.acquire(10, np.float64)
+        b = pool.acquire(10, np.float64)
+        pool.release(a)
+        pool.release(b)
+        pool.release(a)
+        assert pool.acquire(10, np.float64) is a
+        assert pool.acquire(10, np.float64) is not b
@@ -0,0 +1,69 @@
+"""
+Pytest unit tests for drop_queue module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import queue
+import threading
+
+import pytest
+
+from pydosa.util.drop_queue import DropQueue, QueueClosed
+
+
+class TestDropQueue:
+
+    def test_drop_oldest(self):
+        """Test that a full queue discards its oldest item"""
+        dropped = []
+        q = DropQueue(2, dropped.append)
+        for i in range(5):
+            q.put(i)
+        assert dropped == [0, 1, 2]
+        assert q.dropped == 3
+        assert q.get_nowait() == 3
+        assert q.get_nowait() == 4
+        with pytest.raises(queue.Empty):
+            q.get_nowait()
+
+    def test_clear(self):
+        dropped = []
+        q = DropQueue(3, dropped.append)
+        q.put('a')
+        q.put('b')
+        q.clear()
+        assert q.empty()
+        assert dropped == ['a', 'b']
+
+    def test_blocking_get(self):
+        """Test that a waiting consumer is woken by put"""
+        q = DropQueue(1)
+        result = []
+        consumer = threading.Thread(target=lambda: result.append(q.get(timeout=5)))
+        consumer.start()
+        q.put(42)
+        consumer.join(5)
+        assert result == [42]
+
+    def test_size(self):
+        with pytest.raises(ValueError):
+            DropQueue(0)
+
+    def test_close(self):
+        """Test that closing the queue wakes a waiting consumer"""
+        q = DropQueue(1)
+        result = []
+
+        def consume():
+            try:
+                q.get()
+            except QueueClosed:
+                result.append('closed')
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        q.close()
+        consumer.join(5)
+        assert result == ['closed']
@@ -0,0 +1,45 @@
+"""
+Pytest unit tests for fft_backend module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.dsa import fft_backend
+from pydosa.dsa.fft_backend import BACKENDS, get_backend
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_backends_agree(name):
+    """Test that each backend matches the normalized numpy FFT"""
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(3, 1000))
+    expected = np.fft.rfft(data, norm='forward')
+    backend = get_backend(name, 2)
+    nt.assert_allclose(backend.rfft(data), expected, atol=1e-12)
+    nt.assert_allclose(backend.rfft(data[0]), expected[0], atol=1e-12)
+
+
+def test_unknown_backend():
+    """Test that an unknown backend name is rejected"""
+    with pytest.raises(ValueError):
+        get_backend('fftpack')
+
+
+def test_wisdom_round_trip(tmp_path, monkeypatch):
+    """Test that FFTW wisdom saved to a file is imported again"""
+    imported = []
+    fake = SimpleNamespace(export_wisdom=lambda: (b'(double)', b'(single)', b''),
+                           import_wisdom=imported.append)
+    monkeypatch.setattr(fft_backend, 'pyfftw', fake)
+    path = str(tmp_path / 'pydosa' / 'wisdom.json')
+    assert not fft_backend.load_wisdom(path)
+    fft_backend.save_wisdom(path)
+    assert fft_backend.load_wisdom(path)
+    assert imported == [(b'(double)', b'(single)', b'')]
@@ -0,0 +1,61 @@
+"""
+Pytest unit tests for IEEE 488.2 block decoding.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.util.ieee_block import BlockError, block_header, parse_block
+
+
+def block(payload: bytes, prefix: bytes = b'', ndigits: int = 9) -> bytes:
+    return prefix + b'#%d%0*d' % (ndigits, ndigits, len(payload)) + payload + b'\n'
+
+
+class TestIeeeBlock:
+
+    def test_header(self):
+        assert block_header(block(b'abc')) == (11, 3)
+        assert block_header(block(b'abc', b'DAT2,', 1)) == (8, 3)
+
+    def test_int8(self):
+        codes = np.arange(-128, 128, dtype=np.int8)
+        data = block(codes.tobytes(), b'DAT2,')
+        samples = parse_block(data)
+        nt.assert_array_equal(samples, codes)
+        assert np.shares_memory(samples, np.frombuffer(data, np.uint8))
+
+    def test_int16(self):
+        codes = np.arange(-1000, 1000, 7, dtype=np.int16)
+        little = parse_block(block(codes.astype('<i2').tobytes()), np.int16, '<')
+        big = parse_block(block(codes.astype('>i2').tobytes()), np.int16, '>')
+        nt.assert_array_equal(little, codes)
+        nt.assert_array_equal(big, codes)
+
+    def test_memoryview(self):
+        data = bytearray(block(b'\x01\x02\x03', b'C1:WF DAT2,'))
+        nt.assert_array_equal(parse_block(memoryview(data)), [1, 2, 3])
+
+    def test_read_only(self):
+        data = bytearray(block(b'\x01\x02\x03'))
+        samples = parse_block(data)
+        assert not samples.flags.writeable
+        with pytest.raises(ValueError):
+            samples[0] = 0
+
+    def test_errors(self):
+        data = block(b'\x00' * 100)
+        with pytest.raises(BlockError):
+            parse_block(data[:-20])  # Short read
+        with pytest.raises(BlockError):
+            parse_block(b'DAT2,' + b'\x00' * 100)  # No header
+        with pytest.raises(BlockError):
+            parse_block(b'#0\x00\x00\n')  # Indefinite length
+        with pytest.raises(BlockError):
+            parse_block(b'#9000x00003\x00\x00\x00')  # Bad length
+        with pytest.raises(BlockError):
+            parse_block(block(b'\x00' * 3), np.int16)  # Odd length
@@ -0,0 +1,125 @@
+"""
+Pytest unit tests for instrument discovery and the instrument cache.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import socket
+import time
+from concurrent.futures import Future
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+import pytest
+import vxi11
+
+from pydosa.dsa import instrument
+from pydosa.dsa.instrument_cache import InstrumentCache
+from pydosa.plugins.siglent_sds1000xe import Driver
+from pydosa.sim.scpi_server import SocketServer
+
+IDN = 'Siglent Technologies,SDS1104X-E,SDS1EDEX000001,8.2.6.1.37R10'
+
+
+class IdnDevice(object):
+    """Answers *IDN?, optionally after a delay"""
+
+    def __init__(self, idn=IDN, delay=0.0):
+        self.idn = idn
+        self.delay = delay
+
+    def execute(self, message):
+        time.sleep(self.delay)
+        return (self.idn + '\n').encode() if message == '*IDN?' else None
+
+
+def address(server) -> str:
+    return '{}:{}'.format(server.host, server.port)
+
+
+def unused_address() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return '127.0.0.1:{}'.format(sock.getsockname()[1])
+
+
+def make_prefs(tmp_path) -> SimpleNamespace:
+    config = ConfigParser()
+    config['DEVICE'] = {'plugins': 'pydosa.plugins.siglent_sds1000xe', 'transport': 'socket',
+                        'instrument_cache': str(tmp_path / 'instruments.json')}
+    return SimpleNamespace(config=config)
+
+
+class TestProbe:
+
+    def test_probe(self):
+        """Test that dead and slow hosts are left out without delaying the others"""
+        good = SocketServer(IdnDevice()).start()
+        other = SocketServer(IdnDevice(IDN.replace('001', '002'))).start()
+        slow = SocketServer(IdnDevice(delay=1.0)).start()
+        hosts = [address(slow), unused_address(), address(other), address(good)]
+        t0 = time.perf_counter()
+        found = instrument.probe_instruments(hosts, 'socket', timeout=0.3)
+        assert time.perf_counter() - t0 < 1.0
+        assert list(found) == [address(other), address(good)]
+        instr, fields = found[address(good)]
+        assert fields == IDN.split(',')
+        assert instr.timeout == instrument.scpi_socket.TIMEOUT
+
+        # The probe's connection is reused by the driver
+        driver = instrument.open_driver(Driver, address(good), 'socket', instr)
+        assert driver._scope is instr
+        assert driver.transport == 'socket'
+        for instr, _ in found.values():
+            instrument.discard(instr)
+        for server in good, other, slow:
+            server.close()
+
+    def test_default_timeout(self):
+        assert instrument.default_timeout('vxi11') == vxi11.Instrument('127.0.0.1').timeout
+        with pytest.raises(ValueError, match='Unknown transport: usb'):
+            instrument.default_timeout('usb')
+
+    def test_discard_cancelled(self, caplog):
+        """Test that a probe cancelled before it started is ignored quietly"""
+        future = Future()
+        future.add_done_callback(instrument.discard_late)
+        future.cancel()
+        assert 'exception calling callback' not in caplog.text
+
+    def test_reconnect(self, tmp_path):
+        server = SocketServer(IdnDevice()).start()
+        prefs = make_prefs(tmp_path)
+        assert instrument.reconnect(prefs) is None  # Nothing cached
+
+        cache = InstrumentCache(prefs.config['DEVICE']['instrument_cache'])
+        cache.add(address(server), IDN.split(','), 'pydosa.plugins.siglent_sds1000xe')
+        driver = instrument.reconnect(prefs)
+        assert isinstance(driver, Driver)
+        assert driver.address == address(server)
+        instrument.discard(driver._scope)
+
+        # A different instrument now has the address
+        server.device.idn = IDN.replace('001', '999')
+        assert instrument.reconnect(prefs) is None
+        server.close()
+
+
+class TestInstrumentCache:
+
+    def test_cache(self, tmp_path):
+        filename = str(tmp_path / 'sub' / 'instruments.json')
+        cache = InstrumentCache(filename)
+        assert cache.latest() is None
+        for i in range(12):
+            cache.add('10.0.0.{}'.format(i % 11), IDN.split(','), 'plugin')
+        cache = InstrumentCache(filename)
+        assert cache.addresses()[:2] == ['10.0.0.0', '10.0.0.10']
+        assert len(cache.entries) == 10
+        assert cache.latest()['idn'] == IDN.split(',')
+
+    def test_invalid(self, tmp_path):
+        filename = tmp_path / 'instruments.json'
+        filename.write_text('not json')
+        assert InstrumentCache(str(filename)).entries == []
@@ -0,0 +1,96 @@
+"""
+Pytest unit tests for the chunked transfer in scope_driver module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import threading
+import time
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.dsa.scope_driver import AcquisitionCancelled, ScopeDriver
+
+
+class ChunkDriver(ScopeDriver):
+    """Driver that transfers int16 codes in chunks"""
+
+    make = ''
+    models = []
+    min_firmware = ''
+    sample_rates = ['1k']
+    sample_sizes = ['1000']
+    raw_dtype = np.int16
+    chunk_size = 300
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.windows = []
+        self.active = 0
+        self.overlapped = False
+
+    def open(self, instrument):
+        pass
+
+    def prepare(self):
+        pass
+
+    def fetch_data(self, nsamples, srate_option):
+        pass
+
+    def transfer_chunk(self, start, count):
+        self.windows.append((start, count))
+        self.active += 1
+        time.sleep(self.delay)
+        self.active -= 1
+        return np.arange(start, start + count, dtype=np.int16)
+
+    def decode_chunk(self, chunk, out):
+        time.sleep(self.delay / 2)
+        self.overlapped |= self.active > 0
+        super().decode_chunk(chunk, out)
+
+    def close(self):
+        pass
+
+
+class TestChunkedTransfer:
+
+    def test_chunks(self):
+        driver = ChunkDriver()
+        buf = np.zeros(1000, np.int16)
+        assert driver.fetch_chunked(buf) == 1000
+        nt.assert_array_equal(buf, np.arange(1000))
+        assert driver.windows == [(0, 300), (300, 300), (600, 300), (900, 100)]
+        assert len(driver.metrics['chunk_rates']) == 4
+
+    def test_single_transfer(self):
+        driver = ChunkDriver()
+        driver.chunk_size = None
+        buf = np.zeros(1000, np.int16)
+        assert driver.fetch_chunked(buf) == 1000
+        assert driver.windows == [(0, 1000)]
+
+    def test_overlap(self):
+        """Test that decoding overlaps with the next transfer"""
+        driver = ChunkDriver(delay=0.02)
+        driver.fetch_chunked(np.zeros(1000, np.int16))
+        assert driver.overlapped
+
+    def test_cancel(self):
+        """Test cancellation between chunks"""
+        driver = ChunkDriver()
+        driver.cancel_event = threading.Event()
+        original = driver.transfer_chunk
+
+        def transfer(start, count):
+            driver.cancel_event.set()
+            return original(start, count)
+
+        driver.transfer_chunk = transfer
+        with pytest.raises(AcquisitionCancelled):
+            driver.fetch_chunked(np.zeros(1000, np.int16))
+        assert driver.windows == [(0, 300)]
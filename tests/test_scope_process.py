@@ -0,0 +1,89 @@
+"""
+Pytest unit tests for scope_process module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.dsa.scope_driver import AcquisitionCancelled, ScopeDriver
+from pydosa.dsa.scope_process import NSLOTS, ScopeProcess, SlotPool
+
+
+class RampDriver(ScopeDriver):
+    """Driver that returns a ramp of raw codes"""
+
+    make = ''
+    models = []
+    min_firmware = ''
+    sample_rates = ['1k']
+    sample_sizes = ['64', '128']
+    raw_dtype = np.int8
+
+    def open(self, instrument):
+        pass
+
+    def prepare(self):
+        pass
+
+    def fetch_data(self, nsamples, srate_option):
+        return np.arange(nsamples) * 0.5, 1000.0
+
+    def fetch_data_into(self, buf, srate_option):
+        buf[:] = np.arange(len(buf)) % 100
+        return buf, 1000.0, 0.5, 0.1
+
+    def close(self):
+        pass
+
+
+class TestScopeProcess:
+
+    def test_frames(self):
+        """Test that frames arrive through shared memory and slots are reused"""
+        process = ScopeProcess(RampDriver, RampDriver)
+        process.set_options('128', '1k')
+        process.start()
+        try:
+            for _ in range(3 * NSLOTS):
+                frame = process.frames.get(timeout=30)
+                samples, srate, gain, offset = frame
+                assert samples.dtype == np.int8
+                nt.assert_array_equal(samples, np.arange(128) % 100)
+                assert (srate, gain, offset) == (1000.0, 0.5, 0.1)
+                process.release_frame(frame)
+                del samples, frame
+        finally:
+            assert process.shutdown(10)
+
+    def test_release_after_shutdown(self):
+        """Test that a frame released after shutdown is ignored"""
+        process = ScopeProcess(RampDriver, RampDriver)
+        process.set_options('64', '1k')
+        process.start()
+        try:
+            frame = process.frames.get(timeout=30)
+        finally:
+            assert process.shutdown(10)
+        process.release_frame(frame)
+
+    def test_close_wakes_acquire(self):
+        """Test that closing the slot pool cancels a blocked acquire"""
+        shm = shared_memory.SharedMemory(create=True, size=64)
+        try:
+            pool = SlotPool(shm, 64, queue.Queue())
+            threading.Timer(0.1, pool.close).start()
+            with pytest.raises(AcquisitionCancelled):
+                pool.acquire(64, np.int8)
+            with pytest.raises(AcquisitionCancelled):
+                pool.acquire(64, np.int8)  # Still cancelled
+        finally:
+            shm.close()
+            shm.unlink()
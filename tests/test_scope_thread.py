@@ -0,0 +1,129 @@
+"""
+Pytest unit tests for scope_thread module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import threading
+import time
+
+import numpy as np
+import numpy.testing as nt
+
+from pydosa.dsa.scope_driver import ScopeDriver
+from pydosa.dsa.scope_thread import ScopeThread
+
+
+class CountingDriver(ScopeDriver):
+    """Minimal driver that counts acquisitions"""
+
+    make = ''
+    models = []
+    min_firmware = ''
+    sample_rates = ['1k']
+    sample_sizes = ['16']
+
+    def __init__(self):
+        self.fetched = threading.Semaphore(0)
+        self.count = 0
+        self.closed = False
+
+    def open(self, instrument):
+        pass
+
+    def prepare(self):
+        pass
+
+    def fetch_data(self, nsamples, srate_option):
+        self.count += 1
+        self.fetched.release()
+        return np.arange(nsamples, dtype=self.dtype), 1000.0
+
+    def close(self):
+        self.closed = True
+
+
+class TestScopeThread:
+
+    def test_idle_until_resumed(self):
+        """Test that a paused thread waits without acquiring"""
+        driver = CountingDriver()
+        thread = ScopeThread(driver)
+        thread.paused = True
+        thread.set_options('16', '1k')
+        thread.start()
+        assert not driver.fetched.acquire(timeout=0.2)
+        thread.paused = False
+        assert driver.fetched.acquire(timeout=5)
+        frame = thread.frames.get(timeout=5)
+        assert len(frame[0]) == 16
+        thread.close()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert driver.closed
+
+    def test_close_while_idle(self):
+        """Test that closing wakes a thread with no sample size"""
+        driver = CountingDriver()
+        thread = ScopeThread(driver)
+        thread.set_options('0', '1k')
+        thread.start()
+        thread.close()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert driver.count == 0
+
+    def test_buffer_reuse(self):
+        """Test that released and dropped frames recycle their buffers"""
+        driver = CountingDriver()
+        thread = ScopeThread(driver)
+        thread.set_options('16', '1k')
+        thread.start()
+        for _ in range(10):
+            frame = thread.frames.get(timeout=5)
+            nt.assert_array_equal(frame[0], np.arange(16))
+            thread.release_frame(frame)
+        thread.close()
+        thread.join(5)
+        assert thread.pool.allocations <= 3
+
+
+class SlowDriver(CountingDriver):
+    """Driver that waits a long time for a trigger"""
+
+    def fetch_data(self, nsamples, srate_option):
+        self.count += 1
+        self.fetched.release()
+        self.wait(10)  # Waiting for a trigger that doesn't come
+        return np.zeros(nsamples, self.dtype), 1000.0
+
+
+class TestCancellation:
+
+    def test_cancel_on_change(self):
+        """Test that changing the options restarts the acquisition"""
+        driver = SlowDriver()
+        thread = ScopeThread(driver)
+        thread.set_options('16', '1k')
+        thread.start()
+        assert driver.fetched.acquire(timeout=5)
+        t0 = time.perf_counter()
+        thread.set_options('32', '1k')
+        assert driver.fetched.acquire(timeout=5)  # Restarted
+        assert time.perf_counter() - t0 < 5
+        assert driver.count == 2
+        assert thread.shutdown(5)
+        assert driver.closed
+        assert thread.frames.empty()
+
+    def test_same_options(self):
+        """Test that setting unchanged options does not cancel"""
+        driver = SlowDriver()
+        thread = ScopeThread(driver)
+        thread.set_options('16', '1k')
+        thread.start()
+        assert driver.fetched.acquire(timeout=5)
+        thread.set_options('16', '1k')
+        assert not driver.fetched.acquire(timeout=0.2)
+        assert thread.shutdown(5)
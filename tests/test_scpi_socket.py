@@ -0,0 +1,107 @@
+"""
+Pytest unit tests for the raw socket SCPI transport.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import socket
+import time
+
+import numpy as np
+import numpy.testing as nt
+
+from pydosa.sim.scpi_server import SocketServer, Vxi11Server, connect_vxi11
+from pydosa.util.ieee_block import parse_block
+from pydosa.util.scpi_socket import ConnectionPool, ScpiSocket
+
+
+class EchoDevice(object):
+    """Answers '*IDN?', and 'WF?' with a block containing every byte value"""
+
+    def __init__(self, repeats=1000):
+        self.payload = bytes(range(256)) * repeats
+        self.messages = []
+
+    def execute(self, message):
+        self.messages.append(message)
+        if message == '*IDN?':
+            return b'Siglent Technologies,SDS1104X-E,SDS1EDEX000000,7.6.1.15\n'
+        if message.endswith('WF? DAT2'):
+            return b'DAT2,#9%09d' % len(self.payload) + self.payload + b'\n\n'
+        return None
+
+
+class TestScpiSocket:
+
+    def test_ask(self):
+        device = EchoDevice()
+        server = SocketServer(device).start()
+        conn = ScpiSocket(server.host, server.port)
+        assert conn.ask('*IDN?').startswith('Siglent')
+        conn.write('TDIV 1E-3')
+        assert conn.ask('*IDN?').startswith('Siglent')
+        assert device.messages == ['*IDN?', 'TDIV 1E-3', '*IDN?']
+        conn.close()
+        server.close()
+
+    def test_block(self):
+        """Test a block containing newlines, followed by two terminators"""
+        device = EchoDevice()
+        server = SocketServer(device).start()
+        conn = ScpiSocket(server.host, server.port)
+        for _ in range(2):
+            conn.write('C1:WF? DAT2')
+            data = parse_block(conn.read_raw(), np.uint8)
+            nt.assert_array_equal(data, np.frombuffer(device.payload, np.uint8))
+            assert conn.ask('*IDN?').startswith('Siglent')
+        conn.close()
+        server.close()
+
+    def test_pool(self):
+        server = SocketServer(EchoDevice()).start()
+        pool = ConnectionPool()
+        conn = pool.connect(server.host, server.port)
+        conn.close()
+        assert conn.connected
+        assert pool.connect(server.host, server.port) is conn
+        assert pool.connect(server.host, server.port) is not conn
+        pool.release(conn)
+        pool.clear()
+        assert not conn.connected
+        server.close()
+
+    def test_pool_dropped(self):
+        """Test that idle connections dropped by the instrument are not reused"""
+        listener = socket.create_server(('127.0.0.1', 0))
+        host, port = listener.getsockname()[:2]
+        pool = ConnectionPool()
+        conns = []
+        for message in [b'', b'stale\n']:
+            conn = pool.connect(host, port)
+            remote, _ = listener.accept()
+            conn.close()
+            if message:
+                remote.sendall(message)  # Unread response
+            else:
+                remote.close()  # Dropped
+            conns.append(remote)
+            time.sleep(0.1)
+            assert pool.connect(host, port) is not conn
+            assert not conn.connected
+            conns.append(listener.accept()[0])
+        for remote in conns:
+            remote.close()
+        listener.close()
+
+    def test_vxi11(self):
+        """Test the VXI-11 stand-in with a block larger than one read"""
+        device = EchoDevice(5000)
+        server = Vxi11Server(device).start()
+        server.MAX_RECV_SIZE = 1 << 16
+        instr = connect_vxi11(server.host, server.port)
+        assert instr.ask('*IDN?').startswith('Siglent')
+        instr.write('C1:WF? DAT2')
+        assert len(parse_block(instr.read_raw())) == len(device.payload)
+        instr.close()
+        server.close()
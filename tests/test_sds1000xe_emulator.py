@@ -0,0 +1,96 @@
+"""
+Pytest end-to-end tests of the Siglent driver with the SDS1000X-E emulator.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import time
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.dsa import instrument
+from pydosa.dsa.scope_driver import AcquisitionTimeout
+from pydosa.plugins.siglent_sds1000xe import Driver
+from pydosa.sim.scpi_server import LinkModel, SocketServer, Vxi11Server, connect_vxi11
+from pydosa.sim.sds1000xe_emulator import Sds1000xeEmulator, format_srate
+
+DEPTH = 100000  # Small memory depth to keep the tests fast
+
+
+def socket_driver(server) -> Driver:
+    driver = instrument.open_driver(Driver, '{}:{}'.format(server.host, server.port), 'socket')
+    driver.prepare()
+    return driver
+
+
+class TestEmulator:
+
+    def test_socket(self):
+        emulator = Sds1000xeEmulator(DEPTH)
+        server = SocketServer(emulator).start()
+        driver = socket_driver(server)
+        codes, sara, gain, offset = driver.fetch_raw(5000, '1G')
+        nt.assert_array_equal(codes, emulator.codes()[:5000])
+        assert sara == pytest.approx(DEPTH / (14 * 1E-3), rel=1E-2)
+        assert (gain, offset) == (0.5 / 25, 0.0)
+        assert emulator.counters['unknown'] == 0
+        assert 0.014 < driver.metrics['arm_latency'] < 1.0
+        driver.close()
+        server.close()
+
+    def test_vxi11(self):
+        emulator = Sds1000xeEmulator(DEPTH)
+        server = Vxi11Server(emulator).start()
+        driver = Driver()
+        driver.open(connect_vxi11(server.host, server.port))
+        driver.prepare()
+        data, _ = driver.fetch_data(DEPTH, '100M')
+        nt.assert_allclose(data, emulator.codes() * (0.5 / 25))
+        driver.close()
+        server.close()
+
+    def test_round_trips(self):
+        """Test the round trips for each frame, transferred in chunks"""
+        emulator = Sds1000xeEmulator(DEPTH)
+        server = SocketServer(emulator).start()
+        driver = socket_driver(server)
+        driver.chunk_size = 25000
+        buf = np.empty(DEPTH, np.int8)
+        driver.fetch_data_into(buf, '1G')
+        start = server.counters['round_trips']
+        driver.fetch_data_into(buf, '1G')
+        polls = driver.metrics['inr_polls']
+        assert server.counters['round_trips'] - start == 1 + polls + 4  # ARM, INR? and chunks
+        nt.assert_array_equal(buf, emulator.codes())
+        driver.close()
+        server.close()
+
+    def test_no_trigger(self):
+        emulator = Sds1000xeEmulator(DEPTH)
+        emulator.triggered = False
+        server = SocketServer(emulator).start()
+        driver = socket_driver(server)
+        driver.ACQUIRE_TIMEOUT = 0.1
+        with pytest.raises(AcquisitionTimeout):
+            driver.fetch_raw(1000, '1G')
+        driver.close()
+        server.close()
+
+    def test_link(self):
+        """Test the emulated latency and bandwidth"""
+        emulator = Sds1000xeEmulator(DEPTH)
+        server = SocketServer(emulator, link=LinkModel(bandwidth=1E6, latency=0.02)).start()
+        driver = socket_driver(server)
+        t0 = time.perf_counter()
+        driver.fetch_raw(50000, '1G')  # At least 4 round trips and 50 ms of transfer
+        assert time.perf_counter() - t0 > 4 * 0.02 + 0.05
+        driver.close()
+        server.close()
+
+    def test_format_srate(self):
+        assert format_srate(1E9) == '1.00GSa/s'
+        assert format_srate(2.5E8) == '250.00MSa/s'
+        assert format_srate(500) == '500.00Sa/s'
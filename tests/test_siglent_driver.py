@@ -0,0 +1,148 @@
+"""
+Pytest unit tests for the Siglent SDS1000X-E driver.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from pydosa.dsa.scope_driver import AcquisitionTimeout
+from pydosa.plugins.siglent_sds1000xe import Driver
+
+
+class FakeScope(object):
+    """Records the messages sent to a VXI-11 instrument"""
+
+    def __init__(self, combined=True, polls=1):
+        self.messages = []
+        self.combined = combined  # Responses to several queries combined
+        self.nsamples = 0
+        self.first = 0
+        self.depth = 14000000  # Memory depth
+        self.polls = polls  # Number of INR? polls before acquisition is complete
+        self.inr_count = 0
+
+    def write(self, message):
+        self.messages.append(message)
+        for command in message.split(';'):
+            if command.startswith('WFSU'):
+                self.nsamples = int(command.split(',')[3])
+                self.first = int(command.split(',')[5])
+            elif command == 'ARM':
+                self.inr_count = 0
+
+    def ask(self, message):
+        self.write(message)
+        if message == 'C1:VDIV?;C1:OFST?;SARA?' and self.combined:
+            return '5.00E-01;-1.00E-01;1.00E+09\n'
+        if message == 'INR?':
+            self.inr_count += 1
+            return '1' if 0 < self.polls <= self.inr_count else '0'
+        return {'INR?': '1', 'C1:VDIV?': '5.00E-01', 'C1:OFST?': '-1.00E-01',
+                'SARA?': '1.00E+09'}.get(message.split(';')[-1], '0')
+
+    def read_raw(self):
+        stop = min(self.first + self.nsamples, self.depth)
+        codes = (np.arange(self.first, stop) % 256 - 128).astype(np.int8)
+        return b'DAT2,#9%09d' % len(codes) + codes.tobytes() + b'\n\n'
+
+    def close(self):
+        pass
+
+
+def open_driver(scope) -> Driver:
+    driver = Driver()
+    driver.open(scope)
+    driver.prepare()
+    scope.messages.clear()
+    return driver
+
+
+class TestSiglentDriver:
+
+    def test_samples(self):
+        scope = FakeScope()
+        driver = open_driver(scope)
+        codes, sara, gain, offset = driver.fetch_raw(1000, '100M')
+        nt.assert_array_equal(codes, np.arange(1000) % 256 - 128)
+        assert (sara, gain, offset) == (1e9, 0.5 / 25, -0.1)
+
+    def test_round_trips(self):
+        """Test that unchanged settings are neither sent nor re-queried"""
+        scope = FakeScope()
+        driver = open_driver(scope)
+        driver.fetch_raw(1000, '100M')
+        assert scope.messages == ['TDIV 1E-2;TRMD SINGLE;INR?;ARM', 'INR?',
+                                  'WFSU SP,1,NP,1000,FP,0;C1:WF? DAT2',
+                                  'C1:VDIV?;C1:OFST?;SARA?']
+        scope.messages.clear()
+        driver.fetch_raw(1000, '100M')
+        assert scope.messages == ['TRMD SINGLE;INR?;ARM', 'INR?', 'C1:WF? DAT2']
+        scope.messages.clear()
+        driver.fetch_raw(2000, '100M')
+        assert scope.messages == ['TRMD SINGLE;INR?;ARM', 'INR?',
+                                  'WFSU SP,1,NP,2000,FP,0;C1:WF? DAT2']
+
+    def test_refresh(self):
+        """Test that the cached state expires"""
+        scope = FakeScope()
+        driver = open_driver(scope)
+        driver.fetch_raw(1000, '1G')
+        driver._refresh_time = 0
+        scope.messages.clear()
+        driver.fetch_raw(1000, '1G')
+        assert scope.messages[0] == 'TDIV 1E-3;TRMD SINGLE;INR?;ARM'
+        assert scope.messages[-1] == 'C1:VDIV?;C1:OFST?;SARA?'
+
+    def test_separate_queries(self):
+        """Test scaling from firmware that does not combine responses"""
+        scope = FakeScope(combined=False)
+        driver = open_driver(scope)
+        _, sara, gain, offset = driver.fetch_raw(100, '1G')
+        assert (sara, gain, offset) == (1e9, 0.5 / 25, -0.1)
+        assert scope.messages[-3:] == ['C1:VDIV?', 'C1:OFST?', 'SARA?']
+
+    def test_chunks(self):
+        """Test transfer of a waveform in chunks"""
+        scope = FakeScope()
+        driver = open_driver(scope)
+        driver.chunk_size = 300
+        codes, *_ = driver.fetch_raw(1000, '1G')
+        nt.assert_array_equal(codes, np.arange(1000) % 256 - 128)
+        assert [m for m in scope.messages if 'WFSU' in m] == [
+            'WFSU SP,1,NP,300,FP,0;C1:WF? DAT2', 'WFSU SP,1,NP,300,FP,300;C1:WF? DAT2',
+            'WFSU SP,1,NP,300,FP,600;C1:WF? DAT2', 'WFSU SP,1,NP,100,FP,900;C1:WF? DAT2']
+        assert len(driver.metrics['chunk_rates']) == 4
+
+    def test_short_chunks(self):
+        """Test a waveform that is shorter than requested"""
+        scope = FakeScope()
+        scope.depth = 700
+        driver = open_driver(scope)
+        driver.chunk_size = 300
+        buf = np.zeros(1000, np.int8)
+        codes, *_ = driver.fetch_data_into(buf, '1G')
+        assert np.shares_memory(codes, buf)
+        nt.assert_array_equal(codes, np.arange(700) % 256 - 128)
+
+    def test_polling(self):
+        """Test waiting for an acquisition that completes late"""
+        scope = FakeScope(polls=4)
+        driver = open_driver(scope)
+        driver.fetch_raw(100, '1G')
+        assert scope.messages.count('INR?') == 4
+        assert driver.metrics['inr_polls'] == 4
+        # Expected time is 14 ms, followed by 1 + 2 + 4 ms of backoff
+        assert 0.019 < driver.metrics['arm_latency'] < 1.0
+
+    def test_timeout(self):
+        """Test that a missing trigger raises an exception"""
+        scope = FakeScope(polls=0)
+        driver = open_driver(scope)
+        driver.ACQUIRE_TIMEOUT = 0.1
+        with pytest.raises(AcquisitionTimeout):
+            driver.fetch_raw(100, '1G')
+        assert 'C1:WF? DAT2' not in scope.messages
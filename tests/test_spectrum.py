@@ -0,0 +1,45 @@
+"""
+Pytest unit tests for spectrum module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+import numpy.testing as nt
+
+from pydosa.dsa.spectrum import Spectrum
+
+
+class TestSpectrum:
+
+    def test_axis(self):
+        """Test the frequency axis of a full-band spectrum"""
+        spectrum = Spectrum(np.ones(5), 8)
+        assert len(spectrum) == 5
+        assert spectrum.df == 1
+        assert spectrum.fmax == 4
+
+    def test_lazy_db(self):
+        """Test that dB values are only computed when used"""
+        power = np.array([1.0, 10.0, 100.0])
+        out = np.zeros(3)
+        requested = []
+        spectrum = Spectrum(power, 4, offset_db=3.0,
+                            db_buffer=lambda n: requested.append(n) or out)
+        assert requested == []  # Buffer not needed until the dB values are used
+        db = spectrum.db
+        assert db is out
+        assert requested == [3]
+        assert spectrum.db is db
+        nt.assert_allclose(db, [3.0, 13.0, 23.0])
+        nt.assert_array_equal(power, [1.0, 10.0, 100.0])
+
+    def test_to_db(self):
+        """Test converting reduced power values, e.g. per-pixel maxima"""
+        power = np.array([0.0, 1e-3, 0.5, 2.0])
+        spectrum = Spectrum(power, 6, offset_db=-1.0)
+        maxima = power.reshape(2, 2).max(1)
+        nt.assert_allclose(spectrum.to_db(maxima), spectrum.db.reshape(2, 2).max(1))
+        nt.assert_allclose(spectrum.to_db(power.max()), spectrum.db.max())
+        assert spectrum.db[0] < -290  # Zero power is finite
@@ -0,0 +1,65 @@
+"""
+Pytest unit tests for traces module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+import pydosa.dsa.traces as traces
+from pydosa.dsa.averager import Averager
+from pydosa.dsa.traces import TraceAccumulator
+
+ALL = ['Normal', 'Maximum', 'Minimum', 'Average']
+
+
+class TestTraces:
+    data = np.array([[4, 3, 3], [5, 2, 1], [6, 1, 8], [0, 4, 3]], dtype=float)
+
+    def test_all_traces(self):
+        """Test that each trace matches the single-mode averager"""
+        d = np.array(self.data)  # Clone test data
+        acc = TraceAccumulator(0.1)
+        averagers = {mode: Averager(0.1) for mode in ALL}
+        for row in d:
+            result = acc.update(row, ALL)
+            for mode in ALL:
+                nt.assert_allclose(result[mode], averagers[mode].average(row, mode))
+        nt.assert_allclose(d, self.data)  # Input unchanged
+
+    def test_blocks(self, monkeypatch):
+        """Test updating in blocks smaller than the spectrum"""
+        monkeypatch.setattr(traces, 'BLOCK', 4)
+        rng = np.random.default_rng(6)
+        d = rng.random((5, 10))
+        acc = TraceAccumulator(0.1)
+        for row in d:
+            result = acc.update(row, ['Maximum', 'Minimum'])
+        nt.assert_allclose(result['Maximum'], d.max(0))
+        nt.assert_allclose(result['Minimum'], d.min(0))
+
+    def test_add_trace(self):
+        """Test that a newly selected trace starts from the latest spectrum"""
+        d = np.array(self.data)
+        acc = TraceAccumulator(0.1)
+        acc.update(d[0], ['Maximum'])
+        acc.update(d[1], ['Maximum'])
+        result = acc.update(d[2], ['Maximum', 'Minimum'])
+        nt.assert_allclose(result['Maximum'], [6, 3, 8])
+        nt.assert_allclose(result['Minimum'], d[2])
+
+    def test_reset(self):
+        """Test that the traces restart when the monitor changes"""
+        d = np.array(self.data)
+        acc = TraceAccumulator(0.1, np.float32)
+        acc.update(d[2], ['Maximum'], 1)
+        result = acc.update(d[1], ['Maximum'], 2)
+        assert result['Maximum'].dtype == np.float32
+        nt.assert_allclose(result['Maximum'], d[1])
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            TraceAccumulator(0.1).update(self.data[0], ['Peak'])
@@ -5,6 +5,8 @@ Licensed under MIT license: see LICENSE.txt
 Copyright (c) 2020 Jon Brumfitt
 """
 
+import os
+
 import pytest
 
 from pydosa.util.util import ceil_nice_number
@@ -13,6 +15,7 @@ from pydosa.util.util import elide_bytes
 from pydosa.util.util import floor_nice_number
 from pydosa.util.util import log_ceil, log_floor
 from pydosa.util.util import round_nice_number
+from pydosa.util.util import write_atomic
 
 
 def test_round_nice_number():
@@ -127,3 +130,18 @@ def test_elide_bytes():
     assert elide_bytes(bs, 10, 10) == "b'\\x00\\x01\\x02\\x03\\x04\\x05\\x06'"
     assert elide_bytes(bs, 0, 10) == "b'\\x00\\x01\\x02\\x03\\x04\\x05\\x06'"
     assert elide_bytes(bs, 10, 0) == "b'\\x00\\x01\\x02\\x03\\x04\\x05\\x06'"
+
+
+def test_write_atomic(tmp_path):
+    path = str(tmp_path / 'dir' / 'file.txt')
+    write_atomic(path, lambda file: file.write('first'))
+
+    def fail(file):
+        file.write('partial')
+        raise ValueError('Failed')
+
+    with pytest.raises(ValueError):
+        write_atomic(path, fail)
+    with open(path) as file:
+        assert file.read() == 'first'  # Unchanged by the failed write
+    assert os.listdir(tmp_path / 'dir') == ['file.txt']  # No temporary file left
@@ -0,0 +1,84 @@
+"""
+Pytest unit tests for window_cache module.
+
+Licensed under MIT license: see LICENSE.txt
+Copyright (c) 2020 Jon Brumfitt
+"""
+
+import numpy as np
+import numpy.testing as nt
+import scipy.signal as sig
+
+from pydosa.dsa.window_cache import WindowCache
+
+
+def hann(n):
+    """Factory for a float64 Hann window"""
+    return lambda: sig.windows.hann(n)
+
+
+class TestWindowCache:
+
+    def test_hit_and_miss(self):
+        """Test that a repeated request is served from the cache"""
+        cache = WindowCache()
+        w1 = cache.get(('Hanning', 100, np.float64), hann(100))
+        w2 = cache.get(('Hanning', 100, np.float64), hann(100))
+        assert w1 is w2
+        assert cache.stats() == {'entries': 1, 'bytes': 800, 'hits': 1,
+                                 'misses': 1, 'evictions': 0, 'disk_hits': 0}
+
+    def test_lru_eviction(self):
+        """Test that the least recently used window is evicted"""
+        cache = WindowCache(max_bytes=2000)
+        cache.get(('Hanning', 100, np.float64), hann(100))
+        cache.get(('Hanning', 101, np.float64), hann(101))
+        cache.get(('Hanning', 100, np.float64), hann(100))  # Now most recent
+        cache.get(('Hanning', 102, np.float64), hann(102))  # Evicts 101
+        assert cache.evictions == 1
+        assert cache.nbytes <= 2000
+        cache.get(('Hanning', 100, np.float64), hann(100))
+        assert cache.hits == 2
+        cache.get(('Hanning', 101, np.float64), hann(101))
+        assert cache.misses == 4
+
+    def test_too_big(self):
+        """Test that a window bigger than the budget is not cached"""
+        cache = WindowCache(max_bytes=500)
+        w = cache.get(('Hanning', 100, np.float64), hann(100))
+        nt.assert_array_equal(w, sig.windows.hann(100))
+        assert cache.nbytes == 0 and cache.stats()['entries'] == 0
+
+    def test_half_storage(self):
+        """Test that windows are rebuilt correctly from half storage"""
+        cache = WindowCache(half=True)
+        for n in [100, 101]:
+            cache.get(('Hanning', n, np.float64), hann(n))
+            w = cache.get(('Hanning', n, np.float64), hann(n))
+            nt.assert_allclose(w, sig.windows.hann(n), atol=1e-15)
+        assert cache.nbytes == 8 * (50 + 51)
+
+    def test_disk_cache(self, tmp_path):
+        """Test that large windows are saved and memory-mapped later"""
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return sig.windows.flattop(1000).astype(np.float32)
+
+        key = ('Flat-Top', 1000, np.dtype(np.float32))
+        cache = WindowCache(directory=str(tmp_path), disk_min=1000)
+        w1 = cache.get(key, factory)
+        assert (tmp_path / 'flat_top-1000-float32.npy').exists()
+
+        # A new cache (e.g. next session) maps the file instead of computing it
+        cache = WindowCache(directory=str(tmp_path), disk_min=1000)
+        w2 = cache.get(key, factory)
+        assert len(calls) == 1
+        assert cache.disk_hits == 1
+        assert isinstance(w2, np.memmap)
+        nt.assert_array_equal(w1, w2)
+
+        # Small windows are only cached in memory
+        cache.get(('Hanning', 999, np.dtype(np.float64)), hann(999))
+        assert len(list(tmp_path.iterdir())) == 1